@@ -214,7 +214,7 @@ class DatabaseNavigatorWidget(QWidget, Ui_DatabaseNavigatorWidget):
         self.selected_param_id = None
         self.mode = mode
         
-        self.hatch_patterns = ["FixedMeander", "RandomMeander", "CrossedMeander", "Circular", "Spiral", "Radial"]
+        self.hatch_patterns = ["FixedMeander", "RandomMeander", "CrossedMeander", "Circular", "Spiral", "Radial", "Contour", "OptimizedMeander"]
         self.hatch_pattern_combo.addItems(self.hatch_patterns)
         self.post_processing_options = ["None", "Maximize Lines", "Constant Drive", "Over Drive"]
         self.postprocessing_combobox.addItems(self.post_processing_options)
@@ -0,0 +1,200 @@
+import os
+import io
+import hashlib
+import numpy as np
+from HelperClasses import HatchData, HatchCluster, LineCollection
+import HatchEngine
+
+'''
+This module contains the persistent on-disk cache of hatch results. Identical jobs (e.g. a recurring logo with the same settings) are restored
+from the cache instead of being hatched again, also after a restart of the application.
+- The key is the hash of the image, the hatch center, the resolution, all settings that change the result and the engine version (HatchEngine.ENGINE_VERSION).
+- Every entry is one uncompressed .npz file. The arrays of all LineCollections are concatenated, the structure (clusters, Line Collections,
+  polylines) is stored as offset arrays into the next lower level. Restoring only slices the arrays, no Point objects are created.
+- The total size of the cache is limited. Every hit touches the file, so the least recently used entries are deleted first.
+The cache is Qt-free, it is used by hatch_image (see HatchEngine).
+'''
+
+MAX_CACHE_BYTES = 512 * 1024**2  # default size limit of the cache
+
+
+class HatchDiskCache:
+    def __init__(self, cache_dir, max_bytes=MAX_CACHE_BYTES):
+        """
+        Args:
+            cache_dir (Path or str): The directory of the cache files. It is created on the first store.
+            max_bytes (int): The size limit of all cache files. The least recently used entries above the limit are deleted.
+        """
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+
+    def make_key(self, image_matrix, pixel_per_mm, center, settings):
+        """
+        Builds the key of a hatching. parallel_hatching is not part of the key, it does not change the result.
+
+        Returns:
+            str: The hex digest of the key.
+        """
+        image_matrix = np.ascontiguousarray(image_matrix)
+        palette = settings.db_color_palette
+        settings_key = (
+            settings.hatch_pattern, settings.hatch_angle, settings.hatch_dist_mode, settings.hatch_dist_min, settings.hatch_dist_max,
+            settings.hatch_mode, settings.cyl_rad_mm, settings.stepsize_mm, settings.white_threshold, settings.hatch_engine,
+            settings.random_seed, None if palette is None else sorted(vars(palette).items()), settings.island_hatching,
+            settings.centerline_hatching, settings.min_segment_length, settings.bridge_gap, settings.bridge_mode
+        )
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(image_matrix.tobytes())
+        digest.update(repr((image_matrix.shape, image_matrix.dtype.str, float(pixel_per_mm), [float(c) for c in center],
+                            settings_key, HatchEngine.ENGINE_VERSION)).encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def load(self, key):
+        """
+        Returns:
+            HatchData: The cached hatching, or None if there is no (readable) entry for the key.
+        """
+        path = self._entry_path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                hatch_data = unpack_hatch_data(entry)
+            os.utime(path)  # mark as recently used
+        except Exception as e:
+            print(f"Could not read hatch cache entry {path}: {e}")
+            return None
+        return hatch_data
+
+    def store(self, key, hatch_data):
+        """
+        Stores a hatching and deletes the least recently used entries above the size limit.
+        Errors are only printed, the hatching itself is not affected by a failing cache.
+        """
+        path = self._entry_path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            buffer = io.BytesIO()
+            np.savez(buffer, **pack_hatch_data(hatch_data))
+            # write to a temporary file first, so a crash never leaves a truncated entry
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(buffer.getbuffer())
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Could not write hatch cache entry {path}: {e}")
+            return
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        # deletes the least recently used entries until the cache fits into max_bytes. the entry at the path keep is never deleted
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not name.endswith(".npz") or path == keep:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_bytes = sum(size for _, size, _ in entries)
+        if keep is not None and os.path.isfile(keep):
+            total_bytes += os.path.getsize(keep)
+        # oldest first
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError as e:
+                print(f"Could not delete hatch cache entry {path}: {e}")
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+def pack_hatch_data(hatch_data):
+    """
+    Converts a HatchData into flat arrays for np.savez. The label maps and color lists of the clusters are only needed while hatching and not stored.
+    """
+    line_collections = []
+    collection_offsets, cluster_offsets = [0], [0]
+    for hatch_cluster in hatch_data.hatch_clusters:
+        for line_collection in hatch_cluster.data:
+            if not isinstance(line_collection, LineCollection):
+                line_collection = LineCollection.from_polylines(line_collection)
+            line_collections.append(line_collection)
+            collection_offsets.append(collection_offsets[-1]+len(line_collection))
+        cluster_offsets.append(len(line_collections))
+
+    # offsets of the polylines into the points of all Line Collections
+    polyline_offsets = [np.zeros(1, dtype=np.int64)]
+    point_count = 0
+    for line_collection in line_collections:
+        polyline_offsets.append(line_collection.offsets[1:]+point_count)
+        point_count += line_collection.num_points
+
+    arrays = {
+        "type": np.array(hatch_data.type),
+        "coords": np.concatenate([line_collection.coords for line_collection in line_collections]) if line_collections else np.zeros((0, 3)),
+        "move_types": np.concatenate([line_collection.move_types for line_collection in line_collections]) if line_collections else np.zeros(0, dtype=np.uint8),
+        "polyline_offsets": np.concatenate(polyline_offsets),
+        "collection_offsets": np.array(collection_offsets, dtype=np.int64),
+        "collection_colors": np.array([line_collection.color for line_collection in line_collections], dtype=np.uint8).reshape(-1, 3),
+        # speed and power are only set by the parser. nan for None
+        "collection_speeds": np.array([np.nan if line_collection.speed is None else line_collection.speed for line_collection in line_collections], dtype=np.float64),
+        "collection_powers": np.array([np.nan if line_collection.pwr is None else line_collection.pwr for line_collection in line_collections], dtype=np.float64),
+        "cluster_offsets": np.array(cluster_offsets, dtype=np.int64),
+        "ref_positions": np.array([hatch_cluster.ref_position for hatch_cluster in hatch_data.hatch_clusters], dtype=np.float64).reshape(-1, 4),
+        # the centers have 2 (flat) or 3 (cylindrical clusters) entries. padded with nan
+        "centers": np.array([list(hatch_cluster.cluster_center_for_hatch) + [np.nan]*(3-len(hatch_cluster.cluster_center_for_hatch))
+                             for hatch_cluster in hatch_data.hatch_clusters], dtype=np.float64).reshape(-1, 3),
+        "cylinder_radii": np.array([hatch_cluster.cylinder_radius for hatch_cluster in hatch_data.hatch_clusters], dtype=np.float64),
+        "additional_codes": np.array([hatch_cluster.additional_code for hatch_cluster in hatch_data.hatch_clusters], dtype=str),
+    }
+    for idx, hatch_cluster in enumerate(hatch_data.hatch_clusters):
+        arrays[f"input_matrix_{idx}"] = np.asarray(hatch_cluster.input_matrix)
+    return arrays
+
+
+def unpack_hatch_data(arrays):
+    """
+    Rebuilds the HatchData from the arrays of pack_hatch_data.
+    """
+    coords = arrays["coords"]
+    move_types = arrays["move_types"]
+    polyline_offsets = arrays["polyline_offsets"]
+    collection_offsets = arrays["collection_offsets"].tolist()
+    colors = arrays["collection_colors"].tolist()
+    speeds = arrays["collection_speeds"].tolist()
+    powers = arrays["collection_powers"].tolist()
+    cluster_offsets = arrays["cluster_offsets"].tolist()
+    ref_positions = arrays["ref_positions"].tolist()
+    centers = arrays["centers"].tolist()
+    cylinder_radii = arrays["cylinder_radii"].tolist()
+    additional_codes = arrays["additional_codes"].tolist()
+
+    line_collections = []
+    for idx in range(len(collection_offsets)-1):
+        offsets = polyline_offsets[collection_offsets[idx]:collection_offsets[idx+1]+1]
+        first_point, last_point = int(offsets[0]), int(offsets[-1])
+        line_collections.append(LineCollection(
+            coords[first_point:last_point], move_types[first_point:last_point], offsets-first_point, tuple(colors[idx]),
+            None if np.isnan(speeds[idx]) else speeds[idx], None if np.isnan(powers[idx]) else powers[idx]
+        ))
+
+    hatch_clusters = []
+    for idx in range(len(cluster_offsets)-1):
+        cluster_data = line_collections[cluster_offsets[idx]:cluster_offsets[idx+1]]
+        center = [value for value in centers[idx] if not np.isnan(value)]
+        hatch_clusters.append(HatchCluster(cluster_data, arrays[f"input_matrix_{idx}"], ref_positions[idx], center, cylinder_radii[idx], additional_codes[idx]))
+    return HatchData(hatch_clusters, str(arrays["type"]))
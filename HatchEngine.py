@@ -0,0 +1,1476 @@
+import time
+import threading
+import hashlib
+import zlib
+import numpy as np
+import random
+from HelperClasses import Point, HatchData, HatchCluster, LineCollection
+import HatchKernels
+import JitKernels
+import ParallelHatching
+
+'''
+This module contains the Qt-free hatching engine. It can be used without the GUI, e.g. for scripting or benchmarking:
+
+    hatch_data = hatch_image(image_matrix, pixel_per_mm, center, HatchSettings(hatch_pattern="FixedMeander"))
+
+- HatchSettings: plain container for all settings of a hatching (the values of the hatching tab or of the automatic processing).
+- CancelToken: cooperative cancellation. The hatching checks the token regularly and stops once it is cancelled.
+- ProgressReporter: thread-safe, rate-limited forwarding of the progress (in percent) to a callback, e.g. a Qt signal.
+- HatchCache: per-color results of the last hatching. Only colors whose mask or settings changed are hatched again.
+  Complete hatchings can additionally be kept on disk across restarts, see HatchDiskCache.
+- HatchEngine: the pattern generators of the hatching (meander, circular, spiral, radial), the clustering and the cylindrical transformation.
+  It runs in the hatching thread of the GUI as well as in the worker processes of a process pool (see ParallelHatching).
+  Progress and cancellation are passed in as plain callables:
+  - progress_callback(int): receives the progress in percent. Only increases of more than one percent are reported.
+  - is_cancelled(): returns True if the hatching should stop. The generators then return None.
+'''
+
+ENGINE_VERSION = 2  # increase whenever the same image and settings give a different hatching. invalidates the entries of the HatchDiskCache
+CENTERLINE_MAX_WIDTH = 2  # strokes up to this width (in hatch distances of the color) are traced as centerlines, see HatchEngine.split_centerlines
+SEGMENT_COST_MM = 2.0  # additional path of every segment in the angle optimizer (laser switching and constant drive moves, see PostProcessor.set_drive_mode)
+RANDOM_PATTERNS = ["RandomMeander", "Circular"]  # patterns that draw random angles, see HatchEngine.seed_color
+
+class HatchSettings:
+    def __init__(self, hatch_pattern="RandomMeander", hatch_angle=45, hatch_dist_mode="ColorRanged", hatch_dist_min=300, hatch_dist_max=700,
+                 hatch_mode="Flat", cyl_rad_mm=100, stepsize_mm=0.1, white_threshold=255, hatch_engine="Vectorized", parallel_hatching=False,
+                 db_color_palette=None, random_seed=None, island_hatching=False, centerline_hatching=False, min_segment_length=0, bridge_gap=0,
+                 bridge_mode="Laser On"):
+        """
+        Args:
+            hatch_pattern (str): "FixedMeander", "RandomMeander", "CrossedMeander", "OptimizedMeander", "Circular", "Spiral", "Radial" or "Contour".
+                OptimizedMeander is a FixedMeander with the angle of the lowest estimated machine time per color, see HatchEngine.optimize_meander_angles.
+                Contour fills every color with concentric inset rings, see HatchKernels.hatch_contour.
+            hatch_angle (float): The hatch angle in degrees for FixedMeander and CrossedMeander.
+            hatch_dist_mode (str): "ColorRanged" (distance between min and max depending on the brightness) or "Fixed" (min distance).
+            hatch_dist_min (float): The minimum hatch distance in µm.
+            hatch_dist_max (float): The maximum hatch distance in µm.
+            hatch_mode (str): "Flat", "CylEquidistX" or "CylEquidistRad".
+            cyl_rad_mm (float): The cylinder radius in mm for the cylindrical hatch modes.
+            stepsize_mm (float): The step size along the hatch lines in mm.
+            white_threshold (int): Colors with a mean RGB value above this threshold are not hatched.
+            hatch_engine (str): "Standard", "Vectorized", "RotateScan", "PixelExact", "Polygon" or "Numba" hatch engine.
+            parallel_hatching (bool): Hatch colors or clusters in a process pool.
+            db_color_palette: Color palette of the database. If given, pattern, angle and distance of every color are taken from it (automatic mode).
+            random_seed (int): Seed for the random patterns (RandomMeander, Circular). Every color is seeded on its own. None draws new
+                random angles for every hatching, unless a HatchCache is used (then the seed of the cache is used, see HatchCache.begin).
+            island_hatching (bool): Hatch every connected region (island) of a color completely before the next one, see HatchEngine.order_islands.
+            centerline_hatching (bool): Trace thin strokes as single centerlines and only hatch the thick parts, see HatchEngine.split_centerlines.
+            min_segment_length (float): Polylines shorter than this length in µm are removed. 0 keeps all polylines.
+            bridge_gap (float): Gaps within a hatch line up to this length in µm are bridged, see HatchKernels.bridge_gaps. 0 bridges nothing.
+            bridge_mode (str): "Laser On" (the gap is drawn) or "Power Off" (the gap is a G1 move with zero power instead of a G0).
+        """
+        self.hatch_pattern = hatch_pattern
+        self.hatch_angle = hatch_angle
+        self.hatch_dist_mode = hatch_dist_mode
+        self.hatch_dist_min = hatch_dist_min
+        self.hatch_dist_max = hatch_dist_max
+        self.hatch_mode = hatch_mode
+        self.cyl_rad_mm = cyl_rad_mm
+        self.stepsize_mm = stepsize_mm
+        self.white_threshold = white_threshold
+        self.hatch_engine = hatch_engine
+        self.parallel_hatching = parallel_hatching
+        self.db_color_palette = db_color_palette
+        self.random_seed = random_seed
+        self.island_hatching = island_hatching
+        self.centerline_hatching = centerline_hatching
+        self.min_segment_length = min_segment_length
+        self.bridge_gap = bridge_gap
+        self.bridge_mode = bridge_mode
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+
+class ProgressReporter:
+    def __init__(self, callback=None, min_interval=0.05):
+        """
+        Forwards progress values to the callback. Can be called from any thread.
+        A value is only forwarded if it is larger than the last one and at least min_interval seconds have passed since the last report. 100 is always forwarded.
+        """
+        self.callback = callback
+        self.min_interval = min_interval
+        self.last_value = -1
+        self.last_time = 0.0
+        self.lock = threading.Lock()
+
+    def report(self, value):
+        value = int(value)
+        with self.lock:
+            now = time.monotonic()
+            if value <= self.last_value:
+                return
+            if value < 100 and now - self.last_time < self.min_interval:
+                return
+            self.last_value = value
+            self.last_time = now
+        if self.callback is not None:
+            self.callback(value)
+
+    def reset(self):
+        with self.lock:
+            self.last_value = -1
+            self.last_time = 0.0
+
+
+class HatchCache:
+    def __init__(self):
+        """
+        Cache of hatched colors for incremental re-hatching. The Line Collections of every color are stored under a key of the color mask in
+        its cluster and all settings that change the result (see HatchEngine.get_color_cache_keys). After a small edit of the image only the
+        changed colors are hatched again. Entries that were not used by the last finished hatching are dropped.
+        The cached Line Collections are shared between hatchings and must not be modified.
+        """
+        self.entries = {}
+        self.used_entries = {}
+        # seed for the random patterns if the settings do not fix one. keeps the unchanged colors identical between hatchings
+        self.seed = random.randrange(2**32)
+        self.last_job_key = None
+
+    def begin(self, job_key=None):
+        """
+        Starts a hatching. job_key identifies all inputs of the hatching (see HatchEngine.get_job_key). If the same inputs are hatched
+        again, a new seed is drawn: the random patterns change like without a cache, all other colors are still taken from the cache.
+        """
+        if job_key is not None and job_key == self.last_job_key:
+            self.seed = random.randrange(2**32)
+        self.last_job_key = job_key
+        self.used_entries = {}
+
+    def lookup(self, key):
+        line_collections = self.entries.get(key)
+        if line_collections is not None:
+            self.used_entries[key] = line_collections
+        return line_collections
+
+    def store(self, key, line_collections):
+        self.used_entries[key] = line_collections
+
+    def commit(self):
+        # only keep the entries of the finished hatching. a cancelled hatching does not commit and keeps the old entries
+        self.entries = self.used_entries
+        self.used_entries = {}
+
+    def clear(self):
+        self.entries = {}
+        self.used_entries = {}
+
+
+def hatch_image(image_matrix, pixel_per_mm, center=None, settings=None, progress_callback=None, cancel_token=None, cache=None, disk_cache=None):
+    """
+    Hatches an image.
+
+    Args:
+        image_matrix (numpy.ndarray): The RGB image with shape (height, width, 3). Row 0 is the bottom of the hatching (y points up).
+        pixel_per_mm (float): The image resolution.
+        center (list): The hatch center [x, y] in pixels. Defaults to the image center.
+        settings (HatchSettings): The hatch settings. Defaults to HatchSettings().
+        progress_callback (callable): Receives the progress in percent, e.g. ProgressReporter.report.
+        cancel_token (CancelToken): Token to cancel the hatching.
+        cache (HatchCache): Results of previous hatchings. Only colors that are not in the cache are hatched.
+        disk_cache (HatchDiskCache): Persistent cache of complete hatchings. A hit is returned without hatching, a new hatching is stored.
+            Not used for random patterns without a fixed seed.
+
+    Returns:
+        HatchData: The hatched image, or None if the hatching was cancelled or the image does not fit on the cylinder.
+    """
+    if settings is None:
+        settings = HatchSettings()
+    if center is None:
+        center = [(image_matrix.shape[1]-1)/2, (image_matrix.shape[0]-1)/2]
+    # random patterns without a fixed seed must change with every hatching, so they are never restored from the disk
+    if disk_cache is not None and has_unseeded_random_patterns(settings):
+        disk_cache = None
+    if disk_cache is not None:
+        cache_key = disk_cache.make_key(image_matrix, pixel_per_mm, center, settings)
+        hatch_data = disk_cache.load(cache_key)
+        if hatch_data is not None:
+            if progress_callback is not None:
+                progress_callback(100)
+            return hatch_data
+    is_cancelled = cancel_token.is_cancelled if cancel_token is not None else None
+    engine = HatchEngine(pixel_per_mm, progress_callback=progress_callback, is_cancelled=is_cancelled, cache=cache)
+    hatch_data = engine.hatch(image_matrix, center, settings)
+    if disk_cache is not None and hatch_data is not None:
+        disk_cache.store(cache_key, hatch_data)
+    return hatch_data
+
+
+def has_unseeded_random_patterns(settings):
+    # True if the hatching may draw random angles without a fixed seed. the patterns of a database palette are only known per color
+    if settings.random_seed is not None:
+        return False
+    return settings.db_color_palette is not None or settings.hatch_pattern in RANDOM_PATTERNS
+
+
+class HatchEngine:
+    def __init__(self, pixel_per_mm, progress_callback=None, is_cancelled=None, cache=None):
+        self.pixel_per_mm = pixel_per_mm
+        self.progress_callback = progress_callback
+        self.cancel_check = is_cancelled
+        self.last_progress = 0
+        self.cache = cache
+        self.random_seed = None
+        self.rng = random  # generator of the random angles of the color that is hatched, see seed_color
+        self.color_stats = None
+
+    def is_cancelled(self):
+        return self.cancel_check is not None and self.cancel_check()
+
+    def report_progress(self, current_state, force=False):
+        # only forward progress steps of more than one percent to keep the signal traffic low
+        if (force or current_state > self.last_progress+1) and not self.is_cancelled():
+            self.last_progress = int(current_state)
+            if self.progress_callback is not None:
+                self.progress_callback(int(current_state))
+
+    def get_progress_callback(self, progress_state):
+        """
+        Returns the progress callback of the kernels for one color. The callback maps the finished fraction (0..1) of the color to
+        the progress of the whole hatching.
+
+        Args:
+            progress_state (list): [index of the color, number of colors, progress of the whole hatching in percent].
+        """
+        def report_progress(fraction):
+            self.report_progress(np.ceil((progress_state[0]+fraction)/progress_state[1]*progress_state[2]))
+        return report_progress
+
+    def hatch(self, image_matrix, center, settings):
+        """
+        Hatches an image with the given settings. See hatch_image.
+        """
+        self.report_progress(0, force=True)
+        if center is None:
+            center = [(image_matrix.shape[1]-1)/2, (image_matrix.shape[0]-1)/2]
+        self.random_seed = settings.random_seed
+        if settings.hatch_engine == "Numba" and not JitKernels.NUMBA_AVAILABLE:
+            print("Numba is not installed. The Vectorized hatch engine is used instead.")
+        if self.cache is not None:
+            self.cache.begin(self.get_job_key(image_matrix, center, settings))
+            if self.random_seed is None:
+                self.random_seed = self.cache.seed
+
+        #divde the image into clusters to hatch and store in appropriate output format already. then loop over all clusters
+        hatch_data = self.calculate_clusters(image_matrix, center, settings.hatch_mode, settings.cyl_rad_mm)
+        if hatch_data is None or self.is_cancelled():
+            return None
+
+        #first get the colors of every cluster and convert the cluster once into a label map (index into the color list)
+        for hatch_cluster in hatch_data.hatch_clusters:
+            hatch_cluster.color_list = self.get_sorted_unique_colors(hatch_cluster.input_matrix)
+            hatch_cluster.label_map = HatchKernels.build_label_map(hatch_cluster.input_matrix, hatch_cluster.color_list)
+
+        #hatch and cylindrically transform every cluster in its own worker process if there are several clusters
+        parallel_clusters = settings.parallel_hatching and len(hatch_data.hatch_clusters) > 1
+        if parallel_clusters:
+            if self.hatch_clusters_parallel(hatch_data, settings) is None:
+                return None
+        else:
+            for idx, hatch_cluster in enumerate(hatch_data.hatch_clusters):
+                cluster_progress = (idx+1)/len(hatch_data.hatch_clusters)*100
+                hatch_cluster.data = self.hatch_cluster_with_settings(hatch_cluster, settings, cluster_progress)
+                if hatch_cluster.data is None:
+                    return None
+
+        pattern_name = "Database Patterns" if settings.db_color_palette is not None else settings.hatch_pattern
+        hatch_data.type = f"Image: {pattern_name} with {settings.hatch_dist_mode} Lines"
+
+        #check if hatching was cancelled
+        if self.is_cancelled():
+            return None
+        if settings.hatch_mode in ["CylEquidistX", "CylEquidistRad"]:
+            #the workers of the parallel hatching already transformed their clusters
+            if not parallel_clusters:
+                for hatch_cluster in hatch_data.hatch_clusters:
+                    hatch_cluster.data = self.make_hatch_cylindrical(hatch_cluster.data, settings.cyl_rad_mm)
+                    if hatch_cluster.data is None:
+                        return None
+            hatch_data.type += f" and {settings.hatch_mode}"
+        if self.cache is not None:
+            self.cache.commit()
+        return hatch_data
+
+    def calculate_clusters(self, image_matrix, center, hatch_mode, workpiece_radius):
+        hatch_data= HatchData([], "")
+
+        if hatch_mode in ["CylEquidistX", "CylEquidistRad"]:
+
+            # Check if the image ist too large for cylindrical hatching (Laser Distance has to be maintained). Dive then.
+            image_width_px = image_matrix.shape[1]
+            image_with_mm = image_width_px / self.pixel_per_mm
+            z_dist = 17 # Distance from in mm laser to workpiece for 1064nm lasers
+            radius_mm = workpiece_radius
+            
+            #calculate the maximum angle allowed to maintain laser distance
+            max_angle_allowed = np.acos((radius_mm - z_dist)/radius_mm) * 2 * (180/np.pi)  # in degrees
+
+            #calculate the angle that the image would cover on the cylinder
+            max_angle_image=image_with_mm/(2*np.pi*radius_mm)*360
+            if max_angle_image>360:
+                return None
+            
+            if max_angle_image>max_angle_allowed:
+                clusters_needed = int(np.ceil(max_angle_image/max_angle_allowed))
+                cluster_width_px = int(np.ceil(image_width_px/clusters_needed))
+                for i in range(clusters_needed):
+                    start_x = i * cluster_width_px
+                    end_x = min((i + 1) * cluster_width_px, image_width_px)
+                    cluster_matrix = image_matrix[:, start_x:end_x]
+                    cluster_mid_x_rel_to_image_center = ((start_x + end_x) / 2 - center[0]) / self.pixel_per_mm
+                    angle_for_cluster_mid = (cluster_mid_x_rel_to_image_center/(2*radius_mm*np.pi) * 360)*-1 #invert angle for correct rotation direction
+                    ref_position = [0, 0, 0, angle_for_cluster_mid]  # x, y, z, rotation
+                    cluster_center_for_hatch = [(cluster_matrix.shape[1]-1)/2, center[1], 0]
+                    hatch_data.hatch_clusters.append(HatchCluster(None, cluster_matrix, ref_position,cluster_center_for_hatch, radius_mm))
+                return hatch_data
+        else:
+            radius_mm = 0  # Not used for non-cylindrical hatching
+
+        #if not cylindrical hatching or image fits within laser distance, return single cluster
+        hatch_data.hatch_clusters.append(HatchCluster(None, image_matrix, ref_position=[0,0,0,0], cluster_center_for_hatch=center, cylinder_radius=radius_mm))
+
+        return hatch_data
+
+    def get_sorted_unique_colors(self, image_matrix):
+        """
+        Extracts all unique RGB colors from the image and sorts them by the sum of the RGB values in descending order.
+        The position of a color in this list is its label in the label map, see get_color_stats for the statistics of every label.
+
+        Args:
+            image_matrix (numpy.ndarray): The image matrix with shape (height, width, 3).
+
+        Returns:
+            list: A list of unique RGB colors sorted by the sum of the RGB values in descending order.
+        """
+        # unique packed rgb keys, then unpack and sort by the sum. the sum is taken as int, uint8 would overflow
+        keys = np.unique(HatchKernels.pack_rgb(image_matrix.reshape(-1, 3)))
+        colors = np.stack(((keys >> 16) & 255, (keys >> 8) & 255, keys & 255), axis=1).astype(np.int64)
+        order = np.argsort(-colors.sum(axis=1), kind='stable')
+        return [tuple(color) for color in colors[order].tolist()]
+
+    def get_color_stats(self, label_map, center):
+        """
+        Returns the statistics index (pixel count, bounding box and radius range of every label) of a label map, see HatchKernels.ColorStats.
+        The index is built on the first call and reused by all colors and passes of the same label map.
+        """
+        if self.color_stats is None or self.color_stats.label_map is not label_map or self.color_stats.center != (float(center[0]), float(center[1])):
+            self.color_stats = HatchKernels.ColorStats(label_map, center)
+        return self.color_stats
+
+    def get_color_hatch_params(self, color, settings):
+        """
+        Returns the hatch settings (hatch_pattern, hatch_angle, hatch_distance in mm) of a single color, or None if the color can not be hatched.
+        """
+        #if a database color palette is given (automatic mode), get hatch settings from best fit color of the palette
+        if settings.db_color_palette is not None:
+            bestfit_color = settings.db_color_palette.find_paramset_by_color(color)
+            hatch_distance = bestfit_color['hatch_distance']/1000
+            hatch_pattern = bestfit_color['hatch_pattern']
+            hatch_angle = bestfit_color['hatch_angle']
+        else:
+            hatch_pattern = settings.hatch_pattern
+            hatch_angle = settings.hatch_angle
+            if settings.hatch_dist_mode == "ColorRanged":
+                # Define Hatch Dist depending on chosen Hatch_Mode
+                h_min = settings.hatch_dist_min
+                h_max = settings.hatch_dist_max
+                hatch_distance = (h_min + sum(color) / 765 * (h_max - h_min))/1000
+            elif settings.hatch_dist_mode == "Fixed":
+                hatch_distance = settings.hatch_dist_min/1000
+            else:
+                print("Hatch Distance Mode not recognized")
+                return None
+        return hatch_pattern, hatch_angle, hatch_distance
+
+    def get_cluster_color_params(self, color_list, settings, label_map=None):
+        #resolve the hatch settings of all colors of a cluster. colors that are skipped (too bright) get None
+        color_params = []
+        for color in color_list:
+            # Ensure the sum of RGB values is within a safe range
+            color = np.array(color, dtype=np.int64)
+            if sum(color)/3 > settings.white_threshold:
+                color_params.append(None)
+            else:
+                color_params.append(self.get_color_hatch_params(color, settings))
+        if label_map is not None:
+            color_params = self.optimize_meander_angles(color_params, label_map)
+        return color_params
+
+    def optimize_meander_angles(self, color_params, label_map):
+        """
+        Replaces the OptimizedMeander colors by FixedMeander colors with the angle of the lowest estimated machine time. For every candidate
+        angle of HatchKernels.OPTIMIZER_ANGLES, the segments and the path length of the color are estimated from rotated run counts of the
+        label map (see HatchKernels.estimate_meander_costs). Every segment costs SEGMENT_COST_MM of additional path for the laser
+        switching and the constant drive moves. Ties go to the smaller angle.
+        """
+        labels = [label for label, params in enumerate(color_params) if params is not None and params[0] == "OptimizedMeander"]
+        if not labels:
+            return color_params
+        angles = HatchKernels.OPTIMIZER_ANGLES
+        segments, path_lengths = HatchKernels.estimate_meander_costs(label_map, labels, angles)
+        color_params = list(color_params)
+        for idx, label in enumerate(labels):
+            hatch_distance = color_params[label][2]
+            # estimated path in mm, for the hatch distance of the color
+            costs = (path_lengths[idx]/self.pixel_per_mm+segments[idx]*SEGMENT_COST_MM)/(hatch_distance*self.pixel_per_mm)
+            color_params[label] = ("FixedMeander", float(angles[int(np.argmin(costs))]), hatch_distance)
+        return color_params
+
+    def hatch_cluster_with_settings(self, hatch_cluster, settings, cluster_progress=100):
+        """
+        Hatches a HatchCluster (with label map and color list) with the given settings. Distributes the colors over a process pool if parallel hatching is enabled.
+        Returns the Line Collections of the cluster in color order, or None if the hatching was cancelled.
+        """
+        color_params = self.get_cluster_color_params(hatch_cluster.color_list, settings, hatch_cluster.label_map)
+
+        #only hatch the colors that are not cached
+        if self.cache is not None:
+            cache_keys = self.get_color_cache_keys(hatch_cluster, color_params, settings, cylindrical=False)
+            hatch_params = [params if key is None or self.cache.lookup(key) is None else None for params, key in zip(color_params, cache_keys)]
+            hatched_clusters = self.hatch_cluster_colors(hatch_cluster, hatch_params, settings, cluster_progress)
+            if hatched_clusters is None:
+                return None
+            return self.splice_cached_colors(color_params, hatch_params, cache_keys, hatched_clusters)
+        return self.hatch_cluster_colors(hatch_cluster, color_params, settings, cluster_progress)
+
+    def hatch_cluster_colors(self, hatch_cluster, color_params, settings, cluster_progress=100):
+        # hatches the colors of a cluster with color_params serially, in a single sweep or in a process pool
+        step_size = settings.stepsize_mm * self.pixel_per_mm  # Step size in pixels
+        cyl_rad = settings.cyl_rad_mm * self.pixel_per_mm
+
+        #distribute the colors over a process pool if there is more than one task. a single sweep over all colors is faster anyway
+        single_sweep = self.get_multicolor_meander(settings.hatch_engine) is not None and self.has_shared_meander_params(color_params)
+        if settings.parallel_hatching and not single_sweep and ParallelHatching.count_tasks(color_params) > 1:
+            label_map, centerlines = hatch_cluster.label_map, {}
+            if settings.centerline_hatching:
+                label_map, centerlines = self.split_centerlines(label_map, hatch_cluster.cluster_center_for_hatch, hatch_cluster.color_list, color_params)
+            tasks = ParallelHatching.build_tasks(hatch_cluster.color_list, color_params)
+            hatched_clusters = ParallelHatching.hatch_tasks_parallel(
+                label_map, hatch_cluster.cluster_center_for_hatch, tasks, step_size, settings.hatch_mode, cyl_rad, self.pixel_per_mm, settings.hatch_engine,
+                progress_callback=lambda fraction: self.report_progress(np.ceil(fraction*cluster_progress)), is_cancelled=self.is_cancelled,
+                random_seed=self.random_seed
+            )
+            if hatched_clusters is None or self.is_cancelled():
+                return None
+            self.report_progress(np.ceil(cluster_progress), force=True)
+            if settings.island_hatching:
+                hatched_clusters = self.order_islands(hatched_clusters, label_map, hatch_cluster.cluster_center_for_hatch, hatch_cluster.color_list)
+            hatched_clusters = self.append_centerlines(hatched_clusters, centerlines, hatch_cluster.color_list)
+            return self.filter_segments(hatched_clusters, self.get_segment_filter(settings))
+
+        return self.hatch_cluster(
+            hatch_cluster.label_map, hatch_cluster.cluster_center_for_hatch, hatch_cluster.color_list, color_params, step_size, settings.hatch_mode, cyl_rad, settings.hatch_engine, cluster_progress,
+            settings.island_hatching, settings.centerline_hatching, self.get_segment_filter(settings)
+        )
+
+    def hatch_clusters_parallel(self, hatch_data, settings):
+        """
+        Hatches every cluster of hatch_data in its own worker process. For cylindrical hatch modes the workers also transform their clusters.
+        The results are stored in the clusters in cluster order. Returns hatch_data, or None if the hatching was cancelled.
+        """
+        cluster_jobs = []
+        cluster_params = []
+        for hatch_cluster in hatch_data.hatch_clusters:
+            color_params = self.get_cluster_color_params(hatch_cluster.color_list, settings, hatch_cluster.label_map)
+            #the workers return transformed clusters, so they are cached separately from the flat results
+            cache_keys = None
+            hatch_params = color_params
+            if self.cache is not None:
+                cache_keys = self.get_color_cache_keys(hatch_cluster, color_params, settings, cylindrical=settings.hatch_mode in ["CylEquidistX", "CylEquidistRad"])
+                hatch_params = [params if key is None or self.cache.lookup(key) is None else None for params, key in zip(color_params, cache_keys)]
+            cluster_params.append((color_params, hatch_params, cache_keys))
+            cluster_jobs.append((hatch_cluster.label_map, hatch_cluster.cluster_center_for_hatch, hatch_cluster.color_list, hatch_params))
+
+        results = ParallelHatching.hatch_clusters_parallel(
+            cluster_jobs, settings.stepsize_mm * self.pixel_per_mm, settings.hatch_mode, settings.cyl_rad_mm, self.pixel_per_mm, settings.hatch_engine,
+            progress_callback=lambda fraction: self.report_progress(np.ceil(fraction*100)), is_cancelled=self.is_cancelled, random_seed=self.random_seed,
+            island_hatching=settings.island_hatching, centerline_hatching=settings.centerline_hatching, segment_filter=self.get_segment_filter(settings)
+        )
+        if results is None or self.is_cancelled():
+            return None
+        for hatch_cluster, hatched_clusters, (color_params, hatch_params, cache_keys) in zip(hatch_data.hatch_clusters, results, cluster_params):
+            if cache_keys is not None:
+                hatched_clusters = self.splice_cached_colors(color_params, hatch_params, cache_keys, hatched_clusters)
+            hatch_cluster.data = hatched_clusters
+        self.report_progress(100, force=True)
+        return hatch_data
+
+    def get_job_key(self, image_matrix, center, settings):
+        """
+        Returns a hash of all inputs of a hatching, see HatchCache.begin. parallel_hatching does not change the result and is not part of the key.
+        """
+        image_matrix = np.ascontiguousarray(image_matrix)
+        palette = settings.db_color_palette
+        settings_items = sorted((key, value) for key, value in vars(settings).items() if key not in ["db_color_palette", "parallel_hatching"])
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(image_matrix.tobytes())
+        digest.update(repr((image_matrix.shape, image_matrix.dtype.str, float(self.pixel_per_mm), [float(c) for c in center], settings_items,
+                            None if palette is None else sorted(vars(palette).items()))).encode())
+        return digest.hexdigest()
+
+    def get_color_cache_keys(self, hatch_cluster, color_params, settings, cylindrical):
+        """
+        Returns the HatchCache key of every color of a cluster (None for skipped colors). The key holds a hash of the color mask in the cluster
+        and everything else the Line Collections of the color depend on. cylindrical marks results that are already cylindrically transformed.
+        The seed is only part of the key of the random patterns, so a new seed does not hatch the other colors again.
+        """
+        center = tuple(float(c) for c in hatch_cluster.cluster_center_for_hatch)
+        cache_keys = []
+        for label, (color, params) in enumerate(zip(hatch_cluster.color_list, color_params)):
+            if params is None:
+                cache_keys.append(None)
+                continue
+            mask = np.packbits(hatch_cluster.label_map == label)
+            mask_hash = hashlib.blake2b(mask.tobytes(), digest_size=16).hexdigest()
+            cache_keys.append((
+                mask_hash, hatch_cluster.label_map.shape, tuple(int(c) for c in color), tuple(params), settings.stepsize_mm, settings.hatch_mode,
+                center, settings.cyl_rad_mm, self.pixel_per_mm, settings.hatch_engine, self.random_seed if params[0] in RANDOM_PATTERNS else None,
+                settings.island_hatching,
+                settings.centerline_hatching, self.get_segment_filter(settings), cylindrical
+            ))
+        return cache_keys
+
+    def splice_cached_colors(self, color_params, hatch_params, cache_keys, hatched_clusters):
+        """
+        Merges the freshly hatched colors (hatch_params) with the cached colors into the Line Collections of the cluster in color order.
+        The fresh results are stored in the cache.
+        """
+        line_collections = []
+        hatched_idx = 0
+        for params, new_params, key in zip(color_params, hatch_params, cache_keys):
+            if params is None:
+                continue
+            if new_params is None:
+                line_collections.extend(self.cache.lookup(key))
+                continue
+            # one Line Collection per color, two for CrossedMeander
+            count = 2 if params[0] == "CrossedMeander" else 1
+            color_collections = hatched_clusters[hatched_idx:hatched_idx+count]
+            hatched_idx += count
+            self.cache.store(key, color_collections)
+            line_collections.extend(color_collections)
+        return line_collections
+
+    def hatch_color(self, label_map, center, color, label, hatch_params, step_size, hatch_mode, cyl_rad, progress_state, hatch_engine="Standard", cross_angle=None):
+        """
+        Hatches a single color of a cluster with its pattern.
+
+        Args:
+            label_map (numpy.ndarray): The label map of the cluster.
+            center (list): The hatch center in pixels.
+            color (numpy.ndarray): The RGB color to hatch.
+            label (int): The label of the color in the label map.
+            hatch_params (tuple): (hatch_pattern, hatch_angle, hatch_distance in mm) of the color.
+            step_size (float): The step size in pixels.
+            hatch_mode (str): "Flat", "CylEquidistX" or "CylEquidistRad".
+            cyl_rad (float): The cylinder radius in pixels.
+            progress_state (list): [finished tasks, total tasks, progress at the end of all tasks] for the progress report.
+            hatch_engine (str): The hatch engine, see get_pattern_generators.
+            cross_angle (int): For CrossedMeander only hatch the pass with this cross angle (0 or 90). None hatches both passes.
+
+        Returns:
+            list: The Line Collections of the color (two for CrossedMeander), or None if the hatching was cancelled.
+        """
+        hatch_pattern, hatch_angle, hatch_distance = hatch_params
+        hatch_distance = hatch_distance * self.pixel_per_mm  # Hatch distance in pixels
+        self.seed_color(color, hatch_params, cross_angle)
+
+        #choose the engine. all engines return the same line collection layout
+        hatch_meander, hatch_circular, hatch_spiral, hatch_radial = self.get_pattern_generators(hatch_engine)
+
+        if hatch_pattern in ["RandomMeander", "FixedMeander"]:
+            line_collections = [hatch_meander(
+                hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state
+            )]
+        elif hatch_pattern == "CrossedMeander":
+            cross_angles = [0, 90] if cross_angle is None else [cross_angle]
+            line_collections = [hatch_meander(
+                hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state, cross_angle=angle
+            ) for angle in cross_angles]
+        elif hatch_pattern == "Circular":
+            line_collections = [hatch_circular(
+                hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state
+            )]
+        elif hatch_pattern == "Spiral":
+            line_collections = [hatch_spiral(
+                hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state
+            )]
+        elif hatch_pattern == "Radial":
+            line_collections = [hatch_radial(
+                hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state
+            )]
+        elif hatch_pattern == "Contour":
+            # one distance transform per color, the same for all engines
+            line_collections = [self.hatch_contour(
+                hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state
+            )]
+        else:
+            print("Unknown hatch method")
+            return []
+
+        if any(line_collection is None for line_collection in line_collections):
+            return None
+        # the Standard generators build lists of Points. every result leaves the engine as an array-backed LineCollection
+        return [line_collection if isinstance(line_collection, LineCollection) else LineCollection.from_polylines(line_collection, color)
+                for line_collection in line_collections]
+
+    def seed_color(self, color, hatch_params, cross_angle=None):
+        # every color gets its own generator, so its random pattern only depends on the color and its settings (see HatchCache).
+        # without a seed the random module is used
+        if self.random_seed is None:
+            self.rng = random
+        else:
+            self.rng = random.Random(zlib.crc32(repr((self.random_seed, tuple(int(c) for c in color), tuple(hatch_params), cross_angle)).encode()))
+
+    def get_pattern_generators(self, hatch_engine):
+        """
+        Returns the (meander, circular, spiral, radial) pattern generators of a hatch engine. All generators share the interface of the
+        Standard generators. Engines that only replace some of the patterns use the Vectorized generators for the others.
+        - "Standard": per-sample loops
+        - "Vectorized": array kernels, identical output to Standard
+        - "RotateScan": meanders from one rotation of the label map
+        - "PixelExact": meanders and rays with exact pixel edge crossings
+        - "Polygon": meanders intersected with the vectorized color regions
+        - "Numba": compiled sampling loops, identical output to Vectorized. Falls back to Vectorized if Numba is not installed
+        """
+        if hatch_engine == "Standard":
+            return self.hatch_meander, self.hatch_circular, self.hatch_spiral, self.hatch_radial
+        if hatch_engine == "Numba" and JitKernels.NUMBA_AVAILABLE:
+            return self.hatch_meander_jit, self.hatch_circular_jit, self.hatch_spiral_jit, self.hatch_radial_jit
+        hatch_meander = self.hatch_meander_vectorized
+        hatch_radial = self.hatch_radial_vectorized
+        if hatch_engine == "RotateScan":
+            hatch_meander = self.hatch_meander_rotate_scan
+        elif hatch_engine == "PixelExact":
+            hatch_meander = self.hatch_meander_pixel_exact
+            hatch_radial = self.hatch_radial_pixel_exact
+        elif hatch_engine == "Polygon":
+            hatch_meander = self.hatch_meander_polygon
+        return hatch_meander, self.hatch_circular_vectorized, self.hatch_spiral_vectorized, hatch_radial
+
+    def get_multicolor_meander(self, hatch_engine):
+        # single sweep meander of an engine, or None if the engine hatches every color on its own
+        return {
+            "Vectorized": self.hatch_meander_multicolor,
+            "RotateScan": self.hatch_meander_rotate_scan_multicolor,
+            "PixelExact": self.hatch_meander_pixel_exact_multicolor,
+            "Polygon": self.hatch_meander_polygon_multicolor,
+            "Numba": self.hatch_meander_multicolor_jit if JitKernels.NUMBA_AVAILABLE else self.hatch_meander_multicolor,
+        }.get(hatch_engine)
+
+    def hatch_cluster(self, label_map, center, color_list, color_params, step_size, hatch_mode, cyl_rad, hatch_engine="Standard", cluster_progress=100,
+                      island_hatching=False, centerline_hatching=False, segment_filter=None):
+        """
+        Hatches all colors of a cluster.
+
+        Args:
+            label_map (numpy.ndarray): The label map of the cluster.
+            center (list): The hatch center in pixels.
+            color_list (list): The sorted colors of the cluster.
+            color_params (list): (hatch_pattern, hatch_angle, hatch_distance in mm) for each color, or None for skipped colors.
+            step_size (float): The step size in pixels.
+            hatch_mode (str): "Flat", "CylEquidistX" or "CylEquidistRad".
+            cyl_rad (float): The cylinder radius in pixels.
+            hatch_engine (str): "Standard", "Vectorized", "RotateScan", "PixelExact", "Polygon" or "Numba" hatch engine.
+            cluster_progress (float): The progress in percent once the cluster is finished.
+            island_hatching (bool): Reorder the polylines of every color island by island, see order_islands.
+            centerline_hatching (bool): Trace thin strokes as centerlines and only hatch the thick parts, see split_centerlines.
+            segment_filter (tuple): (min_segment_length, bridge_gap in mm, bridge_mode) of the segment filter, see get_segment_filter. None for no filter.
+
+        Returns:
+            list: The Line Collections of the cluster in color order (two for CrossedMeander colors), or None if the hatching was cancelled.
+        """
+        # centerlines and the segment filter wrap the hatching of the patterns. the filter runs last, it needs the final polyline order
+        if centerline_hatching or segment_filter is not None:
+            thick_label_map, centerlines = label_map, {}
+            if centerline_hatching:
+                thick_label_map, centerlines = self.split_centerlines(label_map, center, color_list, color_params)
+            hatched_clusters = self.hatch_cluster(thick_label_map, center, color_list, color_params, step_size, hatch_mode, cyl_rad, hatch_engine, cluster_progress,
+                                                  island_hatching)
+            if hatched_clusters is None:
+                return None
+            hatched_clusters = self.append_centerlines(hatched_clusters, centerlines, color_list)
+            return self.filter_segments(hatched_clusters, segment_filter)
+
+        #if all colors share the same meander geometry, every hatch line is only traversed once for all colors
+        if self.get_multicolor_meander(hatch_engine) is not None and self.has_shared_meander_params(color_params):
+            hatched_clusters = self.hatch_cluster_single_sweep(label_map, center, color_list, color_params, step_size, hatch_mode, cyl_rad, cluster_progress, hatch_engine)
+            if island_hatching and hatched_clusters is not None:
+                hatched_clusters = self.order_islands(hatched_clusters, label_map, center, color_list)
+            return hatched_clusters
+
+        hatched_clusters = []
+        for label, color in enumerate(color_list):
+            #check if hatching was cancelled
+            if self.is_cancelled():
+                return None
+
+            # Skip colors without hatch settings (too bright)
+            if color_params[label] is not None:
+                progress_state = [label, len(color_list), cluster_progress]
+                line_collections = self.hatch_color(
+                    label_map, center, np.array(color, dtype=np.int64), label, color_params[label], step_size, hatch_mode, cyl_rad, progress_state, hatch_engine
+                )
+                if line_collections is None:
+                    return None
+                hatched_clusters.extend(line_collections)
+
+            # Update progress bar
+            self.report_progress(np.ceil((label+1) / len(color_list) * cluster_progress), force=True)
+        if island_hatching:
+            hatched_clusters = self.order_islands(hatched_clusters, label_map, center, color_list)
+        return hatched_clusters
+
+    def order_islands(self, line_collections, label_map, center, color_list):
+        """
+        Reorders the polylines of every Line Collection of a cluster island by island: every connected region of a color is hatched
+        completely before the laser moves on to the next one, the islands are visited in a nearest neighbour tour (see HatchKernels.island_order).
+        Colors that occur in many separate islands otherwise need a travel move between the islands on every hatch line.
+        Must be called before the cylindrical transformation, the islands are looked up at the flat coordinates.
+        """
+        labels = {tuple(int(c) for c in color): label for label, color in enumerate(color_list)}
+        islands = {}
+        ordered = []
+        for line_collection in line_collections:
+            label = labels[tuple(int(c) for c in line_collection.color)]
+            # the islands of a color are shared by both passes of a CrossedMeander
+            if label not in islands:
+                islands[label] = HatchKernels.label_islands(label_map, label)
+            ordered.append(HatchKernels.island_order(line_collection, islands[label], center, self.pixel_per_mm))
+        return ordered
+
+    def split_centerlines(self, label_map, center, color_list, color_params):
+        """
+        Separates the thin parts of every color (strokes narrower than CENTERLINE_MAX_WIDTH hatch distances, see HatchKernels.thin_regions)
+        and traces their skeletons into centerline polylines. A thin stroke is then drawn with one laser on move instead of many short
+        hatch lines. Must be called before the cylindrical transformation, the centerlines are in flat coordinates.
+
+        Returns:
+            tuple: (thick_label_map, centerlines). thick_label_map is a copy of the label map where the thin pixels have a label that is not
+            hatched (the label map itself if no color has thin parts). centerlines is {label: LineCollection} of the colors with thin parts.
+        """
+        color_stats = self.get_color_stats(label_map, center)
+        thin_label = len(color_list)
+        thick_label_map = None
+        centerlines = {}
+        for label, params in enumerate(color_params):
+            if params is None:
+                continue
+            thin_regions = HatchKernels.thin_regions(label_map, label, CENTERLINE_MAX_WIDTH*params[2]*self.pixel_per_mm, color_stats)
+            if thin_regions is None:
+                continue
+            thin, x0, y0 = thin_regions
+            if thick_label_map is None:
+                thick_label_map = label_map.astype(np.promote_types(label_map.dtype, np.min_scalar_type(thin_label)))
+            thick_label_map[y0:y0+thin.shape[0], x0:x0+thin.shape[1]][thin] = thin_label
+            centerlines[label] = HatchKernels.hatch_centerlines(thin, x0, y0, center, color_list[label], self.pixel_per_mm)
+        return (label_map if thick_label_map is None else thick_label_map), centerlines
+
+    def append_centerlines(self, line_collections, centerlines, color_list):
+        # appends the centerlines of every color to its first Line Collection (the first pass of a CrossedMeander)
+        if not centerlines:
+            return line_collections
+        labels = {tuple(int(c) for c in color): label for label, color in enumerate(color_list)}
+        result = []
+        for line_collection in line_collections:
+            label = labels[tuple(int(c) for c in line_collection.color)]
+            if label in centerlines:
+                line_collection = LineCollection.concatenate([line_collection, centerlines.pop(label)], line_collection.color)
+            result.append(line_collection)
+        return result
+
+    def get_segment_filter(self, settings):
+        # (min_segment_length, bridge_gap in mm, bridge_mode) of the settings, or None if the filter does nothing
+        if settings.min_segment_length <= 0 and settings.bridge_gap <= 0:
+            return None
+        return settings.min_segment_length/1000, settings.bridge_gap/1000, settings.bridge_mode
+
+    def filter_segments(self, line_collections, segment_filter):
+        """
+        Applies the segment filter (see HatchKernels.filter_segments) to the flat Line Collections of a cluster: short gaps within the
+        hatch lines are bridged, then the polylines below the minimum length are removed. Noisy or antialiased images otherwise give a
+        huge number of tiny segments, each with its own G0 move.
+        """
+        if segment_filter is None:
+            return line_collections
+        min_segment_length, bridge_gap, bridge_mode = segment_filter
+        return [HatchKernels.filter_segments(line_collection, min_segment_length, bridge_gap, bridge_mode) for line_collection in line_collections]
+
+    def has_shared_meander_params(self, color_params):
+        # a single sweep is only possible for deterministic meanders where all colors use the same angle and distance
+        active_params = [params for params in color_params if params is not None]
+        if not active_params:
+            return False
+        if active_params[0][0] not in ["FixedMeander", "CrossedMeander"]:
+            return False
+        return all(params == active_params[0] for params in active_params)
+
+    def hatch_cluster_single_sweep(self, label_map, center, color_list, color_params, step_size, hatch_mode, cyl_rad, cluster_progress, hatch_engine="Vectorized"):
+        """
+        Hatches all colors of a cluster with one meander sweep. Each hatch line is traversed once and split into runs by label.
+        Returns the same list of Line Collections (in color order) as the per-color loop of hatch_cluster.
+        """
+        colors = {label: np.array(color, dtype=np.int64) for label, color in enumerate(color_list) if color_params[label] is not None}
+        hatch_pattern, hatch_angle, hatch_distance = next(params for params in color_params if params is not None)
+        hatch_distance = hatch_distance * self.pixel_per_mm  # Hatch distance in pixels
+        cross_angles = [0, 90] if hatch_pattern == "CrossedMeander" else [None]
+        hatch_meander_multicolor = self.get_multicolor_meander(hatch_engine)
+
+        sweeps = []
+        for sweep_idx, cross_angle in enumerate(cross_angles):
+            progress_state = [sweep_idx, len(cross_angles), cluster_progress]
+            line_collections = hatch_meander_multicolor(
+                hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad, progress_state, cross_angle=cross_angle
+            )
+            if line_collections is None or self.is_cancelled():
+                return None
+            sweeps.append(line_collections)
+
+        #sort the line collections back into color order. CrossedMeander has two collections per color
+        hatched_clusters = []
+        for label in colors:
+            for line_collections in sweeps:
+                hatched_clusters.append(line_collections[label])
+
+        self.report_progress(np.ceil(cluster_progress), force=True)
+        return hatched_clusters
+
+    def hatch_meander(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        line_collection_poly=[]
+        hatch_line_dir=1
+        hatch_x_finished=False
+        hatch_y_finished=False
+        
+        # Choose slice angle based on user input. theta is between 0 and 179 degrees
+        theta = HatchKernels.meander_angle(hatch_pattern, hatch_angle, cross_angle, self.rng)
+        theta_rad = np.radians(theta)  # Convert theta to radians
+        cos_theta = np.cos(theta_rad)
+        sin_theta = np.sin(theta_rad)
+
+        #calculate step size in x and y direction. catch special cases of 0 an d 90 degrees
+        if theta == 0:
+            max_lines=label_map.shape[0]/hatch_distance
+            step_start_y=hatch_distance
+            step_start_x=1
+            hatch_x_finished = True
+        elif theta == 90:
+            max_lines=label_map.shape[1]/hatch_distance
+            step_start_x=hatch_distance
+            step_start_y=1
+            hatch_y_finished=True
+        else:
+            step_start_y = np.abs(hatch_distance/cos_theta)
+            step_start_x = np.abs(hatch_distance/sin_theta)
+            max_lines=label_map.shape[0]/step_start_y+label_map.shape[1]/step_start_x
+
+        # Determine the bounding box of the cluster.
+        min_y = -np.ceil(step_start_y)
+        max_y = label_map.shape[0]+np.ceil(step_start_y)
+        min_x = -np.ceil(step_start_x)
+        max_x = label_map.shape[1]+np.ceil(step_start_x)
+
+        # center = self.center_for_hatch
+        #center = [(max_x+min_x)/2, (max_y+min_y)/2] #depreciated: no defined globally
+
+        # Determine the starting point of the hatch lines.
+        if cos_theta >= 0:
+            hatch_start_x = max_x
+            hatch_start_y = min_y
+            incline = -1
+        else:
+            hatch_start_x = min_x
+            hatch_start_y = min_y
+            incline = 1
+
+        # Generate hatch lines within the bounding box
+        line_count = 0
+        hatching_done = False
+        #loop over hatchlines. will set hatching done when both x and y linestarts are outsinde the bounding box
+        while not hatching_done:
+            #check if hatching was cancelled
+            if self.is_cancelled():
+                return None
+            
+            prev_x = None
+            prev_y = None
+            x_target = hatch_start_x
+            if hatch_mode == "CylEquidistX":
+                if np.abs(x_target-center[0])>cyl_rad:
+                    point_outside=True
+                    x=0 #just a dummy
+                else:
+                    x=np.asin((x_target-center[0])/cyl_rad)*(cyl_rad)+center[0]
+            else:
+                x=x_target
+            y = hatch_start_y
+            polyline = []
+            polyline_cache=[]
+            point_outside=False
+            #loop over one hatchline until it is outside the bounding box. this is looped over A LOT. Limit ALL function calls as much as possible
+            current_label=-1 #use non existent label when the point is outside the image
+            while ((x >= min_x or incline==1) and (x <= max_x or incline==-1) and y >= min_y):
+                #use a special rounding for x and y for efficiency. we know that they can never be negative (else it will be caught anyway)
+                if int(y)==int(y-0.5):
+                    y_round=int(y+1)
+                else:
+                    y_round=int(y)
+                if int(x)==int(x-0.5):
+                    x_round=int(x+1)
+                else:
+                    x_round=int(x)
+                    
+                #check if the current point is outside the image
+                if point_outside or y_round>=label_map.shape[0] or y_round<0 or x_round>= label_map.shape[1] or x_round<0:
+                    if polyline:
+                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
+                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
+                        z1=0
+                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                        polyline_cache.append(polyline)
+                        polyline=[]
+                    point_outside=False
+                    current_label=-1
+                else:
+                    current_label=label_map[y_round, x_round]
+
+                #check if the current pixel is the same color as the hatch color
+                if current_label==label: #single integer compare on the label map
+                    
+                    if polyline:
+                        # polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                        pass
+                    else:
+                        x1=(x-center[0])/self.pixel_per_mm
+                        y1=(y-center[1])/self.pixel_per_mm
+                        z1=0
+                        polyline.append(Point(x1, y1, z1, 0, color[0], color[1], color[2]))
+                else:
+                    if polyline:
+                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
+                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
+                        z1=0
+                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                        polyline_cache.append(polyline)
+                        polyline=[]
+                        
+                #increase the x/y step and keep track of last position
+                x_target -= cos_theta * step_size
+                if hatch_mode == "CylEquidistX":
+                    if np.abs(x_target-center[0])>cyl_rad:
+                        point_outside=True
+                    else:
+                        prev_x=x
+                        x=np.asin((x_target-center[0])/cyl_rad)*(cyl_rad)+center[0]
+                else:
+                    prev_x=x
+                    x=x_target
+                prev_y = y
+                y -= sin_theta * step_size
+
+            #finally append the last line if there is one
+            if polyline:
+                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
+                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
+                        z1=0
+                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                        polyline_cache.append(polyline)
+                        polyline=[]
+            #append polyines here in correct order for meandering
+            if hatch_line_dir==1:
+                for poly_line in polyline_cache:
+                    line_collection_poly.append(poly_line)
+            else:
+                for poly_line in reversed(polyline_cache):
+                    poly_line[0].move_type=1
+                    poly_line[-1].move_type=0
+                    line_collection_poly.append(list(reversed(poly_line)))
+
+            hatch_line_dir*=-1
+
+            # move to next line. First move along y, then along x
+            if not hatch_y_finished:
+                hatch_start_y += step_start_y 
+                if hatch_start_y >= max_y:
+                    hatch_y_finished = True #check if we are at the end of the bounding box in y-direction
+            elif not hatch_x_finished:
+                if hatch_y_finished and not hatch_start_y>=max_y:
+                    hatch_start_y=max_y+1 # this is just for 90deg case. y hast to be set manually
+                hatch_start_x += incline*step_start_x
+                if (hatch_start_x <= min_x or incline==1) and (hatch_start_x >= max_x or incline==-1): #check if we are at the end of the bounding box in x-direction
+                    hatch_x_finished = True
+            else:
+                hatching_done = True
+
+            #update progress bar
+            line_count+=1
+            current_state = np.ceil((progress_state[0]+line_count/max_lines)/progress_state[1]*progress_state[2])
+            self.report_progress(current_state)
+        return line_collection_poly
+
+    def hatch_meander_vectorized(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # same interface as hatch_meander, but uses the vectorized scanline engine
+        return HatchKernels.hatch_meander_vectorized(
+            hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center), rng=self.rng
+        )
+
+    def hatch_meander_multicolor(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # single-pass sweep for all colors in colors ({label: color}). returns {label: line collection}
+        return HatchKernels.hatch_meander_multicolor(
+            hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center)
+        )
+        
+    def hatch_meander_rotate_scan(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # same interface as hatch_meander. the rotate-scan only works for flat geometry, CylEquidistX uses the vectorized scanline engine
+        if hatch_mode == "CylEquidistX":
+            return self.hatch_meander_vectorized(
+                hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state, cross_angle
+            )
+
+        return HatchKernels.hatch_meander_rotate_scan(
+            hatch_pattern, hatch_distance, hatch_angle, label_map, center, color, label, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center), rng=self.rng
+        )
+
+    def hatch_meander_rotate_scan_multicolor(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # single-pass rotate-scan for all colors in colors ({label: color}). returns {label: line collection}
+        if hatch_mode == "CylEquidistX":
+            return self.hatch_meander_multicolor(
+                hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad, progress_state, cross_angle
+            )
+
+        return HatchKernels.hatch_meander_rotate_scan_multicolor(
+            hatch_pattern, hatch_distance, hatch_angle, label_map, center, colors, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def hatch_meander_pixel_exact(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # same interface as hatch_meander. the step size is not needed, every crossed pixel is visited once
+        return HatchKernels.hatch_meander_pixel_exact(
+            hatch_pattern, hatch_distance, hatch_angle, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center), rng=self.rng
+        )
+
+    def hatch_meander_pixel_exact_multicolor(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # single-pass pixel-exact meander for all colors in colors ({label: color}). returns {label: line collection}
+        return HatchKernels.hatch_meander_pixel_exact_multicolor(
+            hatch_pattern, hatch_distance, hatch_angle, label_map, center, colors, hatch_mode, cyl_rad, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def hatch_meander_polygon(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # same interface as hatch_meander. the step size is not needed, the lines are intersected with the color polygons
+        return HatchKernels.hatch_meander_polygon(
+            hatch_pattern, hatch_distance, hatch_angle, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center), rng=self.rng
+        )
+
+    def hatch_meander_polygon_multicolor(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # single-pass polygon engine for all colors in colors ({label: color}). returns {label: line collection}
+        return HatchKernels.hatch_meander_polygon_multicolor(
+            hatch_pattern, hatch_distance, hatch_angle, label_map, center, colors, hatch_mode, cyl_rad, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def hatch_circular(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        line_collection_poly=[]
+        # Maximum Radius of one circle defined by the cluster diagonal, plus extra space for one hatch line
+        max_rad = np.ceil(
+            np.sqrt((label_map.shape[0]/2)**2+(label_map.shape[1]/2)**2))+np.ceil(hatch_distance)
+
+        # center = self.center_for_hatch
+        # center = [(label_map.shape[1]-1)/2,
+        #           (label_map.shape[0]-1)/2]
+
+        point_outside=False
+        hatch_rad = hatch_distance/10 #just the start radius is smaller
+
+        #loop over circles. will stop when the circle is outside the image
+        while hatch_rad <= max_rad:
+            #check if hatching was cancelled
+            if self.is_cancelled():
+                return None
+            
+            angle_res = step_size/hatch_rad
+            if angle_res > 2*np.pi/36:
+                angle_res = 2*np.pi/36
+            # Randomly choose theta between 0 and 19 degrees
+            start_angle = np.deg2rad(np.floor(self.rng.uniform(0, 20)))
+            polyline = []
+            current_label=-1 #use non existent label when the point is outside the image
+
+            #loop over single circle. points are known so use a foor loop. The inside is called A LOT. Use as few function calls as possible
+            for angle in np.linspace(start_angle, start_angle+2*np.pi, int(np.ceil(2*np.pi/angle_res))):
+                x = center[0]+hatch_rad*np.cos(angle)
+                if hatch_mode == "CylEquidistX":
+                    if np.abs(x-center[0])>cyl_rad:
+                        point_outside=True
+                    else:
+                        x=np.asin((x-center[0])/cyl_rad)*(cyl_rad)+center[0]
+                y = center[1]+hatch_rad*np.sin(angle)
+
+                #use a special rounding for x and y for efficiency. we know that they can never be negative (else it will be caught anyway)
+                if int(y)==int(y-0.5):
+                    y_round=int(y+1)
+                else:
+                    y_round=int(y)
+                if int(x)==int(x-0.5):
+                    x_round=int(x+1)
+                else:
+                    x_round=int(x)
+
+                #check if current pixel is outside the image
+                if point_outside or y_round>=label_map.shape[0] or y_round<0 or x_round>= label_map.shape[1] or x_round<0:
+                    if polyline:
+                        if len(polyline) > 1:
+                            line_collection_poly.append(polyline)
+                        polyline = []
+                    point_outside=False
+                    current_label=-1
+                else:
+                    current_label=label_map[y_round, x_round]
+
+                #check if current pixel is the color we want to hatch
+                if current_label==label: #single integer compare on the label map
+                    x1 = (x-center[0])/self.pixel_per_mm
+                    y1 = (y-center[1])/self.pixel_per_mm
+                    z1 = 0
+                    if polyline:
+                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                    else:
+                        polyline.append(Point(x1, y1, z1, 0, color[0], color[1], color[2]))
+                else:
+                    if polyline:
+                        if len(polyline) > 1:
+                            line_collection_poly.append(polyline)
+                        polyline = []
+
+                angle += angle_res
+            if polyline:  # if we have a last line add it
+                if len(polyline) > 1:
+                        line_collection_poly.append(polyline)
+                polyline = []
+            hatch_rad += hatch_distance
+            #update progress bar
+            current_state = np.ceil((progress_state[0]+hatch_rad/max_rad)/progress_state[1]*progress_state[2])
+            self.report_progress(current_state)
+        return line_collection_poly
+            
+    def hatch_circular_vectorized(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        # same interface as hatch_circular, but evaluates whole rings as arrays
+        return HatchKernels.hatch_circular_vectorized(
+            hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled, color_stats=self.get_color_stats(label_map, center), rng=self.rng
+        )
+
+    def hatch_contour(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        # same interface as hatch_circular. the rings follow the pixels of the color, so the step size and the hatch mode are not used
+        return HatchKernels.hatch_contour(
+            hatch_distance, label_map, center, color, label, self.pixel_per_mm,
+            progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled, color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def hatch_spiral(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        line_collection_poly=[]
+        # Maximum Radius of one circle defined by the cluster diagonal
+        max_rad = np.ceil(
+            np.sqrt((label_map.shape[0]/2)**2+(label_map.shape[1]/2)**2))+np.ceil(hatch_distance)
+
+        # center = self.center_for_hatch
+        # center = [(label_map.shape[1]-1)/2,
+        #           (label_map.shape[0]-1)/2]
+
+        x = center[0]
+        y = center[1]
+        hatch_rad_avg=hatch_distance/2
+        point_outside=False
+
+        #loop over spiral. will stop when the spiral is outside the image
+        while hatch_rad_avg+hatch_distance/2 <= max_rad:
+            #check if hatching was cancelled
+            if self.is_cancelled():
+                return None
+            
+            angle_res = step_size/hatch_rad_avg
+            if angle_res > 2*np.pi/36:
+                angle_res = 2*np.pi/36
+            polyline = []
+            angles = np.linspace(0, 2*np.pi, int(np.ceil(2*np.pi/angle_res)))
+            hatch_radii = np.linspace(hatch_rad_avg-hatch_distance/2, hatch_rad_avg+hatch_distance/2, int(np.ceil(2*np.pi/angle_res))) 
+            current_label=-1 #use non existent label when the point is outside the image
+
+            #loop over single circle of the spiral. points are known so use a foor loop. The inside is called A LOT. Use as few function calls as possible
+            for angle, hatch_rad in zip(angles, hatch_radii):
+                x = center[0]+hatch_rad*np.cos(angle)
+                if hatch_mode == "CylEquidistX":
+                    if np.abs(x-center[0])>cyl_rad:
+                        point_outside=True
+                    else:
+                        x=np.asin((x-center[0])/cyl_rad)*(cyl_rad)+center[0]
+                y = center[1]+hatch_rad*np.sin(angle)
+
+                #use a special rounding for x and y for efficiency. we know that they can never be negative (else it will be caught anyway)
+                if int(y)==int(y-0.5):
+                    y_round=int(y+1)
+                else:
+                    y_round=int(y)
+                if int(x)==int(x-0.5):
+                    x_round=int(x+1)
+                else:
+                    x_round=int(x)
+
+                #check if current pixel is outside the image
+                if point_outside or y_round>=label_map.shape[0] or y_round<0 or x_round>= label_map.shape[1] or x_round<0:
+                    if polyline:
+                        if len(polyline) > 1:
+                            line_collection_poly.append(polyline)
+                        polyline = []
+                    point_outside=False
+                    current_label=-1
+                else:
+                    current_label=label_map[y_round, x_round]
+
+                #check if current pixel is the color we want to hatch        
+                if current_label==label: #single integer compare on the label map
+                    x1 = (x-center[0])/self.pixel_per_mm
+                    y1 = (y-center[1])/self.pixel_per_mm
+                    z1 = 0
+                    if polyline:
+                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                    else:
+                        polyline.append(Point(x1, y1, z1, 0, color[0], color[1], color[2]))
+
+                else:
+                    if polyline:
+                        if len(polyline) > 1:
+                            line_collection_poly.append(polyline)
+                        polyline = []
+                angle += angle_res
+            if polyline:  # if we have a last line add it
+                if len(polyline) > 1:
+                        line_collection_poly.append(polyline)
+                polyline = []
+            hatch_rad_avg += hatch_distance
+            #update progress bar
+            current_state = np.ceil((progress_state[0]+hatch_rad_avg/max_rad)/progress_state[1]*progress_state[2])
+            self.report_progress(current_state)
+        return line_collection_poly
+            
+    def hatch_spiral_vectorized(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        # same interface as hatch_spiral, but evaluates whole spiral turns as arrays
+        return HatchKernels.hatch_spiral_vectorized(
+            hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled, color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def hatch_radial(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad,progress_state):
+        line_collection_poly=[]
+        hatch_line_dir=1
+        # We have to pad the array, since start points of hatchlines might lay outside the image
+        # Maximum Radius of one circle defined by the cluster diagonal
+        max_rad = np.ceil(
+            np.sqrt((label_map.shape[0]/2)**2+(label_map.shape[1]/2)**2))+np.ceil(hatch_distance)
+        
+        # center = self.center_for_hatch
+        # center = [(label_map.shape[1]-1)/2,
+        #           (label_map.shape[0]-1)/2]
+
+        hatch_start_x = center[0]
+        hatch_start_y = center[1]
+        angle_res=np.atan(hatch_distance/max_rad)*2
+        angles = np.linspace(0, 2*np.pi, int(np.ceil(2*np.pi/angle_res)))
+        
+        ray_count=0
+        
+        #loop over radial rays. ray number is known so use a for loop
+        for angle in angles:
+            #check if hatching was cancelled
+            if self.is_cancelled():
+                return None
+            
+            sin_angle=np.sin(angle)
+            cos_angle=np.cos(angle)
+            x_target = hatch_start_x
+            prev_x=None
+            prev_y=None
+            if hatch_mode == "CylEquidistX":
+                if np.abs(x_target-center[0])>cyl_rad:
+                    point_outside=True
+                    x=0 # just a dummy
+                else:
+                    x=np.asin((x_target-center[0])/cyl_rad)*(cyl_rad)+center[0]
+            else:
+                x=x_target
+            y = hatch_start_y
+
+            polyline = []
+            polyline_cache=[]
+            point_outside=False
+            current_label=-1 #use non existent label when the point is outside the image
+
+            #loop over single ray. stop when the ray is outside the image. This is looped over A LOT. Limit ALL function calls as much as possible
+            while np.sqrt((x_target-center[0])**2+(y-center[1])**2) <= max_rad:
+                #use a special rounding for x and y for efficiency. we know that they can never be negative (else it will be caught anyway)
+                if int(y)==int(y-0.5):
+                    y_round=int(y+1)
+                else:
+                    y_round=int(y)
+                if int(x)==int(x-0.5):
+                    x_round=int(x+1)
+                else:
+                    x_round=int(x)
+
+                #check if current pixel is outside the image
+                if point_outside or y_round>=label_map.shape[0] or y_round<0 or x_round>= label_map.shape[1] or x_round<0:
+                    if polyline:
+                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
+                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
+                        z1=0
+                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                        polyline_cache.append(polyline)
+                        polyline=[]
+                    point_outside=False
+                    current_label=-1
+                else:
+                    current_label=label_map[y_round, x_round]
+                
+                #check if current pixel is the color we want to hatch
+                if current_label==label: #single integer compare on the label map
+                    x1=(x-center[0])/self.pixel_per_mm
+                    y1=(y-center[1])/self.pixel_per_mm
+                    z1=0
+                    if polyline:
+                        pass
+                        # polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                    else:
+                        polyline.append(Point(x1, y1, z1, 0, color[0], color[1], color[2]))
+                else:
+                    if polyline:
+                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
+                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
+                        z1=0
+                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                        polyline_cache.append(polyline)
+                        polyline=[]
+                x_target += cos_angle * step_size
+                if hatch_mode == "CylEquidistX":
+                    if np.abs(x_target-center[0])>cyl_rad:
+                        point_outside=True
+                    else:
+                        prev_x=x
+                        x=np.asin((x_target-center[0])/cyl_rad)*(cyl_rad)+center[0]
+                else:
+                    prev_x=x
+                    x=x_target
+                prev_y=y
+                y += sin_angle * step_size
+            
+            #finally append line if there is an open one
+            if polyline:
+                    x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
+                    y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
+                    z1=0
+                    polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
+                    polyline_cache.append(polyline)
+                    polyline=[]
+
+            #append polyines here in correct order for meandering
+            if hatch_line_dir==1:
+                for poly_line in polyline_cache:
+                    line_collection_poly.append(poly_line)
+            else:
+                for poly_line in reversed(polyline_cache):
+                    poly_line[0].move_type=1
+                    poly_line[-1].move_type=0
+                    line_collection_poly.append(list(reversed(poly_line)))
+
+            ray_count+=1
+            hatch_line_dir*=-1
+
+            #update progress bar
+            current_state = np.ceil((progress_state[0]+ray_count/len(angles))/progress_state[1]*progress_state[2])
+            self.report_progress(current_state)
+            #print("finished radial ray " + str(ray_count) + " / " + str(len(angles)))
+        return line_collection_poly
+            
+            
+    def hatch_radial_vectorized(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        # same interface as hatch_radial, but evaluates batches of rays as arrays
+        return HatchKernels.hatch_radial_vectorized(
+            hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled, color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def hatch_radial_pixel_exact(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        # same interface as hatch_radial. the step size is not needed, every crossed pixel is visited once
+        return HatchKernels.hatch_radial_pixel_exact(
+            hatch_distance, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled, color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def hatch_meander_jit(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # same interface as hatch_meander, but uses the compiled kernels of the Numba engine
+        return JitKernels.hatch_meander_jit(
+            hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center), rng=self.rng
+        )
+
+    def hatch_meander_multicolor_jit(self, hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad, progress_state, cross_angle=None):
+        # compiled single-pass sweep for all colors in colors ({label: color}). returns {label: line collection}
+        return JitKernels.hatch_meander_multicolor_jit(
+            hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad, self.pixel_per_mm,
+            cross_angle=cross_angle, progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled,
+            color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def hatch_circular_jit(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        # same interface as hatch_circular, but uses the compiled kernels of the Numba engine
+        return JitKernels.hatch_circular_jit(
+            hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled, color_stats=self.get_color_stats(label_map, center), rng=self.rng
+        )
+
+    def hatch_spiral_jit(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        # same interface as hatch_spiral, but uses the compiled kernels of the Numba engine
+        return JitKernels.hatch_spiral_jit(
+            hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled, color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def hatch_radial_jit(self, hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, progress_state):
+        # same interface as hatch_radial, but uses the compiled kernels of the Numba engine
+        return JitKernels.hatch_radial_jit(
+            hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, self.pixel_per_mm,
+            progress_callback=self.get_progress_callback(progress_state), is_cancelled=self.is_cancelled, color_stats=self.get_color_stats(label_map, center)
+        )
+
+    def make_hatch_cylindrical(self, hatched_clusters,cyl_rad_mm=100):
+        # wraps every Line Collection of the cluster onto the cylinder (see HatchKernels.wrap_cylindrical)
+        hatched_clusters_cylindrical = []
+        for line_collection in hatched_clusters:
+            #check if hatching was cancelled
+            if self.is_cancelled():
+                return None
+            if not isinstance(line_collection, LineCollection):
+                line_collection = LineCollection.from_polylines(line_collection)
+            hatched_clusters_cylindrical.append(HatchKernels.wrap_cylindrical(line_collection, cyl_rad_mm))
+        return hatched_clusters_cylindrical
@@ -0,0 +1,1997 @@
+import numpy as np
+import random
+import cv2
+from HelperClasses import LineCollection
+
+'''
+This module contains vectorized hatch kernels that are used as an alternative to the per-sample loops of the HatchEngine class.
+The kernels only depend on NumPy (and OpenCV for the rotate-scan engine) and do not touch any GUI elements, so they can be used from
+worker threads and processes.
+
+The kernels work on a label map of the cluster instead of the RGB matrix: every pixel holds the index of its color in the sorted color list.
+All kernels generate the sample coordinates of many hatch lines at once as NumPy arrays, gather the labels with one fancy-index
+operation and detect color runs with np.diff. The output is an array-backed LineCollection (see HelperClasses) with the same polylines
+as the per-sample loops of the HatchEngine, including the meander reversal of every second hatch line. The points are written straight
+into its arrays, no Point objects are created.
+With a ColorStats index of the label map, the kernels only evaluate the hatch lines, rings and rays that can reach the bounding box
+(or radius range) of the hatched colors. Lines are only cut at their end, so the result is the same as without the index.
+Meander lines at 0 and 90 degrees are taken from the runs of their image row or column (see _axis_line_runs). This fast path is used by
+the Vectorized, Numba and tiled engines, the Standard engine keeps its per-sample loop.
+'''
+
+# Maximum number of samples that are evaluated in one batch. Limits the size of the temporary coordinate arrays.
+MAX_BATCH_SAMPLES = 2_000_000
+
+# Tolerance in pixels (or radians) when lines and rays are culled against the bounding box of a color, see ColorStats.
+CULL_TOLERANCE = 1e-6
+
+# Candidate slice angles in degrees and maximum number of label map pixels that are scanned per angle by estimate_meander_costs.
+OPTIMIZER_ANGLES = np.arange(0, 180, 15)
+OPTIMIZER_MAX_PIXELS = 1_000_000
+
+# Maximum deviation in pixels of the simplified centerlines from the skeleton pixels, see hatch_centerlines.
+CENTERLINE_TOLERANCE = 0.5
+
+# Maximum angle in degrees between a gap and the runs before and after it that is still bridged, see bridge_gaps.
+BRIDGE_MAX_ANGLE = 1
+
+
+def legacy_round(values):
+    """
+    Vectorized version of the special rounding used in the per-sample loops of the HatchEngine.
+    Values are rounded up if int(v) == int(v-0.5), else they are truncated towards zero.
+
+    Args:
+        values (numpy.ndarray): Sample coordinates in pixels.
+
+    Returns:
+        numpy.ndarray: Rounded pixel indices as int64.
+    """
+    truncated = np.trunc(values)
+    return np.where(truncated == np.trunc(values - 0.5), np.trunc(values + 1), truncated).astype(np.int64)
+
+
+def build_label_map(image_matrix, color_list):
+    """
+    Converts an RGB image matrix into a compact integer label map. Every pixel holds the index of its color in color_list,
+    so pattern generators can test color membership with a single integer compare.
+
+    Args:
+        image_matrix (numpy.ndarray): The image matrix with shape (height, width, 3).
+        color_list (list): Sorted list of RGB tuples, e.g. from HatchEngine.get_sorted_unique_colors. Has to contain all image colors.
+
+    Returns:
+        numpy.ndarray: Label map with shape (height, width). uint8 for up to 256 colors, uint16 for up to 65536, else uint32.
+    """
+    if len(color_list) <= 256:
+        dtype = np.uint8
+    elif len(color_list) <= 65536:
+        dtype = np.uint16
+    else:
+        dtype = np.uint32
+
+    # pack the rgb channels into one integer key per pixel and look up the keys in the sorted key list of the colors
+    image_keys = pack_rgb(image_matrix)
+    color_keys = pack_rgb(np.array(color_list, dtype=np.uint32).reshape(-1, 3))
+    key_order = np.argsort(color_keys)
+    key_index = np.searchsorted(color_keys[key_order], image_keys)
+    return key_order.astype(dtype)[key_index]
+
+
+def pack_rgb(image_matrix):
+    """
+    Packs the last axis (r, g, b) of an array into a single uint32 key r<<16 | g<<8 | b.
+    """
+    image_matrix = np.asarray(image_matrix, dtype=np.uint32)
+    return (image_matrix[..., 0] << 16) | (image_matrix[..., 1] << 8) | image_matrix[..., 2]
+
+
+class ColorStats:
+    def __init__(self, label_map, center):
+        """
+        Statistics index of the colors of a label map: the pixel count, the bounding box and the distance range from the hatch center of
+        every label. The kernels use it to restrict their hatch lines, rings and rays to the region that can contain a color, so small
+        colors are cheap to hatch.
+
+        Args:
+            label_map (numpy.ndarray): Label map of the cluster, see build_label_map.
+            center (list): Hatch center in pixels.
+        """
+        self.label_map = label_map  # the index belongs to this label map, see HatchEngine.get_color_stats
+        self.center = (float(center[0]), float(center[1]))
+        height, width = label_map.shape[0], label_map.shape[1]
+        label_count = int(label_map.max(initial=0))+1
+
+        self.pixel_counts = np.zeros(label_count, dtype=np.int64)
+        self.min_x = np.full(label_count, width, dtype=np.int64)
+        self.max_x = np.full(label_count, -1, dtype=np.int64)
+        self.min_y = np.full(label_count, height, dtype=np.int64)
+        self.max_y = np.full(label_count, -1, dtype=np.int64)
+        # the distance range is only needed by the ring patterns, it is collected on the first call of radius_range
+        self.min_rad = None
+        self.max_rad = None
+
+        # evaluate the image in blocks of rows to limit the temporary arrays
+        for labels, xs, ys in self._pixel_blocks():
+            self.pixel_counts += np.bincount(labels, minlength=label_count)
+            np.minimum.at(self.min_x, labels, xs)
+            np.maximum.at(self.max_x, labels, xs)
+            np.minimum.at(self.min_y, labels, ys)
+            np.maximum.at(self.max_y, labels, ys)
+
+    def _pixel_blocks(self):
+        # yields (labels, x, y) of all pixels in blocks of rows
+        height, width = self.label_map.shape[0], self.label_map.shape[1]
+        batch_rows = max(1, MAX_BATCH_SAMPLES // max(width, 1))
+        x = np.arange(width)
+        for first_row in range(0, height, batch_rows):
+            labels = self.label_map[first_row:first_row+batch_rows]
+            y = np.arange(first_row, first_row+labels.shape[0])
+            yield labels.ravel(), np.tile(x, len(y)), np.repeat(y, width)
+
+    def _collect_radii(self):
+        # squared distances while collecting, the square root is only taken of the results
+        min_rad_sq = np.full(len(self.pixel_counts), np.inf)
+        max_rad_sq = np.zeros(len(self.pixel_counts))
+        for labels, xs, ys in self._pixel_blocks():
+            rad_sq = (xs-self.center[0])**2+(ys-self.center[1])**2
+            np.minimum.at(min_rad_sq, labels, rad_sq)
+            np.maximum.at(max_rad_sq, labels, rad_sq)
+        self.min_rad = np.sqrt(min_rad_sq)
+        self.max_rad = np.sqrt(max_rad_sq)
+
+    def _present(self, labels):
+        labels = np.array(list(labels), dtype=np.int64)
+        labels = labels[(labels >= 0) & (labels < len(self.pixel_counts))]
+        return labels[self.pixel_counts[labels] > 0]
+
+    def bounds(self, labels):
+        """
+        Returns:
+            tuple: (min_x, max_x, min_y, max_y) of the pixels of the labels, expanded by two pixels to cover the rounding of the samples
+            (legacy_round maps samples down to -1.5 to the pixel 0), or None if the labels have no pixels.
+        """
+        labels = self._present(labels)
+        if len(labels) == 0:
+            return None
+        return (float(self.min_x[labels].min()-2), float(self.max_x[labels].max()+2),
+                float(self.min_y[labels].min()-2), float(self.max_y[labels].max()+2))
+
+    def target_bounds(self, labels, hatch_mode, cyl_rad):
+        """
+        Returns the bounds of the labels in the coordinates the hatch lines, rings and rays are straight in. For CylEquidistX these are the
+        coordinates before the cylinder mapping, the mapping is monotonic in x, so the bounds are simply mapped back.
+        """
+        bounds = self.bounds(labels)
+        if bounds is None or hatch_mode != "CylEquidistX":
+            return bounds
+        min_x, max_x, min_y, max_y = bounds
+        min_x, max_x = np.sin(np.clip((np.array([min_x, max_x])-self.center[0])/cyl_rad, -np.pi/2, np.pi/2))*cyl_rad+self.center[0]
+        return (float(min_x), float(max_x), min_y, max_y)
+
+    def radius_range(self, labels, hatch_mode, cyl_rad):
+        """
+        Returns:
+            tuple: (min_rad, max_rad) in pixels. Rings and rays outside this distance from the center can not hit the labels.
+            (inf, -inf) if the labels have no pixels.
+        """
+        if hatch_mode == "CylEquidistX":
+            bounds = self.target_bounds(labels, hatch_mode, cyl_rad)
+            if bounds is None:
+                return np.inf, -np.inf
+            corners = _bounds_corners(bounds)-self.center
+            dx = max(bounds[0]-self.center[0], self.center[0]-bounds[1], 0)
+            dy = max(bounds[2]-self.center[1], self.center[1]-bounds[3], 0)
+            return float(np.hypot(dx, dy)), float(np.hypot(corners[:, 0], corners[:, 1]).max())
+        labels = self._present(labels)
+        if len(labels) == 0:
+            return np.inf, -np.inf
+        if self.min_rad is None:
+            self._collect_radii()
+        # a sample hits a pixel up to 1.5 pixels away from its center in x and y (see legacy_round)
+        return max(float(self.min_rad[labels].min())-2.5, 0.0), float(self.max_rad[labels].max())+2.5
+
+
+def _bounds_corners(bounds):
+    min_x, max_x, min_y, max_y = bounds
+    return np.array([[min_x, min_y], [max_x, min_y], [min_x, max_y], [max_x, max_y]], dtype=np.float64)
+
+
+def _index_batches(count, batch_size, keep=None):
+    """
+    Splits the indices 0..count-1 into batches (first, last) of consecutive indices. With a keep mask only the kept indices are
+    batched and a batch never spans a dropped index, so the batches keep the global line (or ray) indices for the meander reversal.
+    """
+    if keep is None:
+        return [(first, min(first+batch_size, count)) for first in range(0, count, batch_size)]
+    kept = np.flatnonzero(keep)
+    batches = []
+    for run in np.split(kept, np.flatnonzero(np.diff(kept) != 1)+1):
+        if len(run) == 0:
+            continue
+        stop = int(run[-1])+1
+        batches.extend((first, min(first+batch_size, stop)) for first in range(int(run[0]), stop, batch_size))
+    return batches
+
+
+def _cull_lines(color_stats, labels, hatch_mode, cyl_rad, starts_x, starts_y, cos_theta, sin_theta):
+    """
+    Restricts the meander lines to the bounding box of the labels (see ColorStats). Lines whose offset along the normal misses the box
+    are dropped, the other lines only have to be followed until they leave the box. Only the end of a line is cut, so the sample
+    coordinates of the remaining part do not change.
+
+    Returns:
+        tuple: (keep, t_limit) with the mask of the lines to hatch and the length after which every line can not hit the labels anymore.
+        (None, None) without color statistics.
+    """
+    if color_stats is None:
+        return None, None
+    bounds = color_stats.target_bounds(labels, hatch_mode, cyl_rad)
+    if bounds is None:
+        return np.zeros(len(starts_x), dtype=bool), None
+    d, n = _line_frame(cos_theta, sin_theta)
+    corners = _bounds_corners(bounds)
+    offsets = starts_x*n[0]+starts_y*n[1]
+    corner_offsets = corners @ n
+    keep = (offsets >= corner_offsets.min()-CULL_TOLERANCE) & (offsets <= corner_offsets.max()+CULL_TOLERANCE)
+    t_limit = (corners @ d).max()-(starts_x*d[0]+starts_y*d[1])+1
+    return keep, t_limit
+
+
+def _cull_rays(color_stats, labels, hatch_mode, cyl_rad, angles, center):
+    """
+    Restricts the rays of the Radial pattern to the bounding box of the labels. If the box does not contain the center, only the rays
+    within the angles of its corners can hit it. No ray has to be followed further than the farthest corner.
+
+    Returns:
+        tuple: (keep, r_limit) with the mask of the rays to hatch (None for all rays) and the ray length. (None, None) without color statistics.
+    """
+    if color_stats is None:
+        return None, None
+    bounds = color_stats.target_bounds(labels, hatch_mode, cyl_rad)
+    if bounds is None:
+        return np.zeros(len(angles), dtype=bool), None
+    min_x, max_x, min_y, max_y = bounds
+    corners = _bounds_corners(bounds)-np.array([center[0], center[1]], dtype=np.float64)
+    r_limit = float(np.hypot(corners[:, 0], corners[:, 1]).max())+1
+    if min_x <= center[0] <= max_x and min_y <= center[1] <= max_y:
+        return None, r_limit
+    # angles relative to the direction of the box center, the box covers less than half a turn
+    mid = np.arctan2((min_y+max_y)/2-center[1], (min_x+max_x)/2-center[0])
+    corner_angles = np.mod(np.arctan2(corners[:, 1], corners[:, 0])-mid+np.pi, 2*np.pi)-np.pi
+    ray_angles = np.mod(angles-mid+np.pi, 2*np.pi)-np.pi
+    keep = (ray_angles >= corner_angles.min()-CULL_TOLERANCE) & (ray_angles <= corner_angles.max()+CULL_TOLERANCE)
+    return keep, r_limit
+
+
+def meander_angle(hatch_pattern, hatch_angle, cross_angle=None, rng=random):
+    """
+    Returns the slice angle theta in degrees (0 <= theta < 180) for the meander patterns. RandomMeander draws the angle from rng.
+    """
+    theta = 0  # Default angle is 0 degrees
+    if hatch_pattern == "FixedMeander":
+        theta = hatch_angle
+    elif hatch_pattern == "RandomMeander":
+        # Randomly choose theta between 0 and 179 degrees
+        theta = np.floor(rng.uniform(0, 180))
+    elif hatch_pattern == "CrossedMeander":
+        theta = hatch_angle + cross_angle
+    return np.mod(theta, 180)
+
+
+def meander_line_starts(shape, hatch_distance, theta):
+    """
+    Calculates the start points of all hatch lines of a meander pattern. Reproduces the line stepping of HatchEngine.hatch_meander:
+    the start points first move along y, then along x until the bounding box is left.
+
+    Args:
+        shape (tuple): Shape of the image matrix (height, width, ...).
+        hatch_distance (float): Hatch distance in pixels.
+        theta (float): Slice angle in degrees (0 <= theta < 180).
+
+    Returns:
+        tuple: (starts_x, starts_y, bounds, cos_theta, sin_theta, incline) where bounds is (min_x, max_x, min_y, max_y).
+    """
+    hatch_x_finished = False
+    hatch_y_finished = False
+    theta_rad = np.radians(theta)
+    cos_theta = np.cos(theta_rad)
+    sin_theta = np.sin(theta_rad)
+
+    #calculate step size in x and y direction. catch special cases of 0 and 90 degrees
+    if theta == 0:
+        step_start_y = hatch_distance
+        step_start_x = 1
+        hatch_x_finished = True
+    elif theta == 90:
+        step_start_x = hatch_distance
+        step_start_y = 1
+        hatch_y_finished = True
+    else:
+        step_start_y = np.abs(hatch_distance/cos_theta)
+        step_start_x = np.abs(hatch_distance/sin_theta)
+
+    # Determine the bounding box of the cluster.
+    min_y = -np.ceil(step_start_y)
+    max_y = shape[0]+np.ceil(step_start_y)
+    min_x = -np.ceil(step_start_x)
+    max_x = shape[1]+np.ceil(step_start_x)
+
+    # Determine the starting point of the hatch lines.
+    if cos_theta >= 0:
+        hatch_start_x = max_x
+        incline = -1
+    else:
+        hatch_start_x = min_x
+        incline = 1
+    hatch_start_y = min_y
+
+    starts_x = []
+    starts_y = []
+    while True:
+        starts_x.append(hatch_start_x)
+        starts_y.append(hatch_start_y)
+        if not hatch_y_finished:
+            hatch_start_y += step_start_y
+            if hatch_start_y >= max_y:
+                hatch_y_finished = True
+        elif not hatch_x_finished:
+            if not hatch_start_y >= max_y:
+                hatch_start_y = max_y+1 # this is just for 90deg case. y hast to be set manually
+            hatch_start_x += incline*step_start_x
+            if (hatch_start_x <= min_x or incline == 1) and (hatch_start_x >= max_x or incline == -1):
+                hatch_x_finished = True
+        else:
+            break
+    return np.array(starts_x, dtype=np.float64), np.array(starts_y, dtype=np.float64), (min_x, max_x, min_y, max_y), cos_theta, sin_theta, incline
+
+
+def _cylinder_map(x_target, center_x, cyl_rad):
+    """
+    Maps x coordinates to CylEquidistX coordinates. Samples that do not fit on the cylinder keep the last valid coordinate (like the
+    per-sample loops do) and are flagged as invalid.
+    """
+    valid = np.abs(x_target-center_x) <= cyl_rad
+    x = np.where(valid, np.asin(np.clip((x_target-center_x)/cyl_rad, -1, 1))*cyl_rad+center_x, np.nan)
+    # forward fill invalid samples along every line with the last valid value
+    idx = np.where(valid, np.arange(x.shape[1])[None, :], 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    x = np.take_along_axis(x, idx, axis=1)
+    x[np.isnan(x)] = x_target[np.isnan(x)]
+    return x, valid
+
+
+def _meander_line_lengths(starts_x, starts_y, bounds, cos_theta, sin_theta, incline, step_size, t_limit=None):
+    """
+    Returns the number of steps after which every hatch line leaves the bounding box (or reaches t_limit), from the linear geometry.
+    The per-sample loop ends within two more samples. 0 for lines that do not move towards the box borders.
+    """
+    min_x, max_x, min_y, max_y = bounds
+    dx = cos_theta*step_size
+    dy = sin_theta*step_size
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if incline == -1:
+            k_x = np.where(dx > 0, (starts_x-min_x)/dx, np.inf)
+        else:
+            k_x = np.where(dx < 0, (max_x-starts_x)/-dx, np.inf)
+        k_y = np.where(dy > 0, (starts_y-min_y)/dy, np.inf)
+    k_max = np.minimum(k_x, k_y)
+    if t_limit is not None:
+        k_max = np.minimum(k_max, t_limit/step_size)
+    return np.where(np.isfinite(k_max), k_max, 0)
+
+
+def _meander_sample_batch(starts_x, starts_y, bounds, cos_theta, sin_theta, incline, step_size, center, hatch_mode, cyl_rad, t_limit=None):
+    """
+    Generates the sample coordinates of a batch of hatch lines as 2D arrays (line x sample).
+    The coordinates are accumulated with np.cumsum, which adds up sequentially exactly like the per-sample loop does.
+    With t_limit (see _cull_lines) the lines are only sampled up to this length, the samples behind can not hit the hatched colors.
+
+    Returns:
+        tuple: (x, y, n_samples, valid) with x, y of shape (lines, samples). n_samples holds the number of samples of every line that
+        are inside the bounding box. The sample at index n_samples is the first sample outside and is kept for the segment end points.
+    """
+    min_x, max_x, min_y, max_y = bounds
+    dx = cos_theta*step_size
+    dy = sin_theta*step_size
+
+    # upper bound of samples per line from the linear geometry (+2 for floating point safety and the closing sample)
+    k_max = _meander_line_lengths(starts_x, starts_y, bounds, cos_theta, sin_theta, incline, step_size, t_limit)
+    sample_count = int(np.clip(np.max(k_max, initial=0), 0, None))+3
+
+    x_target = np.full((len(starts_x), sample_count), -dx)
+    x_target[:, 0] = starts_x
+    np.cumsum(x_target, axis=1, out=x_target)
+    y = np.full((len(starts_y), sample_count), -dy)
+    y[:, 0] = starts_y
+    np.cumsum(y, axis=1, out=y)
+
+    if hatch_mode == "CylEquidistX":
+        x, valid = _cylinder_map(x_target, center[0], cyl_rad)
+    else:
+        x = x_target
+        valid = None
+
+    #loop condition of the per-sample loop. the first failing sample ends the line
+    inside_box = y >= min_y
+    if incline == -1:
+        inside_box &= x >= min_x
+    else:
+        inside_box &= x <= max_x
+    n_samples = np.where(inside_box.all(axis=1), sample_count-1, np.argmin(inside_box, axis=1))
+    return x, y, n_samples, valid
+
+
+def _sample_labels(label_map, x, y, n_samples, valid):
+    """
+    Looks up the labels of all samples of a batch in one go. Samples outside the image, outside the cylinder or behind the end of
+    their line get the label -1.
+    """
+    height, width = label_map.shape[0], label_map.shape[1]
+    x_round = legacy_round(x)
+    y_round = legacy_round(y)
+    inside = (x_round >= 0) & (x_round < width) & (y_round >= 0) & (y_round < height)
+    inside &= np.arange(x.shape[1])[None, :] < n_samples[:, None]
+    if valid is not None:
+        inside &= valid
+    labels = np.full(x.shape, -1, dtype=np.int64)
+    labels[inside] = label_map[y_round[inside], x_round[inside]]
+    return labels
+
+
+def _collect_runs(labels, selected, x, y, line_offset, valid=None):
+    """
+    Splits the sampled labels (line x sample) into runs of equal labels and returns all runs of the selected labels with their
+    start and end coordinates in pixels. Start points lie on the first sample of a run, end points on the midpoint between the last
+    sample of the run and the next sample.
+    For CylEquidistX the x of the previous sample is the x before the last sample that fit on the cylinder, like in the per-sample loops.
+    """
+    # every line ends with at least one sample of label -1, so runs never continue into the next line of the flattened array
+    flat_labels = labels.ravel()
+    boundaries = np.flatnonzero(np.diff(flat_labels, prepend=-1) != 0)
+    run_labels = flat_labels[boundaries]
+    is_selected = selected[run_labels+1]
+    run_starts = boundaries[is_selected]
+    run_ends = np.append(boundaries, flat_labels.size)[1:][is_selected]
+
+    start_line, start_k = np.divmod(run_starts, labels.shape[1])
+    end_line, end_k = np.divmod(run_ends, labels.shape[1])
+    start_x = x[start_line, start_k]
+    start_y = y[start_line, start_k]
+    prev_k = end_k-1
+    if valid is not None:
+        last_valid = np.where(valid, np.arange(valid.shape[1])[None, :], 0)
+        np.maximum.accumulate(last_valid, axis=1, out=last_valid)
+        prev_k = np.maximum(last_valid[end_line, end_k]-1, 0)
+    end_x = (x[end_line, end_k]+x[end_line, prev_k])/2
+    end_y = (y[end_line, end_k]+y[end_line, end_k-1])/2
+    return run_labels[is_selected], start_line+line_offset, start_k, start_x, start_y, end_x, end_y
+
+
+def _runs_to_line_collections(runs, center, pixel_per_mm, colors):
+    """
+    Converts the collected runs into one LineCollection per label. Runs on every second hatch line are reversed for meandering.
+    Every run is one polyline of a move to its start and a draw to its end.
+    """
+    run_label, line_idx, run_k, start_x, start_y, end_x, end_y = runs
+    if len(line_idx) == 0:
+        return {label: LineCollection.concatenate([], color) for label, color in colors.items()}
+
+    # sort by label, line and position on the line. odd lines are traversed backwards
+    reverse = (line_idx % 2) == 1
+    order = np.lexsort((np.where(reverse, -run_k, run_k), line_idx, run_label))
+
+    run_label = run_label[order]
+    reverse = reverse[order]
+    x0 = ((start_x-center[0])/pixel_per_mm)[order]
+    y0 = ((start_y-center[1])/pixel_per_mm)[order]
+    x1 = ((end_x-center[0])/pixel_per_mm)[order]
+    y1 = ((end_y-center[1])/pixel_per_mm)[order]
+    # points of all runs interleaved as (move to start, draw to end)
+    x = np.empty(2*len(x0))
+    y = np.empty(2*len(x0))
+    x[0::2] = np.where(reverse, x1, x0)
+    x[1::2] = np.where(reverse, x0, x1)
+    y[0::2] = np.where(reverse, y1, y0)
+    y[1::2] = np.where(reverse, y0, y1)
+
+    line_collections = {}
+    label_bounds = np.flatnonzero(np.diff(run_label, prepend=-1, append=-1))
+    for first, last in zip(label_bounds[:-1].tolist(), label_bounds[1:].tolist()):
+        run_count = last-first
+        line_collections[int(run_label[first])] = LineCollection.from_arrays(
+            x[2*first:2*last], y[2*first:2*last], 0, np.tile(np.array([0, 1], dtype=np.uint8), run_count),
+            np.arange(0, 2*run_count+1, 2), colors[int(run_label[first])]
+        )
+    for label, color in colors.items():
+        if label not in line_collections:
+            line_collections[label] = LineCollection.concatenate([], color)
+    return {label: line_collections[label] for label in colors}
+
+
+def _concat_runs(run_batches):
+    if not run_batches:
+        empty = np.zeros(0)
+        empty_int = np.zeros(0, dtype=np.int64)
+        return empty_int, empty_int, empty_int, empty, empty, empty, empty
+    return tuple(np.concatenate(parts) for parts in zip(*run_batches))
+
+
+def _axis_line_runs(label_map, selected, starts_x, starts_y, bounds, cos_theta, sin_theta, incline, step_size, center, hatch_mode, cyl_rad,
+                    keep=None):
+    """
+    Fast path for meander lines at 0 and 90 degrees. Every such line runs along one image row (or column) and all lines with the same
+    start sample the same positions along it. The runs of every needed row are therefore detected once and shared by all lines on
+    that row, e.g. when the hatch distance is below one pixel. Lines that do not fit (another start, or a coordinate across the line
+    that changes by round-off while sampling) are left to the sampling path.
+
+    Returns:
+        tuple: (runs, remaining) with the runs of the fast path lines in the layout of _collect_runs and the mask of the lines that
+        still have to be sampled.
+    """
+    min_x, max_x, min_y, max_y = bounds
+    along_x = abs(cos_theta) > abs(sin_theta)  # 0 degrees: the lines run along x, 90 degrees: along y
+    remaining = np.ones(len(starts_x), dtype=bool) if keep is None else keep.copy()
+    along_starts, across = (starts_x, starts_y) if along_x else (starts_y, starts_x)
+
+    # the coordinate across a line is constant, if the step across the line vanishes in the round-off of its start
+    across_step = (sin_theta if along_x else cos_theta)*step_size
+    candidates = remaining & (across-across_step == across)
+    if not candidates.any():
+        return _concat_runs([]), remaining
+    start_values, start_counts = np.unique(along_starts[candidates], return_counts=True)
+    fast = candidates & (along_starts == start_values[np.argmax(start_counts)])
+    remaining &= ~fast
+    lines = np.flatnonzero(fast)
+
+    # the coordinate across the lines and the loop condition across the lines, see _meander_sample_batch
+    across = across[lines]
+    if along_x:
+        across_inside = across >= min_y
+    else:
+        across_inside = np.ones(len(lines), dtype=bool)
+        if hatch_mode == "CylEquidistX":
+            across_inside = np.abs(across-center[0]) <= cyl_rad
+            across = np.where(across_inside, np.asin(np.clip((across-center[0])/cyl_rad, -1, 1))*cyl_rad+center[0], across)
+        across_inside &= across >= min_x if incline == -1 else across <= max_x
+    if not across_inside.any():
+        return _concat_runs([]), remaining
+    lines = lines[across_inside]
+    across = across[across_inside]
+
+    # the samples along the lines, taken from one of them
+    x, y, n_samples, valid = _meander_sample_batch(
+        starts_x[lines[:1]], starts_y[lines[:1]], bounds, cos_theta, sin_theta, incline, step_size, center, hatch_mode, cyl_rad)
+    along = x[0] if along_x else y[0]
+    along_valid = valid[0] if valid is not None and along_x else None
+    along_idx = legacy_round(along)
+    along_inside = (along_idx >= 0) & (along_idx < label_map.shape[1 if along_x else 0]) & (np.arange(len(along)) < n_samples[0])
+    if along_valid is not None:
+        along_inside &= along_valid
+    along_idx = along_idx[along_inside]
+
+    # the rows (columns for 90 degrees) of the lines. rows outside the image have no runs
+    line_rows = legacy_round(across)
+    in_image = (line_rows >= 0) & (line_rows < label_map.shape[0 if along_x else 1])
+    lines, across, line_rows = lines[in_image], across[in_image], line_rows[in_image]
+    rows, line_row = np.unique(line_rows, return_inverse=True)
+
+    # run length encoding of every needed row once
+    batch_rows = max(1, int(MAX_BATCH_SAMPLES // len(along)))
+    row_runs = []
+    for first_row in range(0, len(rows), batch_rows):
+        batch = rows[first_row:first_row+batch_rows]
+        labels = np.full((len(batch), len(along)), -1, dtype=np.int64)
+        if along_x:
+            labels[:, along_inside] = label_map[batch[:, None], along_idx[None, :]]
+        else:
+            labels[:, along_inside] = label_map[along_idx[None, :], batch[:, None]]
+        samples = np.broadcast_to(along, labels.shape)
+        zeros = np.broadcast_to(0.0, labels.shape)
+        row_runs.append(_collect_runs(
+            labels, selected, samples if along_x else zeros, zeros if along_x else samples, first_row,
+            None if along_valid is None else np.broadcast_to(along_valid, labels.shape)))
+    run_labels, run_row, run_k, start_x, start_y, end_x, end_y = _concat_runs(row_runs)
+    run_start, run_along_start, run_along_end = (start_x, start_x, end_x) if along_x else (start_y, start_y, end_y)
+
+    # hand the runs of every row to all lines on that row. the runs are sorted by row
+    row_first = np.searchsorted(run_row, np.arange(len(rows)))
+    row_count = np.searchsorted(run_row, np.arange(len(rows)), side='right')-row_first
+    counts = row_count[line_row]
+    line_of_run = np.repeat(np.arange(len(lines)), counts)
+    run_idx = np.repeat(row_first[line_row], counts)+np.arange(len(line_of_run))-np.repeat(np.cumsum(counts)-counts, counts)
+    along_start, along_end = run_along_start[run_idx], run_along_end[run_idx]
+    across = across[line_of_run]
+    if along_x:
+        runs = (run_labels[run_idx], lines[line_of_run], run_k[run_idx], along_start, across, along_end, across)
+    else:
+        runs = (run_labels[run_idx], lines[line_of_run], run_k[run_idx], across, along_start, across, along_end)
+    return runs, remaining
+
+
+def hatch_meander_vectorized(hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad,
+                             pixel_per_mm, cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Vectorized scanline engine for the FixedMeander, RandomMeander and CrossedMeander patterns.
+    Produces the same Line Collection as HatchEngine.hatch_meander, but evaluates whole batches of hatch lines as arrays.
+
+    Args:
+        hatch_pattern (str): "FixedMeander", "RandomMeander" or "CrossedMeander".
+        hatch_distance (float): Hatch distance in pixels.
+        hatch_angle (float): Hatch angle in degrees.
+        step_size (float): Sampling step along the hatch lines in pixels.
+        label_map (numpy.ndarray): Label map of the (flipped) cluster matrix, see build_label_map.
+        center (list): Hatch center in pixels.
+        color (numpy.ndarray): RGB color to hatch. Only used for the color information of the Points.
+        label (int): Label of the color in the label map.
+        hatch_mode (str): "Flat", "CylEquidistX" or "CylEquidistRad".
+        cyl_rad (float): Cylinder radius in pixels.
+        pixel_per_mm (float): Image resolution.
+        cross_angle (float): Additional angle for CrossedMeander.
+        progress_callback (callable): Called with the finished fraction (0..1) after every batch.
+        is_cancelled (callable): Returns True if the hatching should be stopped.
+        color_stats (ColorStats): Statistics index of the label map. If given, only the lines that can hit the color are sampled.
+        rng (random.Random): Generator of the random angle of RandomMeander. Defaults to the random module.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    line_collections = hatch_meander_multicolor(
+        hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, {label: color}, hatch_mode, cyl_rad, pixel_per_mm,
+        cross_angle=cross_angle, progress_callback=progress_callback, is_cancelled=is_cancelled, color_stats=color_stats, rng=rng)
+    if line_collections is None:
+        return None
+    return line_collections[label]
+
+
+def hatch_meander_multicolor(hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad,
+                             pixel_per_mm, cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Single-pass meander sweep for several colors that share the same hatch angle and distance.
+    Every hatch line is traversed once, split into runs by label and each run is appended to the Line Collection of its color.
+    The result per color is identical to a separate sweep with hatch_meander_vectorized.
+
+    Args:
+        colors (dict): {label: RGB color} of all colors to hatch.
+        All other arguments are the same as for hatch_meander_vectorized.
+
+    Returns:
+        dict: {label: LineCollection}, or None if cancelled.
+    """
+    theta = meander_angle(hatch_pattern, hatch_angle, cross_angle, rng)
+    starts_x, starts_y, bounds, cos_theta, sin_theta, incline = meander_line_starts(label_map.shape, hatch_distance, theta)
+
+    # lookup table for the labels to hatch. shifted by one so that the label -1 (outside) maps to False
+    selected = np.zeros(int(label_map.max(initial=0))+2, dtype=bool)
+    selected[np.array(list(colors.keys()), dtype=np.int64)+1] = True
+
+    # choose the batch size from the longest possible line (the bounding box diagonal)
+    diagonal = np.hypot(bounds[1]-bounds[0], bounds[3]-bounds[2])/step_size+3
+    batch_lines = max(1, int(MAX_BATCH_SAMPLES // diagonal))
+    keep, t_limit = _cull_lines(color_stats, colors.keys(), hatch_mode, cyl_rad, starts_x, starts_y, cos_theta, sin_theta)
+
+    run_batches = []
+    if theta == 0 or theta == 90:
+        # the lines run along the image rows or columns, most of them are hatched from the cached runs of their row
+        axis_runs, keep = _axis_line_runs(label_map, selected, starts_x, starts_y, bounds, cos_theta, sin_theta, incline, step_size, center,
+                                          hatch_mode, cyl_rad, keep)
+        run_batches.append(axis_runs)
+
+    batches = _index_batches(len(starts_x), batch_lines, keep)
+    for batch_idx, (first_line, last_line) in enumerate(batches):
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        x, y, n_samples, valid = _meander_sample_batch(
+            starts_x[first_line:last_line], starts_y[first_line:last_line],
+            bounds, cos_theta, sin_theta, incline, step_size, center, hatch_mode, cyl_rad,
+            None if t_limit is None else t_limit[first_line:last_line])
+        labels = _sample_labels(label_map, x, y, n_samples, valid)
+        run_batches.append(_collect_runs(labels, selected, x, y, first_line, valid))
+
+        if progress_callback is not None:
+            progress_callback((batch_idx+1)/len(batches))
+
+    return _runs_to_line_collections(_concat_runs(run_batches), center, pixel_per_mm, colors)
+
+
+def _max_curve_radius(shape, hatch_distance):
+    # Maximum Radius of one circle defined by the cluster diagonal, plus extra space for one hatch line
+    return np.ceil(np.sqrt((shape[0]/2)**2+(shape[1]/2)**2))+np.ceil(hatch_distance)
+
+
+def _circle_curves(shape, hatch_distance, step_size, rng=random):
+    """
+    Generates the rings of the Circular pattern in the order of HatchEngine.hatch_circular as (radius, angles, progress).
+    The random start angle of every ring is drawn in the same order as in the per-sample loop.
+    """
+    max_rad = _max_curve_radius(shape, hatch_distance)
+    hatch_rad = hatch_distance/10 #just the start radius is smaller
+    while hatch_rad <= max_rad:
+        angle_res = step_size/hatch_rad
+        if angle_res > 2*np.pi/36:
+            angle_res = 2*np.pi/36
+        # Randomly choose theta between 0 and 19 degrees
+        start_angle = np.deg2rad(np.floor(rng.uniform(0, 20)))
+        angles = np.linspace(start_angle, start_angle+2*np.pi, int(np.ceil(2*np.pi/angle_res)))
+        radius = hatch_rad
+        hatch_rad += hatch_distance
+        yield radius, angles, hatch_rad/max_rad
+
+
+def _spiral_curves(shape, hatch_distance, step_size):
+    """
+    Generates the turns of the Spiral pattern in the order of HatchEngine.hatch_spiral as (radii, angles, progress).
+    """
+    max_rad = _max_curve_radius(shape, hatch_distance)
+    hatch_rad_avg = hatch_distance/2
+    while hatch_rad_avg+hatch_distance/2 <= max_rad:
+        angle_res = step_size/hatch_rad_avg
+        if angle_res > 2*np.pi/36:
+            angle_res = 2*np.pi/36
+        angles = np.linspace(0, 2*np.pi, int(np.ceil(2*np.pi/angle_res)))
+        hatch_radii = np.linspace(hatch_rad_avg-hatch_distance/2, hatch_rad_avg+hatch_distance/2, int(np.ceil(2*np.pi/angle_res)))
+        hatch_rad_avg += hatch_distance
+        yield hatch_radii, angles, hatch_rad_avg/max_rad
+
+
+def _curve_samples(curves):
+    # radius and angle of all samples of a batch of curves as flat arrays, and the flags of the first sample of every curve
+    radii = np.concatenate([np.broadcast_to(radius, angles.shape) for radius, angles in curves])
+    angles = np.concatenate([angles for radius, angles in curves])
+    curve_start = np.zeros(len(angles), dtype=bool)
+    curve_start[np.cumsum([0]+[len(a) for radius, a in curves[:-1]])] = True
+    return radii, angles, curve_start
+
+
+def _curve_polylines(curves, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm):
+    """
+    Samples a batch of curves (rings or spiral turns) as one flat array and returns the runs of the label as a LineCollection.
+    Unlike the meanders, every sample of a run becomes a point, and runs with a single sample are dropped.
+    """
+    radii, angles, curve_start = _curve_samples(curves)
+    x = center[0]+radii*np.cos(angles)
+    valid = None
+    if hatch_mode == "CylEquidistX":
+        valid = np.abs(x-center[0]) <= cyl_rad
+        x = np.where(valid, np.asin(np.clip((x-center[0])/cyl_rad, -1, 1))*cyl_rad+center[0], x)
+    y = center[1]+radii*np.sin(angles)
+
+    height, width = label_map.shape[0], label_map.shape[1]
+    x_round = legacy_round(x)
+    y_round = legacy_round(y)
+    inside = (x_round >= 0) & (x_round < width) & (y_round >= 0) & (y_round < height)
+    if valid is not None:
+        inside &= valid
+    selected = np.zeros(len(angles), dtype=bool)
+    selected[inside] = label_map[y_round[inside], x_round[inside]] == label
+
+    # runs of selected samples. a run never continues into the next curve
+    continues = selected[1:] & selected[:-1] & ~curve_start[1:]
+    run_starts = np.flatnonzero(selected & ~np.concatenate(([False], continues)))
+    run_ends = np.flatnonzero(selected & ~np.concatenate((continues, [False])))+1
+    return _sample_runs_to_line_collection(x, y, run_starts, run_ends, center, pixel_per_mm, color)
+
+
+def _sample_runs_to_line_collection(x, y, run_starts, run_ends, center, pixel_per_mm, color):
+    """
+    Converts runs of samples (first sample, sample after the last) into a LineCollection with every sample of a run as a point.
+    Runs with a single sample are dropped.
+    """
+    keep = run_ends-run_starts > 1
+    run_starts = run_starts[keep]
+    run_lengths = run_ends[keep]-run_starts
+    offsets = np.zeros(len(run_starts)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(run_lengths)
+    # sample index of every point of the runs
+    sample_idx = np.arange(offsets[-1])+np.repeat(run_starts-offsets[:-1], run_lengths)
+    move_types = np.ones(offsets[-1], dtype=np.uint8)
+    move_types[offsets[:-1]] = 0
+    return LineCollection.from_arrays((x[sample_idx]-center[0])/pixel_per_mm, (y[sample_idx]-center[1])/pixel_per_mm, 0, move_types, offsets, color)
+
+
+def _hatch_curves(curves, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm, progress_callback=None, is_cancelled=None,
+                  color_stats=None, curve_polylines=_curve_polylines):
+    # evaluates the curves in batches of about MAX_BATCH_SAMPLES samples. curves outside the radius range of the color are skipped,
+    # the generator is still run to the end, so the random start angles are drawn like in the per-sample loop.
+    # curve_polylines turns a batch into a LineCollection, see _curve_polylines
+    min_rad, max_rad = (0, np.inf) if color_stats is None else color_stats.radius_range([label], hatch_mode, cyl_rad)
+    batch_collections = []
+    batch = []
+    batch_samples = 0
+    progress = 0
+    for radii, angles, progress in curves:
+        if np.max(radii) < min_rad or np.min(radii) > max_rad:
+            continue
+        batch.append((radii, angles))
+        batch_samples += len(angles)
+        if batch_samples < MAX_BATCH_SAMPLES:
+            continue
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+        batch_collections.append(curve_polylines(batch, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm))
+        batch = []
+        batch_samples = 0
+        if progress_callback is not None:
+            progress_callback(progress)
+
+    if is_cancelled is not None and is_cancelled():
+        return None
+    if batch:
+        batch_collections.append(curve_polylines(batch, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm))
+    if progress_callback is not None:
+        progress_callback(progress)
+    return LineCollection.concatenate(batch_collections, color)
+
+
+def hatch_circular_vectorized(hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm,
+                              progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Vectorized Circular pattern. Produces the same Line Collection as HatchEngine.hatch_circular (for the same state of the
+    random generator rng), but evaluates whole rings as arrays.
+
+    Args:
+        hatch_distance (float): Hatch distance (ring spacing) in pixels.
+        step_size (float): Sampling step along the rings in pixels.
+        All other arguments are the same as for hatch_meander_vectorized.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    return _hatch_curves(_circle_curves(label_map.shape, hatch_distance, step_size, rng), label_map, center, color, label, hatch_mode, cyl_rad,
+                         pixel_per_mm, progress_callback, is_cancelled, color_stats)
+
+
+def hatch_spiral_vectorized(hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm,
+                            progress_callback=None, is_cancelled=None, color_stats=None):
+    """
+    Vectorized Spiral pattern. Produces the same Line Collection as HatchEngine.hatch_spiral, but evaluates whole spiral turns as arrays.
+
+    Args:
+        hatch_distance (float): Hatch distance (spiral pitch) in pixels.
+        step_size (float): Sampling step along the spiral in pixels.
+        All other arguments are the same as for hatch_meander_vectorized.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    return _hatch_curves(_spiral_curves(label_map.shape, hatch_distance, step_size), label_map, center, color, label, hatch_mode, cyl_rad,
+                         pixel_per_mm, progress_callback, is_cancelled, color_stats)
+
+
+def _radial_sample_batch(cos_angles, sin_angles, sample_count, step_size, center, max_rad, hatch_mode, cyl_rad):
+    """
+    Generates the sample coordinates of a batch of rays as 2D arrays (ray x sample), accumulated with np.cumsum like the per-sample loop.
+
+    Returns:
+        tuple: (x, y, n_samples, valid) like _meander_sample_batch. A ray ends at the first sample further than max_rad from the center.
+    """
+    x_target = np.empty((len(cos_angles), sample_count))
+    x_target[:, 0] = center[0]
+    x_target[:, 1:] = (cos_angles*step_size)[:, None]
+    np.cumsum(x_target, axis=1, out=x_target)
+    y = np.empty((len(sin_angles), sample_count))
+    y[:, 0] = center[1]
+    y[:, 1:] = (sin_angles*step_size)[:, None]
+    np.cumsum(y, axis=1, out=y)
+
+    if hatch_mode == "CylEquidistX":
+        x, valid = _cylinder_map(x_target, center[0], cyl_rad)
+    else:
+        x = x_target
+        valid = None
+
+    #loop condition of the per-sample loop. the radius is measured on the unmapped x
+    inside_radius = np.sqrt((x_target-center[0])**2+(y-center[1])**2) <= max_rad
+    n_samples = np.where(inside_radius.all(axis=1), sample_count-1, np.argmin(inside_radius, axis=1))
+    return x, y, n_samples, valid
+
+
+def hatch_radial_vectorized(hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm,
+                            progress_callback=None, is_cancelled=None, color_stats=None):
+    """
+    Vectorized Radial pattern. Produces the same Line Collection as HatchEngine.hatch_radial, but evaluates batches of rays as a
+    2D (ray x sample) grid. Every second ray is reversed for meandering.
+
+    Args:
+        hatch_distance (float): Hatch distance (ray spacing at the maximum radius) in pixels.
+        step_size (float): Sampling step along the rays in pixels.
+        All other arguments are the same as for hatch_meander_vectorized.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    max_rad = _max_curve_radius(label_map.shape, hatch_distance)
+    angle_res = np.atan(hatch_distance/max_rad)*2
+    angles = np.linspace(0, 2*np.pi, int(np.ceil(2*np.pi/angle_res)))
+    cos_angles = np.cos(angles)
+    sin_angles = np.sin(angles)
+
+    selected = np.zeros(int(label_map.max(initial=0))+2, dtype=bool)
+    selected[label+1] = True
+
+    # all rays have the same length. +3 for floating point safety and the closing sample. the samples are accumulated from the center,
+    # so the rays can be cut behind the color without changing the samples before
+    keep, r_limit = _cull_rays(color_stats, [label], hatch_mode, cyl_rad, angles, center)
+    sample_count = int((max_rad if r_limit is None else min(max_rad, r_limit))/step_size)+3
+    batch_rays = max(1, int(MAX_BATCH_SAMPLES // sample_count))
+    batches = _index_batches(len(angles), batch_rays, keep)
+
+    run_batches = []
+    for batch_idx, (first_ray, last_ray) in enumerate(batches):
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        x, y, n_samples, valid = _radial_sample_batch(
+            cos_angles[first_ray:last_ray], sin_angles[first_ray:last_ray],
+            sample_count, step_size, center, max_rad, hatch_mode, cyl_rad)
+        labels = _sample_labels(label_map, x, y, n_samples, valid)
+        run_batches.append(_collect_runs(labels, selected, x, y, first_ray, valid))
+
+        if progress_callback is not None:
+            progress_callback((batch_idx+1)/len(batches))
+
+    return _runs_to_line_collections(_concat_runs(run_batches), center, pixel_per_mm, {label: color})[label]
+
+
+def hatch_contour(hatch_distance, label_map, center, color, label, pixel_per_mm, progress_callback=None, is_cancelled=None, color_stats=None):
+    """
+    Contour pattern: fills the color with concentric inset contours. One cv2.distanceTransform of the color mask gives the distance of
+    every pixel to the border of the color. The rings are the borders of the regions with a distance of at least 1+k*hatch_distance
+    (k = 0, 1, ...), traced with cv2.findContours. The first ring runs through the centers of the border pixels, so every region of the
+    color gets at least its outline. Holes get their own rings.
+    Every ring is one closed polyline (the first point is repeated at the end). The rings of a level are sorted by their distance to
+    the end of the previous level, and every ring starts at its point closest to the end of the previous ring, so the jumps are short. The rings are traced in image pixels, also for the cylindrical hatch modes.
+
+    Args:
+        hatch_distance (float): Hatch distance (ring spacing) in pixels.
+        label_map (numpy.ndarray): The label map of the cluster.
+        center (list): The hatch center in pixels.
+        color (numpy.ndarray): The RGB color of the Line Collection.
+        label (int): The label of the color in the label map.
+        pixel_per_mm (float): The image resolution.
+        progress_callback (callable): Receives the progress of the color as a fraction.
+        is_cancelled (callable): Returns True if the hatching should stop.
+        color_stats (ColorStats): Index of the label map. Restricts the distance transform to the bounding box of the color.
+
+    Returns:
+        LineCollection: The rings of the color, or None if cancelled.
+    """
+    height, width = label_map.shape[0], label_map.shape[1]
+    x0, x1, y0, y1 = 0, width, 0, height
+    if color_stats is not None:
+        bounds = color_stats.bounds([label])
+        if bounds is None:
+            return LineCollection.concatenate([], color)
+        x0, x1 = max(0, int(bounds[0])), min(width, int(bounds[1])+1)
+        y0, y1 = max(0, int(bounds[2])), min(height, int(bounds[3])+1)
+
+    # one pixel of background around the mask, so the border of the image is also a border of the color
+    mask = np.zeros((y1-y0+2, x1-x0+2), dtype=np.uint8)
+    mask[1:-1, 1:-1] = label_map[y0:y1, x0:x1] == label
+    distance = cv2.distanceTransform(mask, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    max_distance = float(distance.max(initial=0))
+    ring_count = int(np.floor((max_distance-1)/hatch_distance))+1 if max_distance >= 1 else 0
+
+    rings = []
+    last_point = None
+    for ring_idx in range(ring_count):
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+        level_mask = (distance >= 1+ring_idx*hatch_distance-CULL_TOLERANCE).astype(np.uint8)
+        contours, _ = cv2.findContours(level_mask, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        contours = [contour.reshape(-1, 2).astype(np.float64) for contour in contours if len(contour) >= 2]
+        if last_point is not None:
+            # the rings of a level start with the one closest to the end of the previous level
+            contours.sort(key=lambda points: np.min(np.sum((points-last_point)**2, axis=1)))
+        for points in contours:
+            if last_point is not None:
+                points = np.roll(points, -int(np.argmin(np.sum((points-last_point)**2, axis=1))), axis=0)
+            points = np.vstack([points, points[:1]])
+            last_point = points[-1]
+            rings.append(points)
+        if progress_callback is not None:
+            progress_callback((ring_idx+1)/ring_count)
+
+    if not rings:
+        return LineCollection.concatenate([], color)
+    points = np.concatenate(rings)
+    offsets = np.zeros(len(rings)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(ring) for ring in rings])
+    move_types = np.ones(len(points), dtype=np.uint8)
+    move_types[offsets[:-1]] = 0
+    # back from the padded mask to the pixels of the label map
+    x = points[:, 0]+x0-1
+    y = points[:, 1]+y0-1
+    return LineCollection.from_arrays((x-center[0])/pixel_per_mm, (y-center[1])/pixel_per_mm, 0, move_types, offsets, color)
+
+
+def thin_regions(label_map, label, max_width, color_stats=None):
+    """
+    Finds the thin parts of a color (strokes of text and line art) for the centerline hatching. A pixel is thick if it lies in a disk
+    of radius max_width/2 that fits completely into the color (a morphological opening of the color mask, computed from its distance
+    transform). All other pixels of the color are thin. Thin regions smaller than a square of max_width (corners of thick regions, single
+    specks) stay with the thick part.
+
+    Args:
+        label_map (numpy.ndarray): The label map of the cluster.
+        label (int): The label of the color.
+        max_width (float): The maximum stroke width in pixels that is traced as a centerline.
+        color_stats (ColorStats): Index of the label map. Restricts the evaluation to the bounding box of the color.
+
+    Returns:
+        tuple: (thin, x0, y0) with the boolean mask thin of the bounding box of the color with the top left pixel (x0, y0), or None if the
+        color has no thin parts.
+    """
+    height, width = label_map.shape[0], label_map.shape[1]
+    x0, x1, y0, y1 = 0, width, 0, height
+    if color_stats is not None:
+        bounds = color_stats.bounds([label])
+        if bounds is None:
+            return None
+        x0, x1 = max(0, int(bounds[0])), min(width, int(bounds[1])+1)
+        y0, y1 = max(0, int(bounds[2])), min(height, int(bounds[3])+1)
+
+    mask = np.zeros((y1-y0+2, x1-x0+2), dtype=np.uint8)
+    mask[1:-1, 1:-1] = label_map[y0:y1, x0:x1] == label
+    distance = cv2.distanceTransform(mask, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    # the border pixels have a distance of one, so a stroke of max_width pixels has a distance of at most (max_width+1)/2
+    radius = (max_width+1)/2
+    kernel_size = 2*int(np.ceil(radius))+1
+    disk = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+    thick = cv2.dilate((distance > radius).astype(np.uint8), disk)
+    thin = (mask > 0) & (thick == 0)
+
+    count, components, stats, _ = cv2.connectedComponentsWithStats(thin.astype(np.uint8), connectivity=8)
+    large = stats[:, cv2.CC_STAT_AREA] >= max_width**2
+    large[0] = False
+    thin = large[components]
+    if not thin.any():
+        return None
+    return thin[1:-1, 1:-1], x0, y0
+
+
+def skeletonize(mask):
+    """
+    Thins a boolean mask to one pixel wide, 8-connected lines with the Zhang-Suen algorithm. Every pass evaluates the whole mask with
+    array operations, so the number of passes only depends on the stroke width.
+    """
+    skeleton = np.zeros((mask.shape[0]+2, mask.shape[1]+2), dtype=np.uint8)
+    skeleton[1:-1, 1:-1] = mask
+    changed = True
+    while changed:
+        changed = False
+        for step in range(2):
+            # neighbours P2 (north) to P9 (north west), clockwise
+            p = skeleton
+            p2, p3, p4, p5 = p[:-2, 1:-1], p[:-2, 2:], p[1:-1, 2:], p[2:, 2:]
+            p6, p7, p8, p9 = p[2:, 1:-1], p[2:, :-2], p[1:-1, :-2], p[:-2, :-2]
+            neighbours = [p2, p3, p4, p5, p6, p7, p8, p9]
+            count = sum(n.astype(np.int32) for n in neighbours)
+            transitions = sum(((neighbours[i] == 0) & (neighbours[(i+1) % 8] == 1)).astype(np.int32) for i in range(8))
+            if step == 0:
+                keep = (p2 & p4 & p6) | (p4 & p6 & p8)
+            else:
+                keep = (p2 & p4 & p8) | (p2 & p6 & p8)
+            remove = (p[1:-1, 1:-1] == 1) & (count >= 2) & (count <= 6) & (transitions == 1) & (keep == 0)
+            if remove.any():
+                skeleton[1:-1, 1:-1][remove] = 0
+                changed = True
+    return skeleton[1:-1, 1:-1].astype(bool)
+
+
+def trace_skeleton(skeleton):
+    """
+    Splits a skeleton into polylines of pixel positions. Every polyline runs between two end or junction pixels, closed loops without
+    such pixels become closed polylines. A diagonal neighbour is only connected if no pixel of the skeleton lies at the corner between them,
+    so the steps of a line do not count as junctions. Single pixels are returned as one point.
+
+    Returns:
+        list: (n, 2) arrays with the (x, y) pixel positions of the polylines.
+    """
+    padded = np.zeros((skeleton.shape[0]+2, skeleton.shape[1]+2), dtype=bool)
+    padded[1:-1, 1:-1] = skeleton
+    ys, xs = np.nonzero(padded)
+    index = np.full(padded.shape, -1, dtype=np.int64)
+    index[ys, xs] = np.arange(len(xs))
+
+    # neighbour lists of all pixels as rows of a (pixel x 8) array, -1 for no neighbour
+    neighbours = np.full((len(xs), 8), -1, dtype=np.int64)
+    for slot, (dy, dx) in enumerate([(-1, 0), (0, 1), (1, 0), (0, -1), (-1, 1), (1, 1), (1, -1), (-1, -1)]):
+        neighbour = index[ys+dy, xs+dx]
+        if dy != 0 and dx != 0:
+            neighbour = np.where(padded[ys+dy, xs] | padded[ys, xs+dx], -1, neighbour)
+        neighbours[:, slot] = neighbour
+    degree = np.sum(neighbours >= 0, axis=1)
+    points = np.stack([xs-1, ys-1], axis=1)
+    neighbours = neighbours.tolist()
+    visited = set()
+
+    def walk(start, neighbour):
+        path = [start]
+        previous, current = start, neighbour
+        visited.add((start, neighbour))
+        visited.add((neighbour, start))
+        while True:
+            path.append(current)
+            if degree[current] != 2 or current == start:
+                break
+            following = [n for n in neighbours[current] if n >= 0 and n != previous and (current, n) not in visited]
+            if not following:
+                break
+            previous, current = current, following[0]
+            visited.add((previous, current))
+            visited.add((current, previous))
+        return points[path]
+
+    polylines = []
+    # open lines start at end and junction pixels, the remaining pixels belong to closed loops
+    for start in np.concatenate([np.flatnonzero(degree != 2), np.flatnonzero(degree == 2)]).tolist():
+        if degree[start] == 0:
+            polylines.append(points[[start]])
+            continue
+        for neighbour in neighbours[start]:
+            if neighbour >= 0 and (start, neighbour) not in visited:
+                polylines.append(walk(start, neighbour))
+    return polylines
+
+
+def hatch_centerlines(thin, x0, y0, center, color, pixel_per_mm, tolerance=CENTERLINE_TOLERANCE):
+    """
+    Traces the skeleton of the thin parts of a color (see thin_regions) into centerline polylines. The polylines are simplified with
+    cv2.approxPolyDP, single pixels become a line of one pixel length.
+
+    Returns:
+        LineCollection: The centerlines of the color.
+    """
+    polylines = []
+    for pixels in trace_skeleton(skeletonize(thin)):
+        if len(pixels) == 1:
+            polylines.append(pixels+np.array([[-0.5, 0], [0.5, 0]]))
+            continue
+        polylines.append(cv2.approxPolyDP(pixels.reshape(-1, 1, 2).astype(np.int32), tolerance, False).reshape(-1, 2).astype(np.float64))
+    if not polylines:
+        return LineCollection.concatenate([], color)
+    points = np.concatenate(polylines)
+    offsets = np.zeros(len(polylines)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(polyline) for polyline in polylines])
+    move_types = np.ones(len(points), dtype=np.uint8)
+    move_types[offsets[:-1]] = 0
+    x = points[:, 0]+x0
+    y = points[:, 1]+y0
+    return LineCollection.from_arrays((x-center[0])/pixel_per_mm, (y-center[1])/pixel_per_mm, 0, move_types, offsets, color)
+
+
+def _line_frame(cos_theta, sin_theta):
+    """
+    Returns the direction d of the (not reversed) meander lines and the normal n pointing in the direction in which the start points
+    of meander_line_starts advance, so the lines are sorted by their offset along n.
+    """
+    d = np.array([-cos_theta, -sin_theta])
+    n = np.array([-sin_theta, cos_theta]) if cos_theta >= 0 else np.array([sin_theta, -cos_theta])
+    return d, n
+
+
+def _rotate_scan_frame(shape, hatch_distance, theta):
+    """
+    Sets up the scan frame of the rotate-scan engine. Hatch lines run along d = (-cos(theta), -sin(theta)) like the first line of
+    HatchEngine.hatch_meander, consecutive lines are hatch_distance apart along the normal n. The lines are aligned to the line
+    grid of meander_line_starts, so they lie on (or close to) the hatch lines of the scanline engines.
+
+    Returns:
+        tuple: (d, n, u_min, columns, o_first, first_line, rows) with the along-line start u_min and the offset o_first of the first
+        row along n. first_line is the index of the first row in the line order of the scanline engines (for the meander direction).
+    """
+    starts_x, starts_y, bounds, cos_theta, sin_theta, incline = meander_line_starts(shape, hatch_distance, theta)
+    d, n = _line_frame(cos_theta, sin_theta)
+
+    # project the image corners (plus one pixel margin) onto the line direction and the normal
+    corners = np.array([[-1, -1], [shape[1], -1], [-1, shape[0]], [shape[1], shape[0]]], dtype=np.float64)
+    u = corners @ d
+    o = corners @ n
+    u_min = np.floor(u.min())
+    columns = int(np.ceil(u.max()-u_min))+2  # the last column is always outside the image
+
+    o_start = starts_x[0]*n[0]+starts_y[0]*n[1]
+    first_line = max(0, int(np.ceil((o.min()-o_start)/hatch_distance)))
+    o_first = o_start+first_line*hatch_distance
+    rows = max(0, int(np.floor((o.max()-o_first)/hatch_distance))+1)
+    return d, n, u_min, columns, o_first, first_line, rows
+
+
+def hatch_meander_rotate_scan(hatch_pattern, hatch_distance, hatch_angle, label_map, center, color, label, pixel_per_mm,
+                              cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Rotate-scan engine for the FixedMeander, RandomMeander and CrossedMeander patterns (flat geometry only).
+    The label map is resampled once into a (hatch line x sample) image with a nearest-neighbour cv2.warpAffine. The color runs are
+    then found row by row and their end points are mapped back with the same affine transform. Samples are one pixel apart, so the
+    cost does not depend on the step size.
+
+    Args:
+        All arguments are the same as for hatch_meander_vectorized.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    line_collections = hatch_meander_rotate_scan_multicolor(
+        hatch_pattern, hatch_distance, hatch_angle, label_map, center, {label: color}, pixel_per_mm,
+        cross_angle=cross_angle, progress_callback=progress_callback, is_cancelled=is_cancelled, color_stats=color_stats, rng=rng)
+    if line_collections is None:
+        return None
+    return line_collections[label]
+
+
+def hatch_meander_rotate_scan_multicolor(hatch_pattern, hatch_distance, hatch_angle, label_map, center, colors, pixel_per_mm,
+                                         cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Single-pass rotate-scan for several colors that share the same hatch angle and distance, see hatch_meander_rotate_scan.
+
+    Args:
+        colors (dict): {label: RGB color} of all colors to hatch.
+        All other arguments are the same as for hatch_meander_rotate_scan.
+
+    Returns:
+        dict: {label: LineCollection}, or None if cancelled.
+    """
+    theta = meander_angle(hatch_pattern, hatch_angle, cross_angle, rng)
+    d, n, u_min, columns, o_first, first_line, rows = _rotate_scan_frame(label_map.shape, hatch_distance, theta)
+
+    selected = np.zeros(int(label_map.max(initial=0))+2, dtype=bool)
+    selected[np.array(list(colors.keys()), dtype=np.int64)+1] = True
+
+    # shift the labels by one so that 0 is outside the image. warpAffine does not support 32 bit integers
+    shifted_map = label_map.astype(np.uint16 if len(selected) <= 65536 else np.float32)+1
+
+    # restrict the rows of the scan image to the bounding box of the colors. warpAffine rounds the sample positions in fixed point,
+    # a batch that starts at another row (or column) could round ties differently. so the batches start at the same rows as without
+    # the restriction, only batches before the box are skipped and the last batch ends behind the box
+    row_range = (0, rows)
+    if color_stats is not None:
+        bounds = color_stats.bounds(colors.keys())
+        if bounds is None:
+            row_range = (0, 0)
+        else:
+            o = _bounds_corners(bounds) @ n
+            row_range = (max(0, int(np.ceil((o.min()-o_first)/hatch_distance-CULL_TOLERANCE))),
+                         min(rows, int(np.floor((o.max()-o_first)/hatch_distance+CULL_TOLERANCE))+1))
+
+    if row_range[0] >= row_range[1]:
+        # no hatch line crosses the colors. without this the aligned first batch would still be scanned
+        row_range = (0, 0)
+
+    scan_origin = u_min*d+o_first*n
+    batch_rows = max(1, int(MAX_BATCH_SAMPLES // columns))
+    run_batches = []
+    for first_row in range(row_range[0]//batch_rows*batch_rows, row_range[1], batch_rows):
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        batch_size = min(batch_rows, row_range[1]-first_row)
+        # affine map from (column, row) of the scan image to (x, y) of the label map
+        origin = u_min*d+(o_first+first_row*hatch_distance)*n
+        transform = np.array([[d[0], n[0]*hatch_distance, origin[0]],
+                              [d[1], n[1]*hatch_distance, origin[1]]])
+        scan = cv2.warpAffine(shifted_map, transform, (columns, batch_size), flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        scan = scan.astype(np.int64)-1
+        scan[:, -1] = -1  # rows never continue into the next row of the flattened array
+
+        # run length encoding of all rows at once
+        flat_labels = scan.ravel()
+        boundaries = np.flatnonzero(np.diff(flat_labels, prepend=-1) != 0)
+        run_labels = flat_labels[boundaries]
+        is_selected = selected[run_labels+1]
+        run_starts = boundaries[is_selected]
+        run_ends = np.append(boundaries, flat_labels.size)[1:][is_selected]
+        row, start_k = np.divmod(run_starts, columns)
+        end_k = run_ends-row*columns
+
+        # with samples one pixel apart, both end points are placed half a sample outside the run. else every run would be half a pixel short.
+        # the end points are taken from the origin of the first row, so they do not depend on the batches
+        row += first_row
+        start_x = scan_origin[0]+(start_k-0.5)*d[0]+row*n[0]*hatch_distance
+        start_y = scan_origin[1]+(start_k-0.5)*d[1]+row*n[1]*hatch_distance
+        end_x = scan_origin[0]+(end_k-0.5)*d[0]+row*n[0]*hatch_distance
+        end_y = scan_origin[1]+(end_k-0.5)*d[1]+row*n[1]*hatch_distance
+        run_batches.append((run_labels[is_selected], row+first_line, start_k, start_x, start_y, end_x, end_y))
+
+        if progress_callback is not None:
+            progress_callback(min(1.0, (first_row+batch_size-row_range[0])/(row_range[1]-row_range[0])))
+
+    return _runs_to_line_collections(_concat_runs(run_batches), center, pixel_per_mm, colors)
+
+
+def estimate_meander_costs(label_map, labels, angles):
+    """
+    Estimates the hatch lines of the meander patterns for several colors and candidate angles without hatching them. The label map is
+    subsampled to at most OPTIMIZER_MAX_PIXELS pixels and resampled once per angle into a scan image like in the rotate-scan engine,
+    with one scan row per (subsampled) pixel. The color runs of every row give the number of segments (laser on moves) and the span from
+    the start of the first to the end of the last run, which is the drawn length plus the travel between the runs of the row.
+
+    Args:
+        label_map (np.ndarray): The label map of the cluster. Can be memory-mapped, only every n-th row and column is read.
+        labels (list): The labels of the colors to estimate.
+        angles (list): The candidate slice angles theta in degrees (see meander_angle).
+
+    Returns:
+        tuple: (segments, path_lengths), arrays of shape (len(labels), len(angles)) for a hatch distance of one pixel. Divide by the
+        hatch distance in pixels to get the segment count and the path length in pixels of the hatching.
+    """
+    stride = max(1, int(np.ceil(np.sqrt(label_map.size/OPTIMIZER_MAX_PIXELS))))
+    sub_map = np.asarray(label_map[::stride, ::stride])
+    labels = np.asarray(labels, dtype=np.int64)
+    label_count = int(sub_map.max(initial=0))+1
+    selected = np.zeros(label_count+1, dtype=bool)
+    selected[labels[labels < label_count]+1] = True
+    # position of every label in the result rows
+    label_rows = np.zeros(label_count+1, dtype=np.int64)
+    label_rows[labels[labels < label_count]+1] = np.flatnonzero(labels < label_count)
+
+    shifted_map = sub_map.astype(np.uint16 if len(selected) <= 65536 else np.float32)+1
+    segments = np.zeros((len(labels), len(angles)))
+    path_lengths = np.zeros((len(labels), len(angles)))
+    for angle_idx, theta in enumerate(angles):
+        d, n, u_min, columns, o_first, first_line, rows = _rotate_scan_frame(sub_map.shape, 1, theta)
+        origin = u_min*d+o_first*n
+        transform = np.array([[d[0], n[0], origin[0]],
+                              [d[1], n[1], origin[1]]])
+        scan = cv2.warpAffine(shifted_map, transform, (columns, rows), flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        scan = scan.astype(np.int64)
+        scan[:, -1] = 0  # rows never continue into the next row of the flattened array
+
+        # run length encoding of all rows at once, like in hatch_meander_rotate_scan_multicolor
+        flat_labels = scan.ravel()
+        boundaries = np.flatnonzero(np.diff(flat_labels, prepend=0) != 0)
+        run_labels = flat_labels[boundaries]
+        is_selected = selected[run_labels]
+        run_starts = boundaries[is_selected]
+        run_ends = np.append(boundaries, flat_labels.size)[1:][is_selected]
+        run_rows = label_rows[run_labels[is_selected]]
+        if len(run_starts) == 0:
+            continue
+        segments[:, angle_idx] = np.bincount(run_rows, minlength=len(labels))
+
+        # span of the runs of every (scan row, color). the runs are sorted by their position, so the first run of a group starts first
+        row = run_starts//columns
+        keys = row*len(labels)+run_rows
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        group_starts = np.flatnonzero(np.diff(keys, prepend=-1) != 0)
+        group_ends = np.append(group_starts[1:], len(keys))-1
+        spans = run_ends[order][group_ends]-run_starts[order][group_starts]
+        path_lengths[:, angle_idx] = np.bincount(keys[group_starts] % len(labels), weights=spans, minlength=len(labels))
+
+    # every scan row stands for stride hatch lines of one pixel distance, every sample for stride pixels
+    return segments*stride, path_lengths*stride**2
+
+
+def _pixel_edges_x(width, center_x, hatch_mode, cyl_rad):
+    """
+    Returns the sorted x positions of the pixel edges in the coordinates the hatch lines are straight in. For CylEquidistX the edges
+    are mapped back through the cylinder mapping and the two borders of the cylinder are added as edges.
+    """
+    edges = np.arange(width+1)-0.5
+    if hatch_mode != "CylEquidistX":
+        return edges
+    # x = asin((x_target-cx)/R)*R+cx  <=>  x_target = sin((x-cx)/R)*R+cx. Edges beyond a quarter of the cylinder are never reached
+    edges = edges[np.abs(edges-center_x) < cyl_rad*np.pi/2]
+    edges = np.sin((edges-center_x)/cyl_rad)*cyl_rad+center_x
+    return np.concatenate(([center_x-cyl_rad], edges, [center_x+cyl_rad]))
+
+
+def _edge_crossings(starts, directions, t_end, edges):
+    """
+    Finds the line parameters t (0 < t < t_end) at which the lines start + t*direction cross the sorted edges (along one axis).
+
+    Returns:
+        tuple: (t, line) flat arrays with the line parameter and the line index of every crossing.
+    """
+    ends = starts+t_end*directions
+    first = np.searchsorted(edges, np.minimum(starts, ends), side='right')
+    last = np.searchsorted(edges, np.maximum(starts, ends), side='left')
+    counts = np.maximum(last-first, 0)
+    line = np.repeat(np.arange(len(starts)), counts)
+    # index of every crossing within its line
+    position = np.arange(len(line))-np.repeat(np.cumsum(counts)-counts, counts)
+    t = (edges[first[line]+position]-starts[line])/directions[line]
+    return t, line
+
+
+def _pixel_exact_runs(label_map, starts_x, starts_y, directions_x, directions_y, t_end, selected, center, hatch_mode, cyl_rad, line_offset):
+    """
+    Traverses a batch of straight lines pixel by pixel. Every line is split at its crossings with the pixel edges, so every segment lies
+    within one pixel and is looked up once. Consecutive segments with the same label form a run.
+
+    Returns:
+        tuple: The runs of the selected labels in the layout of _collect_runs. Start and end points lie exactly on the pixel edges.
+    """
+    height, width = label_map.shape[0], label_map.shape[1]
+    lines = np.arange(len(starts_x))
+    t_x, line_x = _edge_crossings(starts_x, directions_x, t_end, _pixel_edges_x(width, center[0], hatch_mode, cyl_rad))
+    t_y, line_y = _edge_crossings(starts_y, directions_y, t_end, np.arange(height+1)-0.5)
+
+    # sort all crossings (plus the start and end of every line) along the lines
+    t = np.concatenate((np.zeros(len(lines)), t_x, t_y, np.broadcast_to(t_end, lines.shape)))
+    line = np.concatenate((lines, line_x, line_y, lines))
+    order = np.lexsort((t, line))
+    t = t[order]
+    line = line[order]
+
+    # segments between consecutive crossings. zero length segments (crossings through a pixel corner) are dropped
+    keep = (line[1:] == line[:-1]) & (t[1:] > t[:-1])
+    seg_start = t[:-1][keep]
+    seg_end = t[1:][keep]
+    seg_line = line[:-1][keep]
+
+    def position(t, seg_line):
+        x = starts_x[seg_line]+t*directions_x[seg_line]
+        y = starts_y[seg_line]+t*directions_y[seg_line]
+        valid = None
+        if hatch_mode == "CylEquidistX":
+            valid = np.abs(x-center[0]) <= cyl_rad
+            x = np.asin(np.clip((x-center[0])/cyl_rad, -1, 1))*cyl_rad+center[0]
+        return x, y, valid
+
+    # look up the pixel of every segment at its midpoint
+    x, y, valid = position((seg_start+seg_end)/2, seg_line)
+    x_idx = np.floor(x+0.5).astype(np.int64)
+    y_idx = np.floor(y+0.5).astype(np.int64)
+    inside = (x_idx >= 0) & (x_idx < width) & (y_idx >= 0) & (y_idx < height)
+    if valid is not None:
+        inside &= valid
+    labels = np.full(len(seg_line), -1, dtype=np.int64)
+    labels[inside] = label_map[y_idx[inside], x_idx[inside]]
+
+    # merge consecutive segments of the same label and line into runs
+    run_first = np.flatnonzero(np.diff(labels, prepend=-2) | np.diff(seg_line, prepend=-1))
+    run_last = np.append(run_first[1:], len(labels))-1
+    run_labels = labels[run_first]
+    is_selected = selected[run_labels+1]
+    run_first = run_first[is_selected]
+    run_last = run_last[is_selected]
+
+    start_x, start_y, _ = position(seg_start[run_first], seg_line[run_first])
+    end_x, end_y, _ = position(seg_end[run_last], seg_line[run_last])
+    return run_labels[is_selected], seg_line[run_first]+line_offset, run_first, start_x, start_y, end_x, end_y
+
+
+def hatch_meander_pixel_exact(hatch_pattern, hatch_distance, hatch_angle, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm,
+                              cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Pixel-exact engine for the FixedMeander, RandomMeander and CrossedMeander patterns. Uses the hatch lines of the scanline engines,
+    but instead of sampling at the step size every line visits each pixel it crosses exactly once (like an Amanatides-Woo grid traversal,
+    evaluated for whole batches of lines). The run end points are the exact crossings with the pixel edges, so the runtime scales with
+    the number of crossed pixels and does not depend on the step size.
+
+    Args:
+        All arguments are the same as for hatch_meander_vectorized.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    line_collections = hatch_meander_pixel_exact_multicolor(
+        hatch_pattern, hatch_distance, hatch_angle, label_map, center, {label: color}, hatch_mode, cyl_rad, pixel_per_mm,
+        cross_angle=cross_angle, progress_callback=progress_callback, is_cancelled=is_cancelled, color_stats=color_stats, rng=rng)
+    if line_collections is None:
+        return None
+    return line_collections[label]
+
+
+def hatch_meander_pixel_exact_multicolor(hatch_pattern, hatch_distance, hatch_angle, label_map, center, colors, hatch_mode, cyl_rad, pixel_per_mm,
+                                         cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Single-pass pixel-exact meander for several colors that share the same hatch angle and distance, see hatch_meander_pixel_exact.
+
+    Args:
+        colors (dict): {label: RGB color} of all colors to hatch.
+        All other arguments are the same as for hatch_meander_pixel_exact.
+
+    Returns:
+        dict: {label: LineCollection}, or None if cancelled.
+    """
+    theta = meander_angle(hatch_pattern, hatch_angle, cross_angle, rng)
+    starts_x, starts_y, bounds, cos_theta, sin_theta, incline = meander_line_starts(label_map.shape, hatch_distance, theta)
+    min_x, max_x, min_y, max_y = bounds
+
+    # every line runs along (-cos, -sin) until it leaves the bounding box
+    t_end = np.full(len(starts_x), np.inf)
+    if cos_theta > 0:
+        t_end = np.minimum(t_end, (starts_x-min_x)/cos_theta)
+    elif cos_theta < 0:
+        t_end = np.minimum(t_end, (starts_x-max_x)/cos_theta)
+    if sin_theta > 0:
+        t_end = np.minimum(t_end, (starts_y-min_y)/sin_theta)
+    t_end = np.maximum(t_end, 0)
+    keep, t_limit = _cull_lines(color_stats, colors.keys(), hatch_mode, cyl_rad, starts_x, starts_y, cos_theta, sin_theta)
+    if t_limit is not None:
+        t_end = np.minimum(t_end, np.maximum(t_limit, 0))
+
+    selected = np.zeros(int(label_map.max(initial=0))+2, dtype=bool)
+    selected[np.array(list(colors.keys()), dtype=np.int64)+1] = True
+
+    # a line crosses at most width+height pixel edges (plus the cylinder borders)
+    batch_lines = max(1, int(MAX_BATCH_SAMPLES // (label_map.shape[0]+label_map.shape[1]+4)))
+    batches = _index_batches(len(starts_x), batch_lines, keep)
+    run_batches = []
+    for batch_idx, (first_line, last_line) in enumerate(batches):
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        batch = slice(first_line, last_line)
+        batch_size = last_line-first_line
+        run_batches.append(_pixel_exact_runs(
+            label_map, starts_x[batch], starts_y[batch], np.full(batch_size, -cos_theta), np.full(batch_size, -sin_theta), t_end[batch],
+            selected, center, hatch_mode, cyl_rad, first_line))
+
+        if progress_callback is not None:
+            progress_callback((batch_idx+1)/len(batches))
+
+    return _runs_to_line_collections(_concat_runs(run_batches), center, pixel_per_mm, colors)
+
+
+def hatch_radial_pixel_exact(hatch_distance, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm,
+                             progress_callback=None, is_cancelled=None, color_stats=None):
+    """
+    Pixel-exact engine for the Radial pattern. Uses the rays of HatchEngine.hatch_radial and traverses them pixel by pixel like
+    hatch_meander_pixel_exact. Every second ray is reversed for meandering.
+
+    Args:
+        All arguments are the same as for hatch_radial_vectorized.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    max_rad = _max_curve_radius(label_map.shape, hatch_distance)
+    angle_res = np.atan(hatch_distance/max_rad)*2
+    angles = np.linspace(0, 2*np.pi, int(np.ceil(2*np.pi/angle_res)))
+    cos_angles = np.cos(angles)
+    sin_angles = np.sin(angles)
+
+    selected = np.zeros(int(label_map.max(initial=0))+2, dtype=bool)
+    selected[label+1] = True
+
+    keep, r_limit = _cull_rays(color_stats, [label], hatch_mode, cyl_rad, angles, center)
+    ray_length = max_rad if r_limit is None else min(max_rad, r_limit)
+
+    batch_rays = max(1, int(MAX_BATCH_SAMPLES // (label_map.shape[0]+label_map.shape[1]+4)))
+    batches = _index_batches(len(angles), batch_rays, keep)
+    run_batches = []
+    for batch_idx, (first_ray, last_ray) in enumerate(batches):
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        batch = slice(first_ray, last_ray)
+        batch_size = last_ray-first_ray
+        run_batches.append(_pixel_exact_runs(
+            label_map, np.full(batch_size, float(center[0])), np.full(batch_size, float(center[1])), cos_angles[batch], sin_angles[batch],
+            np.full(batch_size, ray_length), selected, center, hatch_mode, cyl_rad, first_ray))
+
+        if progress_callback is not None:
+            progress_callback((batch_idx+1)/len(batches))
+
+    return _runs_to_line_collections(_concat_runs(run_batches), center, pixel_per_mm, {label: color})[label]
+
+
+def _crack_edges(label_map, selected):
+    """
+    Vectorizes the regions of the selected labels into polygons with holes, given as their boundary edges. The edges run along the
+    pixel edges, so the polygons cover the pixels exactly. Neighbouring collinear edges of the same label are merged into one edge.
+
+    Returns:
+        tuple: (edge_label, x1, y1, x2, y2) flat arrays with the label and the end points (in pixels) of every edge.
+    """
+    padded = np.pad(label_map.astype(np.int64), 1, constant_values=-1)
+    edge_batches = []
+    # axis 0: horizontal edges between two rows, axis 1: vertical edges between two columns
+    for axis in (0, 1):
+        grid = padded if axis == 0 else padded.T
+        before = grid[:-1, 1:-1]
+        after = grid[1:, 1:-1]
+        line, position = np.nonzero(before != after)
+        for side in (before, after):
+            labels = side[line, position]
+            keep = selected[labels+1]
+            edge_labels, edge_line, edge_position = labels[keep], line[keep], position[keep]
+            order = np.lexsort((edge_position, edge_line, edge_labels))
+            edge_labels, edge_line, edge_position = edge_labels[order], edge_line[order], edge_position[order]
+
+            # merge runs of neighbouring pixel edges on the same line
+            new_edge = np.ones(len(edge_labels), dtype=bool)
+            new_edge[1:] = (edge_labels[1:] != edge_labels[:-1]) | (edge_line[1:] != edge_line[:-1]) | (edge_position[1:] != edge_position[:-1]+1)
+            first = np.flatnonzero(new_edge)
+            last = np.append(first[1:], len(edge_labels))-1
+            along_1 = edge_position[first]-0.5
+            along_2 = edge_position[last]+0.5
+            across = edge_line[first]-0.5
+            if axis == 0:
+                edge_batches.append((edge_labels[first], along_1, across, along_2, across))
+            else:
+                edge_batches.append((edge_labels[first], across, along_1, across, along_2))
+    return tuple(np.concatenate(parts) for parts in zip(*edge_batches))
+
+
+def _polygon_runs(edges, line_offsets, line_order, first_line, last_line, d, n):
+    """
+    Intersects the polygon edges with the hatch lines first_line..last_line (positions in the sorted line order) and returns the inside
+    segments of every label and line in the layout of _collect_runs.
+    Every edge crosses the lines with offsets in [min offset, max offset) of its end points. With this half-open rule, lines through a
+    polygon vertex are counted correctly and edges parallel to the lines are skipped. The crossings of a line are sorted along the line
+    and paired up (even-odd rule).
+    """
+    edge_label, x1, y1, x2, y2 = edges
+    a1 = x1*n[0]+y1*n[1]
+    a2 = x2*n[0]+y2*n[1]
+    first = np.clip(np.searchsorted(line_offsets, np.minimum(a1, a2), side='left'), first_line, last_line)
+    last = np.clip(np.searchsorted(line_offsets, np.maximum(a1, a2), side='left'), first_line, last_line)
+    counts = last-first
+    edge = np.repeat(np.arange(len(edge_label)), counts)
+    line = first[edge]+np.arange(len(edge))-np.repeat(np.cumsum(counts)-counts, counts)
+
+    # crossing points of the lines with the edges
+    s = (line_offsets[line]-a1[edge])/(a2[edge]-a1[edge])
+    x = x1[edge]+s*(x2[edge]-x1[edge])
+    y = y1[edge]+s*(y2[edge]-y1[edge])
+    u = x*d[0]+y*d[1]
+    label = edge_label[edge]
+    order = np.lexsort((u, line, label))
+    label, line, u, x, y = label[order], line[order], u[order], x[order], y[order]
+
+    # pair the crossings of every label and line: (enter, exit), (enter, exit), ...
+    group_start = np.ones(len(label), dtype=bool)
+    group_start[1:] = (label[1:] != label[:-1]) | (line[1:] != line[:-1])
+    group_first = np.flatnonzero(group_start)
+    position = np.arange(len(label))-np.repeat(group_first, np.diff(np.append(group_first, len(label))))
+    enter = np.flatnonzero((position % 2 == 0) & np.append(~group_start[1:], False))
+    leave = enter+1
+    # drop segments that are only round-off (e.g. where two clipped edges meet), tolerance in pixels
+    keep = u[leave]-u[enter] > 1e-9
+    enter, leave = enter[keep], leave[keep]
+    if len(enter) == 0:
+        return _concat_runs([])
+
+    # merge segments that touch each other, e.g. at diagonal pixel corners or at the clipped cylinder border
+    joined = (label[enter[1:]] == label[enter[:-1]]) & (line[enter[1:]] == line[enter[:-1]]) & (u[enter[1:]] <= u[leave[:-1]]+1e-9)
+    first = np.flatnonzero(np.append(True, ~joined))
+    last = np.append(first[1:], len(enter))-1
+    enter, leave = enter[first], leave[last]
+    return label[enter], line_order[line[enter]], u[enter], x[enter], y[enter], x[leave], y[leave]
+
+
+def hatch_meander_polygon(hatch_pattern, hatch_distance, hatch_angle, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm,
+                          cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Polygon engine for the FixedMeander, RandomMeander and CrossedMeander patterns. The color region is vectorized into polygons with
+    holes and the hatch lines of the scanline engines are intersected with the polygon edges analytically. The segments are exact and
+    independent of the step size, the cost scales with the number of polygon edges and line crossings instead of the image area.
+
+    Args:
+        All arguments are the same as for hatch_meander_vectorized.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    line_collections = hatch_meander_polygon_multicolor(
+        hatch_pattern, hatch_distance, hatch_angle, label_map, center, {label: color}, hatch_mode, cyl_rad, pixel_per_mm,
+        cross_angle=cross_angle, progress_callback=progress_callback, is_cancelled=is_cancelled, color_stats=color_stats, rng=rng)
+    if line_collections is None:
+        return None
+    return line_collections[label]
+
+
+def hatch_meander_polygon_multicolor(hatch_pattern, hatch_distance, hatch_angle, label_map, center, colors, hatch_mode, cyl_rad, pixel_per_mm,
+                                     cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Single-pass polygon engine for several colors that share the same hatch angle and distance, see hatch_meander_polygon.
+
+    Args:
+        colors (dict): {label: RGB color} of all colors to hatch.
+        All other arguments are the same as for hatch_meander_polygon.
+
+    Returns:
+        dict: {label: LineCollection}, or None if cancelled.
+    """
+    theta = meander_angle(hatch_pattern, hatch_angle, cross_angle, rng)
+    starts_x, starts_y, bounds, cos_theta, sin_theta, incline = meander_line_starts(label_map.shape, hatch_distance, theta)
+    d, n = _line_frame(cos_theta, sin_theta)
+
+    selected = np.zeros(int(label_map.max(initial=0))+2, dtype=bool)
+    selected[np.array(list(colors.keys()), dtype=np.int64)+1] = True
+    # only vectorize the bounding box of the colors. it has a margin of two pixels, so the colors never touch the border of the crop
+    # (apart from the image border, which is also padded by _crack_edges)
+    crop_x, crop_y = 0, 0
+    crop = label_map
+    color_bounds = None if color_stats is None else color_stats.bounds(colors.keys())
+    if color_stats is not None and color_bounds is None:
+        crop = label_map[:0, :0]
+    elif color_bounds is not None:
+        crop_x, crop_y = max(0, int(color_bounds[0])), max(0, int(color_bounds[2]))
+        crop = label_map[crop_y:int(color_bounds[3])+1, crop_x:int(color_bounds[1])+1]
+    edge_label, x1, y1, x2, y2 = _crack_edges(crop, selected)
+    x1, x2, y1, y2 = x1+crop_x, x2+crop_x, y1+crop_y, y2+crop_y
+
+    if hatch_mode == "CylEquidistX":
+        # the cylinder mapping only changes x, so the polygons stay rectilinear. map them to the coordinates the hatch lines are straight in
+        # and clip them to the quarter cylinder
+        x1 = np.sin(np.clip((x1-center[0])/cyl_rad, -np.pi/2, np.pi/2))*cyl_rad+center[0]
+        x2 = np.sin(np.clip((x2-center[0])/cyl_rad, -np.pi/2, np.pi/2))*cyl_rad+center[0]
+    edges = (edge_label, x1, y1, x2, y2)
+
+    # sort the lines by their offset along the normal
+    line_order = np.argsort(starts_x*n[0]+starts_y*n[1], kind='stable')
+    line_offsets = (starts_x*n[0]+starts_y*n[1])[line_order]
+
+    # estimate the number of crossings of every line to choose the batches
+    a1 = x1*n[0]+y1*n[1]
+    a2 = x2*n[0]+y2*n[1]
+    crossing_count = np.sum(np.searchsorted(line_offsets, np.maximum(a1, a2))-np.searchsorted(line_offsets, np.minimum(a1, a2)))
+    batch_count = max(1, int(np.ceil(crossing_count/MAX_BATCH_SAMPLES)))
+    batch_lines = max(1, int(np.ceil(len(line_offsets)/batch_count)))
+
+    run_batches = []
+    for first_line in range(0, len(line_offsets), batch_lines):
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        run_batches.append(_polygon_runs(edges, line_offsets, line_order, first_line, min(first_line+batch_lines, len(line_offsets)), d, n))
+
+        if progress_callback is not None:
+            progress_callback(min(1.0, (first_line+batch_lines)/len(line_offsets)))
+
+    label, line, u, start_x, start_y, end_x, end_y = _concat_runs(run_batches)
+    if hatch_mode == "CylEquidistX":
+        start_x = np.asin(np.clip((start_x-center[0])/cyl_rad, -1, 1))*cyl_rad+center[0]
+        end_x = np.asin(np.clip((end_x-center[0])/cyl_rad, -1, 1))*cyl_rad+center[0]
+    return _runs_to_line_collections((label, line, u, start_x, start_y, end_x, end_y), center, pixel_per_mm, colors)
+
+
+def label_islands(label_map, label):
+    """
+    Returns the connected regions (islands, 8-connected) of a label as an int32 map: 0 outside the label, 1..n for the islands.
+    """
+    _, islands = cv2.connectedComponents((label_map == label).astype(np.uint8), connectivity=8)
+    return islands
+
+
+def take_polylines(line_collection, polyline_idx):
+    # Line Collection with the polylines polyline_idx in this order
+    lengths = np.diff(line_collection.offsets)[polyline_idx]
+    offsets = np.zeros(len(polyline_idx)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    point_idx = np.arange(offsets[-1])+np.repeat(line_collection.offsets[:-1][polyline_idx]-offsets[:-1], lengths)
+    return LineCollection(line_collection.coords[point_idx], line_collection.move_types[point_idx], offsets, line_collection.color,
+                          line_collection.speed, line_collection.pwr)
+
+
+def island_order(line_collection, islands, center, pixel_per_mm):
+    """
+    Reorders the polylines of a color, so that every island of the color is hatched completely before the next one.
+    The polylines keep their order within an island. The islands are visited in a nearest neighbour tour: the tour starts with the
+    island of the first polyline and always continues with the island whose first polyline starts closest to the end of the last one.
+
+    Args:
+        line_collection (LineCollection): The flat (not yet cylindrical) polylines of the color.
+        islands (numpy.ndarray): The islands of the color, see label_islands.
+        center (list): The hatch center in pixels.
+        pixel_per_mm (float): The image resolution.
+
+    Returns:
+        LineCollection: The reordered polylines.
+    """
+    if len(line_collection) < 2 or line_collection.num_points == 0:
+        return line_collection
+    offsets = np.asarray(line_collection.offsets)
+    coords = np.asarray(line_collection.coords)[:, :2]
+    starts = np.minimum(offsets[:-1], len(coords)-1)
+    seconds = np.clip(offsets[1:]-1, starts, starts+1)
+
+    # island of every polyline at its first point and at the middle of its first segment. points on a pixel edge (PixelExact, Polygon)
+    # may round into the neighbour pixel, the middle of the segment does not
+    probes = np.concatenate([coords[starts], (coords[starts]+coords[seconds])/2])
+    x = legacy_round(probes[:, 0]*pixel_per_mm+center[0])
+    y = legacy_round(probes[:, 1]*pixel_per_mm+center[1])
+    inside = (x >= 0) & (x < islands.shape[1]) & (y >= 0) & (y < islands.shape[0])
+    probe_islands = np.zeros(len(probes), dtype=np.int64)
+    probe_islands[inside] = islands[y[inside], x[inside]]
+    polyline_islands = np.maximum(probe_islands[:len(starts)], probe_islands[len(starts):])
+
+    # polylines grouped by island, in their original order within every island
+    order = np.argsort(polyline_islands, kind='stable')
+    group_starts = np.flatnonzero(np.diff(polyline_islands[order], prepend=-1))
+    if len(group_starts) < 2:
+        return line_collection
+    groups = np.split(order, group_starts[1:])
+    first_points = coords[starts[[group[0] for group in groups]]]
+    last_points = coords[offsets[[group[-1]+1 for group in groups]]-1]
+
+    # nearest neighbour tour over the islands
+    remaining = np.ones(len(groups), dtype=bool)
+    current = int(np.argmin([group[0] for group in groups]))
+    tour = []
+    while True:
+        tour.append(current)
+        remaining[current] = False
+        if not remaining.any():
+            break
+        distances = np.sum((first_points-last_points[current])**2, axis=1)
+        distances[~remaining] = np.inf
+        current = int(np.argmin(distances))
+    return take_polylines(line_collection, np.concatenate([groups[idx] for idx in tour]))
+
+
+def _aligned(u, v):
+    # True where the vectors point in the same direction (within BRIDGE_MAX_ANGLE). zero vectors are never aligned
+    dot = np.sum(u*v, axis=1)
+    norms = np.linalg.norm(u, axis=1)*np.linalg.norm(v, axis=1)
+    return (norms > 0) & (dot >= np.cos(np.radians(BRIDGE_MAX_ANGLE))*norms)
+
+
+def bridge_gaps(line_collection, bridge_gap, bridge_mode="Laser On"):
+    """
+    Bridges the gaps between consecutive polylines that continue each other (the runs of one hatch line). A gap is bridged if it is not
+    longer than bridge_gap, and the last segment of the first polyline, the gap and the first segment of the next polyline point in the
+    same direction (within BRIDGE_MAX_ANGLE). The travel between two hatch lines is never bridged, the lines run in opposite directions.
+    - "Laser On": the polylines are joined into one, the gap is drawn. Points that lie exactly on the joined line are removed, so the
+      runs of a straight hatch line become a single two-point line again.
+    - "Power Off": the polylines stay separate, but the first point of the next polyline gets move type 2 (a G1 with zero power
+      instead of a G0). The machine does not stop for the gap.
+
+    Args:
+        line_collection (LineCollection): The flat polylines of a color (coordinates in mm).
+        bridge_gap (float): The longest gap in mm that is bridged.
+        bridge_mode (str): "Laser On" or "Power Off".
+
+    Returns:
+        LineCollection: The bridged polylines.
+    """
+    offsets = np.asarray(line_collection.offsets)
+    coords = np.asarray(line_collection.coords)
+    if len(offsets) < 3 or len(coords) < 2 or bridge_gap <= 0:
+        return line_collection
+    move_types = np.array(line_collection.move_types)
+    starts, ends = offsets[:-1], offsets[1:]-1
+    # joins between polyline i and i+1. both need at least one segment
+    first, second = np.arange(len(starts)-1), np.arange(1, len(starts))
+    valid = (ends[first] > starts[first]) & (ends[second] > starts[second])
+    end_points = np.where(valid, ends[first], 1)
+    start_points = np.where(valid, starts[second], 0)
+    last_segments = coords[end_points]-coords[end_points-1]
+    first_segments = coords[start_points+1]-coords[start_points]
+    gaps = coords[start_points]-coords[end_points]
+    gap_lengths = np.linalg.norm(gaps, axis=1)
+    bridge = (valid & (move_types[start_points] == 0) & (gap_lengths <= bridge_gap) & _aligned(last_segments, first_segments)
+              & (_aligned(last_segments, gaps) | (gap_lengths <= CULL_TOLERANCE)))
+    if not bridge.any():
+        return line_collection
+
+    if bridge_mode == "Power Off":
+        move_types[start_points[bridge]] = 2
+        return LineCollection(coords, move_types, offsets, line_collection.color, line_collection.speed, line_collection.pwr)
+    if bridge_mode != "Laser On":
+        print("Bridge Mode not recognized")
+        return line_collection
+
+    move_types[start_points[bridge]] = 1
+    # inner points of the joins that lie on the straight line through their neighbours
+    inner = np.concatenate([end_points[bridge], start_points[bridge]])
+    before = coords[inner, :2]-coords[inner-1, :2]
+    after = coords[inner+1, :2]-coords[inner, :2]
+    cross = np.abs(before[:, 0]*after[:, 1]-before[:, 1]*after[:, 0])
+    straight = (cross <= 1e-9*np.linalg.norm(before, axis=1)*np.linalg.norm(after, axis=1)) & (np.sum(before*after, axis=1) >= 0)
+    keep_point = np.ones(len(coords), dtype=bool)
+    keep_point[inner[straight]] = False
+
+    # the polylines after a bridged gap continue the previous one
+    new_starts = starts[np.concatenate([[True], ~bridge])]
+    point_offsets = np.concatenate([[0], np.cumsum(keep_point)])
+    new_offsets = point_offsets[np.append(new_starts, offsets[-1])]
+    return LineCollection(coords[keep_point], move_types[keep_point], new_offsets, line_collection.color, line_collection.speed, line_collection.pwr)
+
+
+def drop_short_polylines(line_collection, min_length):
+    """
+    Removes the polylines that are shorter than min_length in mm (antialiasing noise, single pixels). A polyline after a removed one
+    that was bridged with zero power (move type 2) starts with a G0 again.
+    """
+    offsets = np.asarray(line_collection.offsets)
+    if len(offsets) < 2 or min_length <= 0:
+        return line_collection
+    coords = np.asarray(line_collection.coords)
+    segment_lengths = np.linalg.norm(np.diff(coords, axis=0), axis=1)
+    # the segment from the last point of a polyline to the first point of the next one is not part of a polyline
+    cumulative = np.concatenate([[0], np.cumsum(segment_lengths)])
+    lengths = cumulative[np.maximum(offsets[1:]-1, offsets[:-1])]-cumulative[offsets[:-1]]
+    keep = lengths >= min_length
+    if keep.all():
+        return line_collection
+    result = take_polylines(line_collection, np.flatnonzero(keep))
+    restart = keep[1:] & ~keep[:-1]
+    restart_points = offsets[1:-1][restart]
+    if len(restart_points) and np.any(line_collection.move_types[restart_points] == 2):
+        # position of the restarted polylines in the result
+        new_idx = np.cumsum(keep)-1
+        move_types = np.array(result.move_types)
+        first_points = result.offsets[new_idx[1:][restart]]
+        move_types[first_points] = np.where(move_types[first_points] == 2, 0, move_types[first_points])
+        result = LineCollection(result.coords, move_types, result.offsets, result.color, result.speed, result.pwr)
+    return result
+
+
+def filter_segments(line_collection, min_length=0, bridge_gap=0, bridge_mode="Laser On"):
+    """
+    Segment filter for noisy images: bridges the short gaps within hatch lines (bridge_gaps) and then removes the polylines that are
+    still shorter than min_length (drop_short_polylines). Runs that are bridged into a longer line are kept. All lengths in mm.
+    Must be applied after the polylines got their final order, a bridged polyline continues at the end of the previous one.
+    """
+    line_collection = bridge_gaps(line_collection, bridge_gap, bridge_mode)
+    return drop_short_polylines(line_collection, min_length)
+
+
+def wrap_cylindrical(line_collection, radius):
+    """
+    Wraps a flat LineCollection onto a cylinder of the given radius (in mm) around the y axis. Same result as the former per-point loop
+    of HatchEngine.make_hatch_cylindrical: x is taken as arc length, polylines with more than two points are mapped point by point and
+    straight two-point lines are first resampled in 0.1 mm steps along x, so they follow the surface. All polylines are mapped in one pass.
+
+    Returns:
+        LineCollection: The cylindrical Line Collection. Polylines with less than two points are kept as empty polylines.
+    """
+    lengths = np.diff(line_collection.offsets)
+    starts = line_collection.offsets[:-1]
+    x = line_collection.coords[:, 0]
+    y = line_collection.coords[:, 1]
+
+    # number of nodes of the straight lines: 100µm steps in x direction, at least 2
+    is_line = lengths == 2
+    line_starts = starts[is_line]
+    x_start, x_end = x[line_starts], x[line_starts+1]
+    node_counts = np.ceil(np.maximum(np.abs(x_start-x_end)*10, 2)).astype(np.int64)
+
+    out_lengths = np.where(lengths > 2, lengths, 0)
+    out_lengths[is_line] = node_counts
+    single_points = np.count_nonzero(lengths < 2)
+    if single_points:
+        print(f"{single_points} single Hatch-Points encountered. This should not happen. Skipping them.")
+    offsets = np.zeros(len(lengths)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum(out_lengths)
+    point_count = int(offsets[-1])
+
+    # index of every output point within its polyline
+    node_idx = np.arange(point_count)-np.repeat(offsets[:-1], out_lengths)
+    is_line_point = np.repeat(is_line, out_lengths)
+    x_flat = np.empty(point_count)
+    y_flat = np.empty(point_count)
+    move_types = np.empty(point_count, dtype=np.uint8)
+
+    # polylines: every point is mapped
+    source_idx = (np.repeat(starts, out_lengths)+node_idx)[~is_line_point]
+    x_flat[~is_line_point] = x[source_idx]
+    y_flat[~is_line_point] = y[source_idx]
+    move_types[~is_line_point] = line_collection.move_types[source_idx]
+
+    # straight lines: nodes like np.linspace (start + k*step, exact end point)
+    line_of_point = np.repeat(np.arange(len(line_starts)), node_counts)
+    k = node_idx[is_line_point]
+    divisor = (node_counts-1)[line_of_point]
+    first = line_starts[line_of_point]
+    for values, flat in [(x, x_flat), (y, y_flat)]:
+        start, end = values[first], values[first+1]
+        nodes = k*((end-start)/divisor)+start
+        nodes[k == divisor] = end[k == divisor]
+        flat[is_line_point] = nodes
+    move_types[is_line_point] = np.where(k == 0, line_collection.move_types[first], line_collection.move_types[first+1])
+
+    angle = x_flat/radius
+    coords = np.empty((point_count, 3))
+    coords[:, 0] = radius*np.sin(angle)
+    coords[:, 1] = y_flat
+    coords[:, 2] = radius*np.cos(angle)-radius
+    return LineCollection(coords, move_types, offsets, line_collection.color, line_collection.speed, line_collection.pwr)
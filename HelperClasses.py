@@ -82,6 +82,130 @@ class Point:
             pwr=self.pwr
         )
     
+class LineCollection:
+    def __init__(self, coords, move_types, offsets, color, speed=None, pwr=None):
+        """
+        Array-backed Line Collection. Stores the polylines of one color column-wise instead of as lists of Points,
+        which needs less than 32 bytes per point instead of several hundred.
+        Iterating or indexing gives the polylines as lists of Points, so code written for lists of polylines keeps working.
+        Parser, HatchLinePlotter, PostProcessor and the cylindrical transformation use the arrays directly.
+
+        Args:
+            coords (numpy.ndarray): (N, 3) float64 x, y, z of all points.
+            move_types (numpy.ndarray): (N,) uint8 move type of every point (0 for move, 1 for draw, 2 for a move with zero power, see HatchKernels.bridge_gaps).
+            offsets (numpy.ndarray): (P+1,) int64 index of the first point of every polyline, followed by N.
+            color (tuple): (r, g, b) of all points.
+            speed (float): The speed of all points. Set by the Parser.
+            pwr (float): The power of all points. Set by the Parser.
+        """
+        self.coords = coords
+        self.move_types = move_types
+        self.offsets = offsets
+        self.color = color
+        self.speed = speed
+        self.pwr = pwr
+
+    @classmethod
+    def from_arrays(cls, x, y, z, move_types, offsets, color, speed=None, pwr=None):
+        coords = np.empty((len(x), 3), dtype=np.float64)
+        coords[:, 0] = x
+        coords[:, 1] = y
+        coords[:, 2] = z
+        return cls(coords, np.asarray(move_types, dtype=np.uint8), np.asarray(offsets, dtype=np.int64), tuple(int(c) for c in color), speed, pwr)
+
+    @classmethod
+    def from_polylines(cls, polylines, color=None):
+        """
+        Converts a list of polylines (lists of Points) into a LineCollection. Color, speed and power are taken from the first point
+        (color defaults to the given color for an empty list).
+        """
+        points = [point for polyline in polylines for point in polyline]
+        offsets = np.zeros(len(polylines)+1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(polyline) for polyline in polylines])
+        speed = pwr = None
+        if points:
+            color = (points[0].r, points[0].g, points[0].b)
+            speed, pwr = points[0].speed, points[0].pwr
+        elif color is None:
+            color = (0, 0, 0)
+        return cls.from_arrays([point.x for point in points], [point.y for point in points], [point.z for point in points],
+                               [point.move_type for point in points], offsets, color, speed, pwr)
+
+    @classmethod
+    def concatenate(cls, line_collections, color):
+        # joins Line Collections of the same color. an empty list gives an empty Line Collection
+        if not line_collections:
+            return cls(np.zeros((0, 3)), np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64), tuple(int(c) for c in color))
+        offsets = [line_collections[0].offsets[:1]]
+        point_count = 0
+        for line_collection in line_collections:
+            offsets.append(line_collection.offsets[1:]+point_count)
+            point_count += line_collection.num_points
+        return cls(np.concatenate([line_collection.coords for line_collection in line_collections]),
+                   np.concatenate([line_collection.move_types for line_collection in line_collections]),
+                   np.concatenate(offsets), tuple(int(c) for c in color))
+
+    @property
+    def num_points(self):
+        return len(self.coords)
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("polyline index out of range")
+        start, end = int(self.offsets[idx]), int(self.offsets[idx+1])
+        r, g, b = self.color
+        return [Point(x, y, z, move_type, r, g, b, self.speed, self.pwr)
+                for (x, y, z), move_type in zip(self.coords[start:end].tolist(), self.move_types[start:end].tolist())]
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def point_values(self):
+        """
+        Returns:
+            list: (move_type, x, y, z) of every point as plain python values, the fast way to walk over all points.
+        """
+        return list(zip(self.move_types.tolist(), *self.coords.T.tolist()))
+
+    def with_coords(self, coords):
+        # same polylines and metadata with new coordinates
+        return LineCollection(coords, self.move_types, self.offsets, self.color, self.speed, self.pwr)
+
+    def translated(self, offset):
+        return self.with_coords(self.coords+np.asarray(offset, dtype=np.float64))
+
+    def with_speed_and_pwr(self, speed, pwr):
+        # same polylines with new speed and power. the arrays are shared, not copied
+        return LineCollection(self.coords, self.move_types, self.offsets, self.color, speed, pwr)
+
+
+def count_points(line_collection):
+    # number of points of a LineCollection or of a list of polylines
+    if isinstance(line_collection, LineCollection):
+        return line_collection.num_points
+    return sum(len(polyline) for polyline in line_collection)
+
+
+def iter_point_values(line_collection):
+    """
+    Iterates over (move_type, x, y, z, speed, pwr) of all points of a LineCollection or of a list of polylines, without creating Points for a LineCollection.
+    """
+    if isinstance(line_collection, LineCollection):
+        speed, pwr = line_collection.speed, line_collection.pwr
+        for move_type, x, y, z in line_collection.point_values():
+            yield move_type, x, y, z, speed, pwr
+        return
+    for polyline in line_collection:
+        for point in polyline:
+            yield point.move_type, point.x, point.y, point.z, point.speed, point.pwr
+
+
 class ImgObj:
     def __init__(self, image_matrix, original_image_matrix, pixel_per_mm, pixel_per_mm_original):
         self.image_matrix = image_matrix
@@ -90,9 +214,11 @@ class ImgObj:
         self.pixel_per_mm_original = pixel_per_mm_original
 
 class HatchCluster:
-    def __init__(self, data, input_matrix, ref_position, cluster_center_for_hatch, cylinder_radius, additional_code=""):
+    def __init__(self, data, input_matrix, ref_position, cluster_center_for_hatch, cylinder_radius, additional_code="", label_map=None, color_list=None):
         self.data=data
         self.input_matrix = input_matrix
+        self.label_map = label_map # integer index of every pixel into color_list. set up once before hatching
+        self.color_list = color_list
         self.ref_position=ref_position
         self.cluster_center_for_hatch = cluster_center_for_hatch
         self.cylinder_radius = cylinder_radius
@@ -104,7 +230,7 @@ class HatchData:
         self.type = type
             
 class ProcessBlock:
-    def __init__(self, hatch_data:HatchData, iterations = 1, post_processing="None", laser_mode="constant",air_assist="off",enclosure_fan=100, power_mode="half" , offset = [0,0,0]):
+    def __init__(self, hatch_data:HatchData, iterations = 1, post_processing="None", laser_mode="constant",air_assist="off",enclosure_fan=100, power_mode="half" , offset = [0,0,0], speed_and_pwr=None):
         self.hatch_data = hatch_data
         self.iterations = iterations
         self.post_processing = post_processing
@@ -113,6 +239,9 @@ class ProcessBlock:
         self.enclosure_fan = enclosure_fan
         self.power_mode = power_mode
         self.offset = offset
+        # settings of Parser.collect_speed_and_pwr_settings for a streamed block. its hatch data is raw and gets speed, power
+        # and post processing while the G-code is written. None if the hatch data is already processed
+        self.speed_and_pwr = speed_and_pwr
 
 class DBColorPalette:
     def __init__(self, color_palette, settings=None):
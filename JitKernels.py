@@ -0,0 +1,339 @@
+import math
+import random
+import numpy as np
+import HatchKernels
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+'''
+This module contains the optional Numba backend of the hatch kernels ("Numba" hatch engine). The inner loops of the meander, radial and
+curve patterns are compiled to machine code: every hatch line is sampled step by step like in the per-sample loops of the HatchEngine,
+and the color runs are detected while sampling. No (line x sample) arrays are built, the kernels only emit flat arrays of the runs.
+The line setup, the culling with ColorStats and the conversion of the runs into LineCollections are shared with HatchKernels, so the
+result is the same as with the Vectorized engine. Only for CylEquidistX the cylinder mapping uses the asin of the C library, which can
+differ from the one of NumPy in the last bit.
+Numba is optional. Without it NUMBA_AVAILABLE is False and HatchEngine uses the Vectorized engine instead. The kernels below still run
+as plain Python then, just slowly.
+'''
+
+NUMBA_AVAILABLE = numba is not None
+
+if NUMBA_AVAILABLE:
+    # compiled once and cached next to the module, so the compile time is only spent on the first hatching
+    jit = numba.njit(cache=True, nogil=True)
+else:
+    def jit(function):
+        return function
+
+INITIAL_RUN_CAPACITY = 1024  # initial number of runs of the output arrays, they grow by doubling
+
+
+@jit
+def _legacy_round(value):
+    # scalar version of HatchKernels.legacy_round
+    truncated = math.trunc(value)
+    if truncated == math.trunc(value-0.5):
+        return math.trunc(value+1)
+    return truncated
+
+
+@jit
+def _cylinder_x(x_target, center_x, cyl_rad):
+    # CylEquidistX mapping of one sample, see HatchKernels._cylinder_map
+    return math.asin(min(max((x_target-center_x)/cyl_rad, -1.0), 1.0))*cyl_rad+center_x
+
+
+@jit
+def _append_line_runs(label_map, selected, xs, ys, valid, last_valid, n_samples, line, cylindrical, run_ints, run_coords, run_count):
+    """
+    Detects the runs of the selected labels on one sampled line and appends them to the run arrays, see HatchKernels._collect_runs.
+    The sample at n_samples is the first sample behind the end of the line and only used for the end point of the last run.
+
+    Returns:
+        tuple: (run_ints, run_coords, run_count) with the (possibly grown) arrays and the new number of runs.
+    """
+    height, width = label_map.shape[0], label_map.shape[1]
+    run_label = -1
+    run_start = 0
+    for k in range(n_samples+1):
+        label = -1
+        if k < n_samples and (not cylindrical or valid[k]):
+            x_round = _legacy_round(xs[k])
+            y_round = _legacy_round(ys[k])
+            if x_round >= 0 and x_round < width and y_round >= 0 and y_round < height:
+                label = int(label_map[y_round, x_round])
+        if label == run_label:
+            continue
+        if selected[run_label+1]:
+            if run_count == run_ints.shape[0]:
+                grown_ints = np.empty((2*run_count, 3), dtype=np.int64)
+                grown_ints[:run_count] = run_ints
+                run_ints = grown_ints
+                grown_coords = np.empty((2*run_count, 4), dtype=np.float64)
+                grown_coords[:run_count] = run_coords
+                run_coords = grown_coords
+            # the x of the previous sample is the x before the last sample that fit on the cylinder
+            prev_k = max(last_valid[k]-1, 0) if cylindrical else k-1
+            run_ints[run_count, 0] = run_label
+            run_ints[run_count, 1] = line
+            run_ints[run_count, 2] = run_start
+            run_coords[run_count, 0] = xs[run_start]
+            run_coords[run_count, 1] = ys[run_start]
+            run_coords[run_count, 2] = (xs[k]+xs[prev_k])/2
+            run_coords[run_count, 3] = (ys[k]+ys[k-1])/2
+            run_count += 1
+        run_label = label
+        run_start = k
+    return run_ints, run_coords, run_count
+
+
+@jit
+def _line_runs(label_map, selected, starts_x, starts_y, steps_x, steps_y, sample_counts, line_offset, radial, min_x, max_x, min_y, incline,
+               center_x, center_y, max_rad, cylindrical, cyl_rad):
+    """
+    Samples straight lines (meander lines or rays) and collects the runs of the selected labels.
+    The coordinates are accumulated step by step, exactly like the np.cumsum of the Vectorized engine. A line ends at the first sample
+    outside the bounding box (meanders, radial False) or further than max_rad from the center (rays, radial True), at the latest at
+    sample_counts-1.
+
+    Returns:
+        tuple: (run_ints, run_coords, run_count) with (label, line, start sample) and (start x, start y, end x, end y) of every run.
+    """
+    max_count = 1
+    for i in range(len(sample_counts)):
+        max_count = max(max_count, sample_counts[i])
+    xs = np.empty(max_count, dtype=np.float64)
+    ys = np.empty(max_count, dtype=np.float64)
+    valid = np.ones(max_count, dtype=np.bool_)
+    last_valid = np.zeros(max_count, dtype=np.int64)
+    run_ints = np.empty((INITIAL_RUN_CAPACITY, 3), dtype=np.int64)
+    run_coords = np.empty((INITIAL_RUN_CAPACITY, 4), dtype=np.float64)
+    run_count = 0
+
+    for i in range(len(starts_x)):
+        x_target = starts_x[i]
+        y = starts_y[i]
+        x = x_target
+        latest_valid = -1
+        n_samples = sample_counts[i]-1
+        for k in range(sample_counts[i]):
+            if k > 0:
+                x_target += steps_x[i]
+                y += steps_y[i]
+            if cylindrical:
+                # samples that do not fit on the cylinder keep the x of the last sample that did
+                valid[k] = abs(x_target-center_x) <= cyl_rad
+                if valid[k]:
+                    x = _cylinder_x(x_target, center_x, cyl_rad)
+                    latest_valid = k
+                elif latest_valid < 0:
+                    x = x_target
+                last_valid[k] = max(latest_valid, 0)
+            else:
+                x = x_target
+            xs[k] = x
+            ys[k] = y
+
+            #loop condition of the per-sample loop. the first failing sample ends the line
+            if radial:
+                inside = math.sqrt((x_target-center_x)**2+(y-center_y)**2) <= max_rad
+            elif incline == -1:
+                inside = y >= min_y and x >= min_x
+            else:
+                inside = y >= min_y and x <= max_x
+            if not inside:
+                n_samples = k
+                break
+        run_ints, run_coords, run_count = _append_line_runs(
+            label_map, selected, xs, ys, valid, last_valid, n_samples, line_offset+i, cylindrical, run_ints, run_coords, run_count)
+    return run_ints, run_coords, run_count
+
+
+@jit
+def _curve_runs(label_map, label, radii, angles, curve_start, center_x, center_y, cylindrical, cyl_rad):
+    """
+    Samples a batch of curves (rings or spiral turns) and detects the runs of the label, see HatchKernels._curve_polylines.
+
+    Returns:
+        tuple: (x, y, run_starts, run_ends) with the coordinates of all samples and the first sample and the sample after the last
+        of every run.
+    """
+    height, width = label_map.shape[0], label_map.shape[1]
+    x = np.empty(len(angles), dtype=np.float64)
+    y = np.empty(len(angles), dtype=np.float64)
+    run_starts = np.empty(len(angles), dtype=np.int64)
+    run_ends = np.empty(len(angles), dtype=np.int64)
+    run_count = 0
+    in_run = False
+    for i in range(len(angles)):
+        x[i] = center_x+radii[i]*math.cos(angles[i])
+        y[i] = center_y+radii[i]*math.sin(angles[i])
+        inside = True
+        if cylindrical:
+            inside = abs(x[i]-center_x) <= cyl_rad
+            if inside:
+                x[i] = _cylinder_x(x[i], center_x, cyl_rad)
+        is_selected = False
+        if inside:
+            x_round = _legacy_round(x[i])
+            y_round = _legacy_round(y[i])
+            if x_round >= 0 and x_round < width and y_round >= 0 and y_round < height:
+                is_selected = label_map[y_round, x_round] == label
+
+        # a run never continues into the next curve
+        if in_run and (not is_selected or curve_start[i]):
+            run_ends[run_count] = i
+            run_count += 1
+            in_run = False
+        if is_selected and not in_run:
+            run_starts[run_count] = i
+            in_run = True
+    if in_run:
+        run_ends[run_count] = len(angles)
+        run_count += 1
+    return x, y, run_starts[:run_count], run_ends[:run_count]
+
+
+def _runs_from_arrays(run_ints, run_coords, run_count):
+    # splits the run arrays of _line_runs into the layout of HatchKernels._collect_runs
+    run_ints = run_ints[:run_count]
+    run_coords = run_coords[:run_count]
+    return (run_ints[:, 0].copy(), run_ints[:, 1].copy(), run_ints[:, 2].copy(),
+            run_coords[:, 0].copy(), run_coords[:, 1].copy(), run_coords[:, 2].copy(), run_coords[:, 3].copy())
+
+
+def hatch_meander_jit(hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, color, label, hatch_mode, cyl_rad,
+                      pixel_per_mm, cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Compiled scanline engine for the FixedMeander, RandomMeander and CrossedMeander patterns. Same interface and result as
+    HatchKernels.hatch_meander_vectorized.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    line_collections = hatch_meander_multicolor_jit(
+        hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, {label: color}, hatch_mode, cyl_rad, pixel_per_mm,
+        cross_angle=cross_angle, progress_callback=progress_callback, is_cancelled=is_cancelled, color_stats=color_stats, rng=rng)
+    if line_collections is None:
+        return None
+    return line_collections[label]
+
+
+def hatch_meander_multicolor_jit(hatch_pattern, hatch_distance, hatch_angle, step_size, label_map, center, colors, hatch_mode, cyl_rad,
+                                 pixel_per_mm, cross_angle=None, progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Compiled single-pass meander sweep for several colors. Same interface and result as HatchKernels.hatch_meander_multicolor.
+
+    Returns:
+        dict: {label: LineCollection}, or None if cancelled.
+    """
+    theta = HatchKernels.meander_angle(hatch_pattern, hatch_angle, cross_angle, rng)
+    starts_x, starts_y, bounds, cos_theta, sin_theta, incline = HatchKernels.meander_line_starts(label_map.shape, hatch_distance, theta)
+    min_x, max_x, min_y, max_y = bounds
+
+    # lookup table for the labels to hatch. shifted by one so that the label -1 (outside) maps to False
+    selected = np.zeros(int(label_map.max(initial=0))+2, dtype=bool)
+    selected[np.array(list(colors.keys()), dtype=np.int64)+1] = True
+
+    keep, t_limit = HatchKernels._cull_lines(color_stats, colors.keys(), hatch_mode, cyl_rad, starts_x, starts_y, cos_theta, sin_theta)
+    run_batches = []
+    if theta == 0 or theta == 90:
+        # the lines run along the image rows or columns, most of them are hatched from the cached runs of their row
+        axis_runs, keep = HatchKernels._axis_line_runs(label_map, selected, starts_x, starts_y, bounds, cos_theta, sin_theta, incline,
+                                                       step_size, center, hatch_mode, cyl_rad, keep)
+        run_batches.append(axis_runs)
+    k_max = HatchKernels._meander_line_lengths(starts_x, starts_y, bounds, cos_theta, sin_theta, incline, step_size, t_limit)
+    sample_counts = np.maximum(k_max, 0).astype(np.int64)+3
+    # the steps are added like the np.cumsum of the Vectorized engine
+    steps_x = np.full(len(starts_x), -(cos_theta*step_size))
+    steps_y = np.full(len(starts_y), -(sin_theta*step_size))
+
+    # the batches are only needed for the progress and the cancel checks, the kernel itself does not allocate per sample
+    diagonal = np.hypot(max_x-min_x, max_y-min_y)/step_size+3
+    batches = HatchKernels._index_batches(len(starts_x), max(1, int(HatchKernels.MAX_BATCH_SAMPLES // diagonal)), keep)
+    for batch_idx, (first_line, last_line) in enumerate(batches):
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        run_batches.append(_runs_from_arrays(*_line_runs(
+            label_map, selected, starts_x[first_line:last_line], starts_y[first_line:last_line], steps_x[first_line:last_line],
+            steps_y[first_line:last_line], sample_counts[first_line:last_line], first_line, False, min_x, max_x, min_y, incline,
+            float(center[0]), float(center[1]), 0.0, hatch_mode == "CylEquidistX", float(cyl_rad))))
+
+        if progress_callback is not None:
+            progress_callback((batch_idx+1)/len(batches))
+
+    return HatchKernels._runs_to_line_collections(HatchKernels._concat_runs(run_batches), center, pixel_per_mm, colors)
+
+
+def _curve_polylines_jit(curves, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm):
+    # compiled replacement of HatchKernels._curve_polylines
+    radii, angles, curve_start = HatchKernels._curve_samples(curves)
+    x, y, run_starts, run_ends = _curve_runs(label_map, label, radii, angles, curve_start, float(center[0]), float(center[1]),
+                                             hatch_mode == "CylEquidistX", float(cyl_rad))
+    return HatchKernels._sample_runs_to_line_collection(x, y, run_starts, run_ends, center, pixel_per_mm, color)
+
+
+def hatch_circular_jit(hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm,
+                       progress_callback=None, is_cancelled=None, color_stats=None, rng=random):
+    """
+    Compiled Circular pattern. Same interface and result as HatchKernels.hatch_circular_vectorized.
+    """
+    return HatchKernels._hatch_curves(
+        HatchKernels._circle_curves(label_map.shape, hatch_distance, step_size, rng), label_map, center, color, label, hatch_mode, cyl_rad,
+        pixel_per_mm, progress_callback, is_cancelled, color_stats, curve_polylines=_curve_polylines_jit)
+
+
+def hatch_spiral_jit(hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm,
+                     progress_callback=None, is_cancelled=None, color_stats=None):
+    """
+    Compiled Spiral pattern. Same interface and result as HatchKernels.hatch_spiral_vectorized.
+    """
+    return HatchKernels._hatch_curves(
+        HatchKernels._spiral_curves(label_map.shape, hatch_distance, step_size), label_map, center, color, label, hatch_mode, cyl_rad,
+        pixel_per_mm, progress_callback, is_cancelled, color_stats, curve_polylines=_curve_polylines_jit)
+
+
+def hatch_radial_jit(hatch_distance, step_size, label_map, center, color, label, hatch_mode, cyl_rad, pixel_per_mm,
+                     progress_callback=None, is_cancelled=None, color_stats=None):
+    """
+    Compiled Radial pattern. Same interface and result as HatchKernels.hatch_radial_vectorized.
+
+    Returns:
+        LineCollection: The hatch lines of the color, or None if cancelled.
+    """
+    max_rad = HatchKernels._max_curve_radius(label_map.shape, hatch_distance)
+    angle_res = np.atan(hatch_distance/max_rad)*2
+    angles = np.linspace(0, 2*np.pi, int(np.ceil(2*np.pi/angle_res)))
+
+    selected = np.zeros(int(label_map.max(initial=0))+2, dtype=bool)
+    selected[label+1] = True
+
+    keep, r_limit = HatchKernels._cull_rays(color_stats, [label], hatch_mode, cyl_rad, angles, center)
+    sample_count = int((max_rad if r_limit is None else min(max_rad, r_limit))/step_size)+3
+    sample_counts = np.full(len(angles), sample_count, dtype=np.int64)
+    steps_x = np.cos(angles)*step_size
+    steps_y = np.sin(angles)*step_size
+    starts_x = np.full(len(angles), float(center[0]))
+    starts_y = np.full(len(angles), float(center[1]))
+
+    batches = HatchKernels._index_batches(len(angles), max(1, int(HatchKernels.MAX_BATCH_SAMPLES // sample_count)), keep)
+    run_batches = []
+    for batch_idx, (first_ray, last_ray) in enumerate(batches):
+        #check if hatching was cancelled
+        if is_cancelled is not None and is_cancelled():
+            return None
+
+        run_batches.append(_runs_from_arrays(*_line_runs(
+            label_map, selected, starts_x[first_ray:last_ray], starts_y[first_ray:last_ray], steps_x[first_ray:last_ray],
+            steps_y[first_ray:last_ray], sample_counts[first_ray:last_ray], first_ray, True, 0.0, 0.0, 0.0, 0,
+            float(center[0]), float(center[1]), float(max_rad), hatch_mode == "CylEquidistX", float(cyl_rad))))
+
+        if progress_callback is not None:
+            progress_callback((batch_idx+1)/len(batches))
+
+    return HatchKernels._runs_to_line_collections(HatchKernels._concat_runs(run_batches), center, pixel_per_mm, {label: color})[label]
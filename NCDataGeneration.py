@@ -3,19 +3,28 @@ from PyQt6.QtWidgets import QFileDialog, QProgressDialog
 from PyQt6.QtCore import QThread, pyqtSignal
 import numpy as np
 from collections import defaultdict
-import random
 from HelperClasses import Point, HatchData, HatchCluster
+from HatchEngine import HatchSettings, CancelToken, ProgressReporter, HatchCache, hatch_image
+from HatchDiskCache import HatchDiskCache
+from PathManager import get_cache_dir
+import TiledHatching
 import ezdxf
 
 '''
-This module contains the Hatcher class, which is responsible for generating hatching patterns based on the input image and user settings. 
-It includes methods for creating different hatch patterns, calculating clusters for hatching, and managing the hatching process in a separate thread to keep the GUI responsive.
+This module contains the Hatcher class, which connects the hatching tab of the GUI to the hatching engine, and the contour generation.
+The hatching itself (clusters, hatch patterns, cylindrical transformation) is done by the Qt-free engine in HatchEngine.py. The Hatcher only reads the settings
+from the GUI (in the GUI thread), runs the engine in a separate thread (HatchingWorker) to keep the GUI responsive, and forwards progress and cancellation.
+It keeps a HatchCache of the last hatching, so pressing hatch again after a small edit of the image only hatches the changed colors.
+Complete hatchings are also stored in a HatchDiskCache, so identical jobs are restored from disk, also after a restart.
 
 DATA-ARCHITECTURE:
 The hatching data is organized in a hierarchical structure to efficiently manage the complex relationships between colors, clusters, and hatch lines. The structure is as follows:
 - HatchData: Contains a list of HatchClusters and a type description.
 - HatchCluster: Represents a cluster of pixels. Its Data contains a list of Line Collections for each color in that cluster, the original image matrix for the cluster, reference position for hatching, and additional metadata.
+  Before hatching, the cluster matrix is converted once into a label map (integer index of every pixel into the sorted color list of the cluster), which is used by all pattern generators.
 - Line Collection: A list of polylines. Each line collection holds the polylines for a single color of the cluster. Each polyline represents a continuous hatch line.
+  The hatching engine returns array-backed LineCollections (see HelperClasses). They store the points of all polylines of a color column-wise
+  and give the same polylines of Points when iterated, so both layouts can be used wherever Line Collections are read.
 - Polyline: A list of Points that form a continuous line. Each Point contains x, y, z coordinates, move type (0 for move, 1 for draw), and color information.
 This architecture allows for efficient storage and retrieval of hatching data, enabling the application to handle complex images with multiple colors and hatch patterns while maintaining performance.
 '''
@@ -28,7 +37,9 @@ class Hatcher:
         self.clusters = None
         self.image_matrix = None
         self.pixel_per_mm = None
-        self.hatching_cancelled = False
+        self.cancel_token = CancelToken()  # cancel token of the running hatching
+        self.hatch_cache = HatchCache()  # per-color results of the last hatching
+        self.hatch_disk_cache = HatchDiskCache(get_cache_dir())  # complete hatchings across restarts
         self.center_for_hatch = None  # Center of the image for Hatching
 
         # Initialize GUI elements from the preloaded PyQt6 GUI
@@ -45,12 +56,23 @@ class Hatcher:
         self.create_contours_button = gui.create_contours_button
         self.contour_source_combobox = gui.contour_source_combobox
         self.white_threshold_hatching_spinbox = gui.white_threshold_hatching_spinbox
+        self.hatch_engine_combobox = gui.hatch_engine_combobox
+        self.parallel_hatching_checkbox = gui.parallel_hatching_checkbox
+        self.tiled_hatching_checkbox = gui.tiled_hatching_checkbox
+        self.island_hatching_checkbox = gui.island_hatching_checkbox
+        self.centerline_hatching_checkbox = gui.centerline_hatching_checkbox
+        self.min_segment_spinbox = gui.min_segment_spinbox
+        self.bridge_gap_spinbox = gui.bridge_gap_spinbox
+        self.bridge_mode_combobox = gui.bridge_mode_combobox
 
         # Initialize combobox values
-        self.hatch_pattern_combobox.addItems(["FixedMeander", "RandomMeander", "CrossedMeander", "Circular", "Spiral", "Radial"])
+        self.hatch_pattern_combobox.addItems(["FixedMeander", "RandomMeander", "CrossedMeander", "Circular", "Spiral", "Radial", "Contour", "OptimizedMeander"])
         self.hatch_dist_mode_combobox.addItems(["ColorRanged", "Fixed"])
         self.hatch_mode_combobox.addItems(["Flat", "CylEquidistX", "CylEquidistRad"])
         self.contour_source_combobox.addItems(["Image", ".dxf File"])
+        self.hatch_engine_combobox.addItems(["Standard", "Vectorized", "RotateScan", "PixelExact", "Polygon", "Numba"])
+        self.hatch_engine_combobox.setCurrentText("Vectorized")
+        self.bridge_mode_combobox.addItems(["Laser On", "Power Off"])
 
         # Set default values for spinboxes
         self.hatch_angle_spinbox.setValue(45.0)
@@ -63,6 +85,7 @@ class Hatcher:
         self.hatch_pattern_combobox.currentTextChanged.connect(self.update_angle_entry_state)
         self.hatch_dist_mode_combobox.currentTextChanged.connect(self.update_hatch_dist_mode_state)
         self.hatch_mode_combobox.currentTextChanged.connect(self.update_hatch_mode_state)
+        self.tiled_hatching_checkbox.toggled.connect(self.update_tiled_hatching_state)
         self.hatch_image_button.clicked.connect(lambda: self.create_hatching(mode = "manual"))
         self.create_contours_button.clicked.connect(self.create_contours)
 
@@ -70,6 +93,7 @@ class Hatcher:
         self.update_angle_entry_state()
         self.update_hatch_dist_mode_state()
         self.update_hatch_mode_state()
+        self.update_tiled_hatching_state()
 
     def update_angle_entry_state(self, *args):
         # Enable hatch angle spinbox only for FixedMeander or CrossedMeander patterns
@@ -95,101 +119,29 @@ class Hatcher:
         else:
             self.cyl_rad_spinbox.setEnabled(True)
 
-    def calculate_clusters(self, hatch_mode, workpiece_radius):
-        hatch_data= HatchData([], "")
-        image_matrix = self.image_matrix #np.flipud(self.image_matrix)
+    def update_tiled_hatching_state(self, *args):
+        # island and centerline hatching are not supported by the tiled hatching
+        tiled = self.tiled_hatching_checkbox.isChecked()
+        self.island_hatching_checkbox.setEnabled(not tiled)
+        self.centerline_hatching_checkbox.setEnabled(not tiled)
 
-        if hatch_mode in ["CylEquidistX", "CylEquidistRad"]:
-
-            # Check if the image ist too large for cylindrical hatching (Laser Distance has to be maintained). Dive then.
-            image_width_px = image_matrix.shape[1]
-            image_with_mm = image_width_px / self.pixel_per_mm
-            z_dist = 17 # Distance from in mm laser to workpiece for 1064nm lasers
-            radius_mm = workpiece_radius
-            
-            #calculate the maximum angle allowed to maintain laser distance
-            max_angle_allowed = np.acos((radius_mm - z_dist)/radius_mm) * 2 * (180/np.pi)  # in degrees
-
-            #calculate the angle that the image would cover on the cylinder
-            max_angle_image=image_with_mm/(2*np.pi*radius_mm)*360
-            if max_angle_image>360:
-                return None
-            
-            #get the center of the image_matrix for hatching
-            if self.center_for_hatch is None:
-                self.center_for_hatch = [(image_matrix.shape[1]-1)/2,
-                                (image_matrix.shape[0]-1)/2]
-            
-            if max_angle_image>max_angle_allowed:
-                clusters_needed = int(np.ceil(max_angle_image/max_angle_allowed))
-                cluster_width_px = int(np.ceil(image_width_px/clusters_needed))
-                for i in range(clusters_needed):
-                    start_x = i * cluster_width_px
-                    end_x = min((i + 1) * cluster_width_px, image_width_px)
-                    cluster_matrix = image_matrix[:, start_x:end_x]
-                    cluster_mid_x_rel_to_image_center = ((start_x + end_x) / 2 - self.center_for_hatch[0]) / self.pixel_per_mm
-                    angle_for_cluster_mid = (cluster_mid_x_rel_to_image_center/(2*radius_mm*np.pi) * 360)*-1 #invert angle for correct rotation direction
-                    ref_position = [0, 0, 0, angle_for_cluster_mid]  # x, y, z, rotation
-                    cluster_center_for_hatch = [(cluster_matrix.shape[1]-1)/2, self.center_for_hatch[1], 0]
-                    hatch_data.hatch_clusters.append(HatchCluster(None, cluster_matrix, ref_position,cluster_center_for_hatch, radius_mm))
-                return hatch_data
-        else:
-            radius_mm = 0  # Not used for non-cylindrical hatching
-
-        #if not cylindrical hatching or image fits within laser distance, return single cluster
-        hatch_data.hatch_clusters.append(HatchCluster(None, image_matrix, ref_position=[0,0,0,0], cluster_center_for_hatch=self.center_for_hatch, cylinder_radius=radius_mm))
-
-        return hatch_data
-
-    def get_sorted_unique_colors(self, image_matrix):
-        """
-        Extracts all unique RGB colors from the image and sorts them by the sum of the RGB values in descending order.
-
-        Args:
-            image_matrix (numpy.ndarray): The image matrix with shape (height, width, 3).
-
-        Returns:
-            list: A list of unique RGB colors sorted by the sum of the RGB values in descending order.
-        """
-        # # Reshape the image matrix to a 2D array where each row is an RGB color
-        # reshaped_image = image_matrix.reshape(-1, 3)
-        
-        # # Get unique colors
-        # unique_colors = np.unique(reshaped_image, axis=0)
-        
-        # # Sort unique colors by the sum of the RGB values in descending order
-        # sorted_colors = sorted(unique_colors, key=lambda color: np.sum(color), reverse=True)
-        
-        # # Convert sorted colors to a list of tuples
-        # sorted_colors_list = [tuple(color) for color in sorted_colors]
-        # Reshape and convert rows to tuples
-
-        #new implementation for speed
-        reshaped = image_matrix.reshape(-1, 3)
-        
-        # Use a set to get unique colors (very fast)
-        unique_colors_set = set(map(tuple, reshaped))
-        
-        # Convert to list and sort by sum of RGB values
-        sorted_colors_list = sorted(unique_colors_set, key=lambda color: sum(color), reverse=True)
-    
-        return sorted_colors_list
-    
     def create_hatching(self, mode="manual", db_color_palette=None, hatch_pattern=None,
                        hatch_angle=None, cyl_rad_mm=None, hatch_mode=None,
                        stepsize_mm=None, white_threshold=None):
         
+        # read image and settings here in the GUI thread. the worker thread must not touch any widget
+        self.get_handler_data()
+        settings = self.collect_hatch_settings(mode, db_color_palette, hatch_pattern, hatch_angle, cyl_rad_mm, hatch_mode, stepsize_mm, white_threshold)
+        self.cancel_token = CancelToken()
+
         # Create progress dialog
         self.progress_dialog = QProgressDialog("Hatching in progress...", "Cancel", 0, 100, self.gui)
         self.progress_dialog.setWindowTitle("Creating Hatch Pattern")
         self.progress_dialog.setModal(True)
         
         # Create and setup worker
-        self.worker = HatchingWorker(
-            self, mode, db_color_palette, hatch_pattern,
-            hatch_angle, cyl_rad_mm, hatch_mode,
-            stepsize_mm, white_threshold
-        )
+        self.worker = HatchingWorker(self.image_matrix, self.pixel_per_mm, self.center_for_hatch, settings, self.cancel_token, self.hatch_cache, self.hatch_disk_cache,
+                                     tiled=self.tiled_hatching_checkbox.isChecked())
 
         # Connect signals
         self.worker.progress.connect(self.progress_dialog.setValue)
@@ -198,7 +150,7 @@ class Hatcher:
         
         
         # Start worker
-        self.hatching_cancelled = False
+        self.hatch_progress_label.setText("Hatch Progress: Hatching...")
         self.worker.start()
         self.progress_dialog.show()
 
@@ -208,90 +160,59 @@ class Hatcher:
             while self.waiting_for_worker:
                 QtWidgets.QApplication.processEvents()
 
-    def create_hatching_worker(self, 
-                        mode="manual",
-                        db_color_palette=None,
-                        hatch_pattern=None,
-                        hatch_angle=None,
-                        cyl_rad_mm=None,
-                        hatch_mode=None,
-                        stepsize_mm=None,
-                        white_threshold=None):
-        #hatch_data= HatchData([], "")
-
+    def collect_hatch_settings(self, mode="manual", db_color_palette=None, hatch_pattern=None, hatch_angle=None, cyl_rad_mm=None, hatch_mode=None, stepsize_mm=None, white_threshold=None):
+        """
+        Collects the HatchSettings for the engine. In manual mode all settings are read from the hatching tab,
+        in automatic mode the given values are used and pattern, angle and distance of every color come from the database color palette.
+        """
         if mode == "manual":
-            hatch_dist_mode = self.hatch_dist_mode_combobox.currentText()
-            hatch_pattern = self.hatch_pattern_combobox.currentText()
-            hatch_angle = self.hatch_angle_spinbox.value()  # Get hatch angle from spinbox
-            cyl_rad_mm = self.cyl_rad_spinbox.value()  # Get cylinder radius from spinbox
-            hatch_mode = self.hatch_mode_combobox.currentText()  # Get hatch mode from combobox
-            stepsize_mm = self.hatch_precision_spinbox.value()
-            white_threshold = self.white_threshold_hatching_spinbox.value()
-        else:
-            hatch_dist_mode = "Fixed"  # Default for automatic mode
-        try:
-            self.get_handler_data()
-            # Reset progress bar
-            self.worker.progress.emit(int(0))
-            self.hatch_progress_label.setText("Hatch Progress: Hatching...")
-            
-            #check if hatching was cancelled
-            if self.hatching_cancelled:
-                return None
-            
-            #divde the image into clusters to hatch and store in appropriate output format already. then loop over all clusters
-            hatch_data = self.calculate_clusters(hatch_mode, cyl_rad_mm)
-            if hatch_data is None:
-                return None
-
-            for idx, hatch_cluster in enumerate(hatch_data.hatch_clusters):
-                cluster_progress = (idx+1)/len(hatch_data.hatch_clusters)*100
-                #first get the colors of the cluster
-                color_list = self.get_sorted_unique_colors(hatch_cluster.input_matrix)
-                hatch_cluster.data = self.hatch_cluster(
-                    cluster_matrix = hatch_cluster.input_matrix,
-                    cluster_center_for_hatch = hatch_cluster.cluster_center_for_hatch,
-                    mode=mode,
-                    color_list=color_list,
-                    hatch_pattern=hatch_pattern,
-                    hatch_angle=hatch_angle,
-                    hatch_dist_mode=hatch_dist_mode,
-                    cyl_rad_mm=cyl_rad_mm,
-                    hatch_mode=hatch_mode,
-                    stepsize_mm=stepsize_mm,
-                    white_threshold=white_threshold,
-                    db_color_palette=db_color_palette,
-                    cluster_progress = cluster_progress
-                )
-                if hatch_cluster.data == 0 or hatch_cluster.data is None:
-                    return None
-                
-            hatch_data.type = f"Image: {self.hatch_pattern_combobox.currentText()} with {self.hatch_dist_mode_combobox.currentText()} Lines"
-            
-            #check if hatching was cancelled
-            if self.hatching_cancelled:
-                return None
-            if hatch_mode in ["CylEquidistX", "CylEquidistRad"]:
-                for hatch_cluster in hatch_data.hatch_clusters:
-                    hatch_cluster.data = self.make_hatch_cylindrical(hatch_cluster.data, cyl_rad_mm)
-                addstring = f" and {self.hatch_mode_combobox.currentText()}"
-                hatch_data.type += addstring
-            return hatch_data
-
-        except Exception as e:
-            print(f"Error hatching clusters: {e}")
+            return HatchSettings(
+                hatch_pattern=self.hatch_pattern_combobox.currentText(),
+                hatch_angle=self.hatch_angle_spinbox.value(),
+                hatch_dist_mode=self.hatch_dist_mode_combobox.currentText(),
+                hatch_dist_min=self.hatch_dist_min_spinbox.value(),
+                hatch_dist_max=self.hatch_dist_max_spinbox.value(),
+                hatch_mode=self.hatch_mode_combobox.currentText(),
+                cyl_rad_mm=self.cyl_rad_spinbox.value(),
+                stepsize_mm=self.hatch_precision_spinbox.value(),
+                white_threshold=self.white_threshold_hatching_spinbox.value(),
+                hatch_engine=self.hatch_engine_combobox.currentText(),
+                parallel_hatching=self.parallel_hatching_checkbox.isChecked(),
+                island_hatching=self.island_hatching_checkbox.isChecked(),
+                centerline_hatching=self.centerline_hatching_checkbox.isChecked(),
+                min_segment_length=self.min_segment_spinbox.value(),
+                bridge_gap=self.bridge_gap_spinbox.value(),
+                bridge_mode=self.bridge_mode_combobox.currentText()
+            )
+        return HatchSettings(
+            hatch_pattern=hatch_pattern,
+            hatch_angle=hatch_angle,
+            hatch_dist_mode="Fixed",  # Default for automatic mode
+            hatch_mode=hatch_mode,
+            cyl_rad_mm=cyl_rad_mm,
+            stepsize_mm=stepsize_mm,
+            white_threshold=white_threshold,
+            hatch_engine=self.hatch_engine_combobox.currentText(),
+            parallel_hatching=self.parallel_hatching_checkbox.isChecked(),
+            island_hatching=self.island_hatching_checkbox.isChecked(),
+            centerline_hatching=self.centerline_hatching_checkbox.isChecked(),
+            min_segment_length=self.min_segment_spinbox.value(),
+            bridge_gap=self.bridge_gap_spinbox.value(),
+            bridge_mode=self.bridge_mode_combobox.currentText(),
+            db_color_palette=db_color_palette
+        )
 
     def hatching_finished(self, result):
         if result:
             self.hatch_data = result
             self.set_handler_data()
             self.hatch_progress_label.setText("Hatch State: Finished!")
-            self.waiting_for_worker = False
+        self.waiting_for_worker = False
         #self.progress_dialog.close()
     
     def cancel_hatching(self):
         if hasattr(self, 'worker'):
-            self.hatching_cancelled = True
+            self.cancel_token.cancel()
 
             # Disconnect all signals
             self.worker.progress.disconnect()
@@ -310,648 +231,6 @@ class Hatcher:
             self.hatch_progress_label.setText("Hatch State: Cancelled")
             self.waiting_for_worker = False
 
-    def hatch_cluster(self, cluster_matrix, cluster_center_for_hatch, mode="manual", color_list=None, hatch_pattern="RandomMeander", hatch_angle=90, hatch_dist_mode="ColorRanged", cyl_rad_mm = 100, hatch_mode = "Flat", stepsize_mm = 0.1, white_threshold=255, db_color_palette=None, cluster_progress=0):
-        hatched_clusters = []
-        color_cluster_counter = 0
-        cyl_rad = cyl_rad_mm * self.pixel_per_mm
-        #cluster = np.flipud(self.image_matrix)
-        
-        # if self.center_for_hatch is None:
-        #     self.center_for_hatch = [(input_matrix.shape[1]-1)/2,
-        #                     (input_matrix.shape[0]-1)/2]
-
-        for color in color_list:
-            #check if hatching was cancelled
-            if self.hatching_cancelled:
-                return None
-            
-            # Ensure the sum of RGB values is within a safe range
-            color = np.array(color, dtype=np.int64)
-
-            if sum(color)/3 > white_threshold:
-                # Skip colors that are too bright (white), and update the progress bar
-                color_cluster_counter += 1
-                self.worker.progress.emit(int(np.ceil(color_cluster_counter / len(color_list) * cluster_progress)))
-                QtWidgets.QApplication.processEvents()  # Update the UI
-                continue
-
-            #if mode is automatic, get hatch settings from best fit color of database color palette   
-            if mode == "automatic":
-                bestfit_color = db_color_palette.find_paramset_by_color(color)
-                hatch_distance = bestfit_color['hatch_distance']/1000
-                hatch_pattern = bestfit_color['hatch_pattern']
-                hatch_angle = bestfit_color['hatch_angle']
-            else:    
-                if hatch_dist_mode == "ColorRanged":
-                    # Define Hatch Dist depending on chosen Hatch_Mode
-                    h_min = self.hatch_dist_min_spinbox.value()  # Get minimum hatch distance
-                    h_max = self.hatch_dist_max_spinbox.value()  # Get maximum hatch distance
-                    hatch_distance = (h_min + sum(color) / 765 * (h_max - h_min))/1000
-                elif hatch_dist_mode == "Fixed":
-                    hatch_distance = self.hatch_dist_min_spinbox.value()/1000
-                else:
-                    print("Hatch Distance Mode not recognized")
-                    continue
-
-            step_size = stepsize_mm * self.pixel_per_mm  # Step size in pixels
-            hatch_distance = hatch_distance * self.pixel_per_mm  # Hatch distance in pixels
-
-            progress_state = [color_cluster_counter, len(color_list), cluster_progress]
-
-            if hatch_pattern in ["RandomMeander", "FixedMeander"]:
-                line_collection = self.hatch_meander(
-                    hatch_pattern, hatch_distance, hatch_angle, step_size, cluster_matrix, cluster_center_for_hatch, color, hatch_mode, cyl_rad, progress_state
-                )
-                if line_collection == 0:
-                    return 0
-                else:
-                    hatched_clusters.append(line_collection)
-            elif hatch_pattern == "CrossedMeander":
-                line_collection1 = self.hatch_meander(
-                    hatch_pattern, hatch_distance, hatch_angle, step_size, cluster_matrix, cluster_center_for_hatch, color, hatch_mode, cyl_rad, progress_state, cross_angle=0
-                )
-                line_collection2 = self.hatch_meander(
-                    hatch_pattern, hatch_distance, hatch_angle, step_size, cluster_matrix, cluster_center_for_hatch, color, hatch_mode, cyl_rad, progress_state, cross_angle=90
-                )
-                if line_collection1 == 0:
-                    return 0
-                else:
-                    hatched_clusters.append(line_collection1)
-                    hatched_clusters.append(line_collection2)
-            elif hatch_pattern == "Circular":
-                line_collection = self.hatch_circular(
-                    hatch_distance, step_size, cluster_matrix, cluster_center_for_hatch, color, hatch_mode, cyl_rad, progress_state
-                )
-                if line_collection == 0:
-                    return 0
-                else:
-                    hatched_clusters.append(line_collection)
-            elif hatch_pattern == "Spiral":
-                line_collection = self.hatch_spiral(
-                    hatch_distance, step_size, cluster_matrix, cluster_center_for_hatch, color, hatch_mode, cyl_rad, progress_state
-                )
-                if line_collection == 0:
-                    return 0
-                else:
-                    hatched_clusters.append(line_collection)
-            elif hatch_pattern == "Radial":
-                line_collection = self.hatch_radial(
-                    hatch_distance, step_size, cluster_matrix, cluster_center_for_hatch, color, hatch_mode, cyl_rad, progress_state
-                )
-                if line_collection == 0:
-                    return 0
-                else:
-                    hatched_clusters.append(line_collection)
-            else:
-                print("Unknown hatch method")
-            color_cluster_counter += 1
-            
-            #check if hatching was cancelled
-            if self.hatching_cancelled:
-                return None
-
-            # Update progress bar
-            self.worker.progress.emit(int(np.ceil(color_cluster_counter / len(color_list) * cluster_progress)))
-            QtWidgets.QApplication.processEvents()  # Update the UI
-        return hatched_clusters
-
-    def hatch_meander(self, hatch_pattern, hatch_distance, hatch_angle, step_size, image_matrix, center, color, hatch_mode, cyl_rad, progress_state, cross_angle=None):
-        line_collection_poly=[]
-        hatch_line_dir=1
-        hatch_x_finished=False
-        hatch_y_finished=False
-        
-        # Choose slice angle based on user input
-        theta = 0  # Default angle is 0 degrees
-        if hatch_pattern == "FixedMeander":
-            theta = hatch_angle  # Get hatch angle from spinbox
-        elif hatch_pattern == "RandomMeander":
-            # Randomly choose theta between 0 and 179 degrees
-            theta = np.floor(random.uniform(0, 180))
-        elif hatch_pattern == "CrossedMeander":
-            theta = hatch_angle + cross_angle
-        theta = np.mod(theta, 180)  # Ensure theta is between 0 and 179 degrees
-        theta_rad = np.radians(theta)  # Convert theta to radians
-        cos_theta = np.cos(theta_rad)
-        sin_theta = np.sin(theta_rad)
-
-        #calculate step size in x and y direction. catch special cases of 0 an d 90 degrees
-        if theta == 0:
-            max_lines=image_matrix.shape[0]/hatch_distance
-            step_start_y=hatch_distance
-            step_start_x=1
-            hatch_x_finished = True
-        elif theta == 90:
-            max_lines=image_matrix.shape[1]/hatch_distance
-            step_start_x=hatch_distance
-            step_start_y=1
-            hatch_y_finished=True
-        else:
-            step_start_y = np.abs(hatch_distance/cos_theta)
-            step_start_x = np.abs(hatch_distance/sin_theta)
-            max_lines=image_matrix.shape[0]/step_start_y+image_matrix.shape[1]/step_start_x
-
-        # Determine the bounding box of the cluster.
-        min_y = -np.ceil(step_start_y)
-        max_y = image_matrix.shape[0]+np.ceil(step_start_y)
-        min_x = -np.ceil(step_start_x)
-        max_x = image_matrix.shape[1]+np.ceil(step_start_x)
-
-        # center = self.center_for_hatch
-        #center = [(max_x+min_x)/2, (max_y+min_y)/2] #depreciated: no defined globally
-
-        # Determine the starting point of the hatch lines.
-        if cos_theta >= 0:
-            hatch_start_x = max_x
-            hatch_start_y = min_y
-            incline = -1
-        else:
-            hatch_start_x = min_x
-            hatch_start_y = min_y
-            incline = 1
-
-        # Generate hatch lines within the bounding box
-        line_count = 0
-        hatching_done = False
-        #loop over hatchlines. will set hatching done when both x and y linestarts are outsinde the bounding box
-        while not hatching_done:
-            #check if hatching was cancelled
-            if self.hatching_cancelled:
-                return None
-            
-            prev_x = None
-            prev_y = None
-            x_target = hatch_start_x
-            if hatch_mode == "CylEquidistX":
-                if np.abs(x_target-center[0])>cyl_rad:
-                    point_outside=True
-                    x=0 #just a dummy
-                else:
-                    x=np.asin((x_target-center[0])/cyl_rad)*(cyl_rad)+center[0]
-            else:
-                x=x_target
-            y = hatch_start_y
-            polyline = []
-            polyline_cache=[]
-            point_outside=False
-            #loop over one hatchline until it is outside the bounding box. this is looped over A LOT. Limit ALL function calls as much as possible
-            current_pixel_color=np.array([-1,-1,-1]) #use non existend color when the point is outside the image
-            while ((x >= min_x or incline==1) and (x <= max_x or incline==-1) and y >= min_y):
-                #use a special rounding for x and y for efficiency. we know that they can never be negative (else it will be caught anyway)
-                if int(y)==int(y-0.5):
-                    y_round=int(y+1)
-                else:
-                    y_round=int(y)
-                if int(x)==int(x-0.5):
-                    x_round=int(x+1)
-                else:
-                    x_round=int(x)
-                    
-                #check if the current point is outside the image
-                if point_outside or y_round>=image_matrix.shape[0] or y_round<0 or x_round>= image_matrix.shape[1] or x_round<0:
-                    if polyline:
-                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
-                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
-                        z1=0
-                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                        polyline_cache.append(polyline)
-                        polyline=[]
-                    point_outside=False
-                    current_pixel_color=np.array([-1,-1,-1])
-                else:
-                    current_pixel_color=image_matrix[y_round, x_round]
-
-                #check if the current pixel is the same color as the hatch color
-                if current_pixel_color[0]==color[0] and current_pixel_color[1]==color[1] and current_pixel_color[2]==color[2]: #MUCH faster than np.array_equal
-                    
-                    if polyline:
-                        # polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                        pass
-                    else:
-                        x1=(x-center[0])/self.pixel_per_mm
-                        y1=(y-center[1])/self.pixel_per_mm
-                        z1=0
-                        polyline.append(Point(x1, y1, z1, 0, color[0], color[1], color[2]))
-                else:
-                    if polyline:
-                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
-                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
-                        z1=0
-                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                        polyline_cache.append(polyline)
-                        polyline=[]
-                        
-                #increase the x/y step and keep track of last position
-                x_target -= cos_theta * step_size
-                if hatch_mode == "CylEquidistX":
-                    if np.abs(x_target-center[0])>cyl_rad:
-                        point_outside=True
-                    else:
-                        prev_x=x
-                        x=np.asin((x_target-center[0])/cyl_rad)*(cyl_rad)+center[0]
-                else:
-                    prev_x=x
-                    x=x_target
-                prev_y = y
-                y -= sin_theta * step_size
-
-            #finally append the last line if there is one
-            if polyline:
-                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
-                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
-                        z1=0
-                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                        polyline_cache.append(polyline)
-                        polyline=[]
-            #append polyines here in correct order for meandering
-            if hatch_line_dir==1:
-                for poly_line in polyline_cache:
-                    line_collection_poly.append(poly_line)
-            else:
-                for poly_line in reversed(polyline_cache):
-                    poly_line[0].move_type=1
-                    poly_line[-1].move_type=0
-                    line_collection_poly.append(list(reversed(poly_line)))
-
-            hatch_line_dir*=-1
-
-            # move to next line. First move along y, then along x
-            if not hatch_y_finished:
-                hatch_start_y += step_start_y 
-                if hatch_start_y >= max_y:
-                    hatch_y_finished = True #check if we are at the end of the bounding box in y-direction
-            elif not hatch_x_finished:
-                if hatch_y_finished and not hatch_start_y>=max_y:
-                    hatch_start_y=max_y+1 # this is just for 90deg case. y hast to be set manually
-                hatch_start_x += incline*step_start_x
-                if (hatch_start_x <= min_x or incline==1) and (hatch_start_x >= max_x or incline==-1): #check if we are at the end of the bounding box in x-direction
-                    hatch_x_finished = True
-            else:
-                hatching_done = True
-
-            #update progress bar
-            line_count+=1
-            current_state = np.ceil((progress_state[0]+line_count/max_lines)/progress_state[1]*progress_state[2])
-            if current_state > self.progress_dialog.value()+1 and not self.hatching_cancelled:
-                self.worker.progress.emit(int(current_state))
-                pass
-        return line_collection_poly
-        
-    def hatch_circular(self, hatch_distance, step_size, image_matrix, center, color, hatch_mode, cyl_rad, progress_state):
-        line_collection_poly=[]
-        # Maximum Radius of one circle defined by the cluster diagonal, plus extra space for one hatch line
-        max_rad = np.ceil(
-            np.sqrt((image_matrix.shape[0]/2)**2+(image_matrix.shape[1]/2)**2))+np.ceil(hatch_distance)
-
-        # center = self.center_for_hatch
-        # center = [(image_matrix.shape[1]-1)/2,
-        #           (image_matrix.shape[0]-1)/2]
-
-        point_outside=False
-        hatch_rad = hatch_distance/10 #just the start radius is smaller
-
-        #loop over circles. will stop when the circle is outside the image
-        while hatch_rad <= max_rad:
-            #check if hatching was cancelled
-            if self.hatching_cancelled:
-                return None
-            
-            angle_res = step_size/hatch_rad
-            if angle_res > 2*np.pi/36:
-                angle_res = 2*np.pi/36
-            # Randomly choose theta between 0 and 19 degrees
-            start_angle = np.deg2rad(np.floor(random.uniform(0, 20)))
-            polyline = []
-            current_pixel_color=np.array([-1,-1,-1]) #use non existend color when the point is outside the image
-
-            #loop over single circle. points are known so use a foor loop. The inside is called A LOT. Use as few function calls as possible
-            for angle in np.linspace(start_angle, start_angle+2*np.pi, int(np.ceil(2*np.pi/angle_res))):
-                x = center[0]+hatch_rad*np.cos(angle)
-                if hatch_mode == "CylEquidistX":
-                    if np.abs(x-center[0])>cyl_rad:
-                        point_outside=True
-                    else:
-                        x=np.asin((x-center[0])/cyl_rad)*(cyl_rad)+center[0]
-                y = center[1]+hatch_rad*np.sin(angle)
-
-                #use a special rounding for x and y for efficiency. we know that they can never be negative (else it will be caught anyway)
-                if int(y)==int(y-0.5):
-                    y_round=int(y+1)
-                else:
-                    y_round=int(y)
-                if int(x)==int(x-0.5):
-                    x_round=int(x+1)
-                else:
-                    x_round=int(x)
-
-                #check if current pixel is outside the image
-                if point_outside or y_round>=image_matrix.shape[0] or y_round<0 or x_round>= image_matrix.shape[1] or x_round<0:
-                    if polyline:
-                        if len(polyline) > 1:
-                            line_collection_poly.append(polyline)
-                        polyline = []
-                    point_outside=False
-                    current_pixel_color=np.array([-1,-1,-1])
-                else:
-                    current_pixel_color=image_matrix[y_round, x_round]
-
-                #check if current pixel is the color we want to hatch
-                if current_pixel_color[0]==color[0] and current_pixel_color[1]==color[1] and current_pixel_color[2]==color[2]: #MUCH faster than np.array_equal
-                    x1 = (x-center[0])/self.pixel_per_mm
-                    y1 = (y-center[1])/self.pixel_per_mm
-                    z1 = 0
-                    if polyline:
-                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                    else:
-                        polyline.append(Point(x1, y1, z1, 0, color[0], color[1], color[2]))
-                else:
-                    if polyline:
-                        if len(polyline) > 1:
-                            line_collection_poly.append(polyline)
-                        polyline = []
-
-                angle += angle_res
-            if polyline:  # if we have a last line add it
-                if len(polyline) > 1:
-                        line_collection_poly.append(polyline)
-                polyline = []
-            hatch_rad += hatch_distance
-            #update progress bar
-            current_state = np.ceil((progress_state[0]+hatch_rad/max_rad)/progress_state[1]*progress_state[2])
-            if current_state > self.progress_dialog.value()+1 and not self.hatching_cancelled:
-                self.worker.progress.emit(int(current_state))
-        return line_collection_poly
-            
-    def hatch_spiral(self, hatch_distance, step_size, image_matrix, center, color, hatch_mode, cyl_rad, progress_state):
-        line_collection_poly=[]
-        # Maximum Radius of one circle defined by the cluster diagonal
-        max_rad = np.ceil(
-            np.sqrt((image_matrix.shape[0]/2)**2+(image_matrix.shape[1]/2)**2))+np.ceil(hatch_distance)
-
-        # center = self.center_for_hatch
-        # center = [(image_matrix.shape[1]-1)/2,
-        #           (image_matrix.shape[0]-1)/2]
-
-        x = center[0]
-        y = center[1]
-        hatch_rad_avg=hatch_distance/2
-        point_outside=False
-
-        #loop over spiral. will stop when the spiral is outside the image
-        while hatch_rad_avg+hatch_distance/2 <= max_rad:
-            #check if hatching was cancelled
-            if self.hatching_cancelled:
-                return None
-            
-            angle_res = step_size/hatch_rad_avg
-            if angle_res > 2*np.pi/36:
-                angle_res = 2*np.pi/36
-            polyline = []
-            angles = np.linspace(0, 2*np.pi, int(np.ceil(2*np.pi/angle_res)))
-            hatch_radii = np.linspace(hatch_rad_avg-hatch_distance/2, hatch_rad_avg+hatch_distance/2, int(np.ceil(2*np.pi/angle_res))) 
-            current_pixel_color=np.array([-1,-1,-1]) #use non existend color when the point is outside the image
-
-            #loop over single circle of the spiral. points are known so use a foor loop. The inside is called A LOT. Use as few function calls as possible
-            for angle, hatch_rad in zip(angles, hatch_radii):
-                x = center[0]+hatch_rad*np.cos(angle)
-                if hatch_mode == "CylEquidistX":
-                    if np.abs(x-center[0])>cyl_rad:
-                        point_outside=True
-                    else:
-                        x=np.asin((x-center[0])/cyl_rad)*(cyl_rad)+center[0]
-                y = center[1]+hatch_rad*np.sin(angle)
-
-                #use a special rounding for x and y for efficiency. we know that they can never be negative (else it will be caught anyway)
-                if int(y)==int(y-0.5):
-                    y_round=int(y+1)
-                else:
-                    y_round=int(y)
-                if int(x)==int(x-0.5):
-                    x_round=int(x+1)
-                else:
-                    x_round=int(x)
-
-                #check if current pixel is outside the image
-                if point_outside or y_round>=image_matrix.shape[0] or y_round<0 or x_round>= image_matrix.shape[1] or x_round<0:
-                    if polyline:
-                        if len(polyline) > 1:
-                            line_collection_poly.append(polyline)
-                        polyline = []
-                    point_outside=False
-                    current_pixel_color=np.array([-1,-1,-1])
-                else:
-                    current_pixel_color=image_matrix[y_round, x_round]
-
-                #check if current pixel is the color we want to hatch        
-                if current_pixel_color[0]==color[0] and current_pixel_color[1]==color[1] and current_pixel_color[2]==color[2]: #MUCH faster than np.array_equal
-                    x1 = (x-center[0])/self.pixel_per_mm
-                    y1 = (y-center[1])/self.pixel_per_mm
-                    z1 = 0
-                    if polyline:
-                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                    else:
-                        polyline.append(Point(x1, y1, z1, 0, color[0], color[1], color[2]))
-
-                else:
-                    if polyline:
-                        if len(polyline) > 1:
-                            line_collection_poly.append(polyline)
-                        polyline = []
-                angle += angle_res
-            if polyline:  # if we have a last line add it
-                if len(polyline) > 1:
-                        line_collection_poly.append(polyline)
-                polyline = []
-            hatch_rad_avg += hatch_distance
-            #update progress bar
-            current_state = np.ceil((progress_state[0]+hatch_rad_avg/max_rad)/progress_state[1]*progress_state[2])
-            if current_state > self.progress_dialog.value()+1 and not self.hatching_cancelled:
-                self.worker.progress.emit(int(current_state))
-        return line_collection_poly
-            
-    def hatch_radial(self, hatch_distance, step_size, image_matrix, center, color, hatch_mode, cyl_rad,progress_state):
-        line_collection_poly=[]
-        hatch_line_dir=1
-        # We have to pad the array, since start points of hatchlines might lay outside the image
-        # Maximum Radius of one circle defined by the cluster diagonal
-        max_rad = np.ceil(
-            np.sqrt((image_matrix.shape[0]/2)**2+(image_matrix.shape[1]/2)**2))+np.ceil(hatch_distance)
-        
-        # center = self.center_for_hatch
-        # center = [(image_matrix.shape[1]-1)/2,
-        #           (image_matrix.shape[0]-1)/2]
-
-        hatch_start_x = center[0]
-        hatch_start_y = center[1]
-        angle_res=np.atan(hatch_distance/max_rad)*2
-        angles = np.linspace(0, 2*np.pi, int(np.ceil(2*np.pi/angle_res)))
-        
-        ray_count=0
-        
-        #loop over radial rays. ray number is known so use a for loop
-        for angle in angles:
-            #check if hatching was cancelled
-            if self.hatching_cancelled:
-                return None
-            
-            sin_angle=np.sin(angle)
-            cos_angle=np.cos(angle)
-            x_target = hatch_start_x
-            prev_x=None
-            prev_y=None
-            if hatch_mode == "CylEquidistX":
-                if np.abs(x_target-center[0])>cyl_rad:
-                    point_outside=True
-                    x=0 # just a dummy
-                else:
-                    x=np.asin((x_target-center[0])/cyl_rad)*(cyl_rad)+center[0]
-            else:
-                x=x_target
-            y = hatch_start_y
-
-            polyline = []
-            polyline_cache=[]
-            point_outside=False
-            current_pixel_color=np.array([-1,-1,-1]) #use non existend color when the point is outside the image
-
-            #loop over single ray. stop when the ray is outside the image. This is looped over A LOT. Limit ALL function calls as much as possible
-            while np.sqrt((x_target-center[0])**2+(y-center[1])**2) <= max_rad:
-                #use a special rounding for x and y for efficiency. we know that they can never be negative (else it will be caught anyway)
-                if int(y)==int(y-0.5):
-                    y_round=int(y+1)
-                else:
-                    y_round=int(y)
-                if int(x)==int(x-0.5):
-                    x_round=int(x+1)
-                else:
-                    x_round=int(x)
-
-                #check if current pixel is outside the image
-                if point_outside or y_round>=image_matrix.shape[0] or y_round<0 or x_round>= image_matrix.shape[1] or x_round<0:
-                    if polyline:
-                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
-                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
-                        z1=0
-                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                        polyline_cache.append(polyline)
-                        polyline=[]
-                    point_outside=False
-                    current_pixel_color=np.array([-1,-1,-1])
-                else:
-                    current_pixel_color=image_matrix[y_round, x_round]
-                
-                #check if current pixel is the color we want to hatch
-                if current_pixel_color[0]==color[0] and current_pixel_color[1]==color[1] and current_pixel_color[2]==color[2]: #MUCH faster than np.array_equal
-                    x1=(x-center[0])/self.pixel_per_mm
-                    y1=(y-center[1])/self.pixel_per_mm
-                    z1=0
-                    if polyline:
-                        pass
-                        # polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                    else:
-                        polyline.append(Point(x1, y1, z1, 0, color[0], color[1], color[2]))
-                else:
-                    if polyline:
-                        x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
-                        y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
-                        z1=0
-                        polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                        polyline_cache.append(polyline)
-                        polyline=[]
-                x_target += cos_angle * step_size
-                if hatch_mode == "CylEquidistX":
-                    if np.abs(x_target-center[0])>cyl_rad:
-                        point_outside=True
-                    else:
-                        prev_x=x
-                        x=np.asin((x_target-center[0])/cyl_rad)*(cyl_rad)+center[0]
-                else:
-                    prev_x=x
-                    x=x_target
-                prev_y=y
-                y += sin_angle * step_size
-            
-            #finally append line if there is an open one
-            if polyline:
-                    x1=((x+prev_x)/2-center[0])/self.pixel_per_mm
-                    y1=((y+prev_y)/2-center[1])/self.pixel_per_mm
-                    z1=0
-                    polyline.append(Point(x1, y1, z1, 1, color[0], color[1], color[2]))
-                    polyline_cache.append(polyline)
-                    polyline=[]
-
-            #append polyines here in correct order for meandering
-            if hatch_line_dir==1:
-                for poly_line in polyline_cache:
-                    line_collection_poly.append(poly_line)
-            else:
-                for poly_line in reversed(polyline_cache):
-                    poly_line[0].move_type=1
-                    poly_line[-1].move_type=0
-                    line_collection_poly.append(list(reversed(poly_line)))
-
-            ray_count+=1
-            hatch_line_dir*=-1
-
-            #update progress bar
-            current_state = np.ceil((progress_state[0]+ray_count/len(angles))/progress_state[1]*progress_state[2])
-            if current_state > self.progress_dialog.value()+1 and not self.hatching_cancelled:
-                self.worker.progress.emit(int(current_state))
-            #print("finished radial ray " + str(ray_count) + " / " + str(len(angles)))
-        return line_collection_poly
-            
-            
-    def make_hatch_cylindrical(self, hatched_clusters,cyl_rad_mm=100):
-        hatched_clusters_cylindrical = []
-        radius = cyl_rad_mm
-        for line_collection in hatched_clusters:
-            #check if hatching was cancelled
-            if self.hatching_cancelled:
-                return None
-            
-            line_collection_cylindrical = []
-            for polyline in line_collection:
-                polyline_cyl = []
-                if len(polyline) > 2:  # we have an actual polyline
-
-                    for point in polyline:
-                        x = point.x
-                        y = point.y
-                        z = point.z
-                        m=point.move_type
-                        r=point.r
-                        g=point.g
-                        b=point.b
-                        angle = x/radius
-                        x_cyl = radius*np.sin(angle)
-                        z_cyl = radius*np.cos(angle)-radius
-                        y_cyl = y
-
-                        polyline_cyl.append(Point(x_cyl, y_cyl, z_cyl, m, r, g, b))
-                elif len(polyline)==2:  # we have a single line of one color
-                    point1, point2 = polyline
-                    len_x = np.abs(point1.x-point2.x)*10 #100µm steps in x direction
-                    if len_x<2:
-                        len_x=2
-                    nodes_x = np.linspace(point1.x, point2.x, int(np.ceil(len_x)))
-                    nodes_y = np.linspace(point1.y, point2.y, int(np.ceil(len_x)))
-
-                    for i in range(len(nodes_x)):
-                        angle = nodes_x[i]/radius
-                        x_cyl = radius*np.sin(angle)
-                        z_cyl = radius*np.cos(angle)-radius
-                        y_cyl = nodes_y[i]
-                        if i == 0:
-                            polyline_cyl.append(Point(x_cyl, y_cyl, z_cyl, point1.move_type, point1.r, point1.g, point1.b))
-                        else:
-                            polyline_cyl.append(Point(x_cyl, y_cyl, z_cyl, point2.move_type, point2.r, point2.g, point2.b))
-                        
-                else:
-                    print("Single Hatch-Point encountered. This should not happen. Skipping it.")
-                line_collection_cylindrical.append(polyline_cyl)
-            hatched_clusters_cylindrical.append(line_collection_cylindrical)
-        return hatched_clusters_cylindrical
-    
     def create_contours(self):
         source = self.contour_source_combobox.currentText()
         if source == "Image":
@@ -1135,37 +414,39 @@ class HatchingWorker(QThread):
     progress = pyqtSignal(int)
     finished = pyqtSignal(object)
     
-    def __init__(self, hatcher, mode, db_color_palette=None, hatch_pattern=None, 
-                 hatch_angle=None, cyl_rad_mm=None, hatch_mode=None, 
-                 stepsize_mm=None, white_threshold=None):
+    def __init__(self, image_matrix, pixel_per_mm, center, settings, cancel_token, cache=None, disk_cache=None, tiled=False):
         super().__init__()
-        self.hatcher = hatcher
-        self.mode = mode
-        self.db_color_palette = db_color_palette
-        self.hatch_pattern = hatch_pattern
-        self.hatch_angle = hatch_angle
-        self.cyl_rad_mm = cyl_rad_mm
-        self.hatch_mode = hatch_mode
-        self.stepsize_mm = stepsize_mm
-        self.white_threshold = white_threshold
-        self.cancelled = False
+        self.image_matrix = image_matrix
+        self.pixel_per_mm = pixel_per_mm
+        self.center = center
+        self.settings = settings
+        self.cancel_token = cancel_token
+        self.cache = cache
+        self.disk_cache = disk_cache
+        self.tiled = tiled  # band-wise hatching of very large images, see TiledHatching
+        # emitting a signal is thread-safe. the reporter limits the rate, so the event loop of the GUI is not flooded
+        self.progress_reporter = ProgressReporter(self.progress.emit)
         
     def run(self):
         try:
-            result = self.hatcher.create_hatching_worker(
-                self.mode, self.db_color_palette, self.hatch_pattern,
-                self.hatch_angle, self.cyl_rad_mm, self.hatch_mode,
-                self.stepsize_mm, self.white_threshold
-            )
-            if not self.cancelled:
-                self.finished.emit(result)
+            if self.tiled:
+                result = TiledHatching.hatch_image_tiled(
+                    self.image_matrix, self.pixel_per_mm, get_cache_dir() / "tiled_hatching", self.center, self.settings,
+                    progress_callback=self.progress_reporter.report, cancel_token=self.cancel_token
+                )
+            else:
+                result = hatch_image(
+                    self.image_matrix, self.pixel_per_mm, self.center, self.settings,
+                    progress_callback=self.progress_reporter.report, cancel_token=self.cancel_token, cache=self.cache,
+                    disk_cache=self.disk_cache
+                )
         except Exception as e:
-            print(f"Error in worker thread: {e}")
+            print(f"Error hatching clusters: {e}")
+            result = None
+        if not self.cancel_token.is_cancelled():
+            self.finished.emit(result)
             
     def cancel(self):
-        self.cancelled = True
+        self.cancel_token.cancel()
         self.quit()  # Use quit() instead of terminate()
         self.wait()  # Wait for the thread to finish
-
-
-
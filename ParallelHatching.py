@@ -0,0 +1,226 @@
+import os
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import HatchEngine  # HatchEngine imports this module as well, so only the module is imported here
+
+'''
+This module distributes the hatching over a process pool. There are two levels of parallelism:
+- Colors: every color of a cluster (and every pass of a CrossedMeander) is one task (hatch_tasks_parallel).
+  The label map of the cluster is copied once into shared memory. The worker processes attach to it in their initializer, so it is not pickled per task.
+- Clusters: every cluster of a cylindrical hatching is hatched and cylindrically transformed in one task (hatch_clusters_parallel).
+Cancellation is passed to the workers with a multiprocessing Event, which is checked by the HatchEngine of every worker.
+Progress of the workers is sent back through a multiprocessing Queue and combined into one progress value in the calling thread.
+The results are reassembled in task order, which is the sorted color order or the cluster order.
+The module must not import Qt, since it is imported again by every worker process.
+'''
+
+POLL_INTERVAL = 0.1  # seconds between progress/cancel checks while waiting for the workers
+
+# state of a worker process, set up once by _init_worker
+_worker_state = {}
+
+
+def build_tasks(color_list, color_params):
+    """
+    Builds the task list of a cluster.
+
+    Args:
+        color_list (list): The sorted colors of the cluster.
+        color_params (list): (hatch_pattern, hatch_angle, hatch_distance in mm) for each color, or None for skipped colors.
+
+    Returns:
+        list: (label, color, hatch_params, cross_angle) tuples in color order. CrossedMeander gives two tasks per color.
+    """
+    tasks = []
+    for label, color in enumerate(color_list):
+        hatch_params = color_params[label]
+        if hatch_params is None:
+            continue
+        cross_angles = [0, 90] if hatch_params[0] == "CrossedMeander" else [None]
+        for cross_angle in cross_angles:
+            tasks.append((label, tuple(int(c) for c in color), hatch_params, cross_angle))
+    return tasks
+
+
+def count_tasks(color_params):
+    # number of tasks build_tasks would create for these color settings
+    return sum(2 if params[0] == "CrossedMeander" else 1 for params in color_params if params is not None)
+
+
+def _init_worker(shm_name, shape, dtype, pixel_per_mm, cancel_event, progress_queue, random_seed):
+    if shm_name is not None:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_state["shm"] = shm  # keep the handle alive as long as the worker lives
+        _worker_state["label_map"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker_state["engine"] = HatchEngine.HatchEngine(pixel_per_mm, is_cancelled=cancel_event.is_set)
+    _worker_state["engine"].random_seed = random_seed
+    _worker_state["progress_queue"] = progress_queue
+    # do not block the exit of the worker on progress messages nobody reads anymore
+    progress_queue.cancel_join_thread()
+
+
+def _prepare_engine(task_idx):
+    # every task reports its own progress from 0 to 100
+    engine = _worker_state["engine"]
+    progress_queue = _worker_state["progress_queue"]
+    engine.last_progress = 0
+    engine.progress_callback = lambda state: progress_queue.put((task_idx, state))
+    return engine
+
+
+def _hatch_task(task_idx, center, color, label, hatch_params, step_size, hatch_mode, cyl_rad, hatch_engine, cross_angle):
+    engine = _prepare_engine(task_idx)
+    line_collections = engine.hatch_color(
+        _worker_state["label_map"], center, np.array(color, dtype=np.int64), label, hatch_params, step_size, hatch_mode, cyl_rad, [0, 1, 100], hatch_engine, cross_angle
+    )
+    return task_idx, line_collections
+
+
+def _hatch_cluster_task(task_idx, label_map, center, color_list, color_params, step_size, hatch_mode, cyl_rad, cyl_rad_mm, hatch_engine, island_hatching,
+                        centerline_hatching, segment_filter):
+    engine = _prepare_engine(task_idx)
+    hatched_clusters = engine.hatch_cluster(label_map, center, color_list, color_params, step_size, hatch_mode, cyl_rad, hatch_engine, cluster_progress=100,
+                                            island_hatching=island_hatching, centerline_hatching=centerline_hatching, segment_filter=segment_filter)
+    if hatched_clusters is not None and hatch_mode in ["CylEquidistX", "CylEquidistRad"]:
+        hatched_clusters = engine.make_hatch_cylindrical(hatched_clusters, cyl_rad_mm)
+    return task_idx, hatched_clusters
+
+
+def _run_pool(task_function, task_args, pixel_per_mm, progress_callback=None, is_cancelled=None, max_workers=None, label_map=None, random_seed=None):
+    """
+    Runs task_function(task_idx, *args) for every entry of task_args in a process pool.
+    If a label_map is given, it is placed in shared memory and available to the tasks as _worker_state["label_map"].
+    The random_seed is passed to the HatchEngine of every worker (see HatchEngine.hatch_color).
+    Returns the results in task order, or None if the hatching was cancelled.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(task_args)))
+
+    # spawn the workers fresh on all platforms. forking the GUI process with running Qt threads is not safe
+    mp_context = multiprocessing.get_context("spawn")
+    cancel_event = mp_context.Event()
+    progress_queue = mp_context.Queue()
+
+    shm = None
+    shm_args = (None, None, None)
+    if label_map is not None:
+        shm = shared_memory.SharedMemory(create=True, size=max(label_map.nbytes, 1))
+        shared_label_map = np.ndarray(label_map.shape, dtype=label_map.dtype, buffer=shm.buf)
+        shared_label_map[:] = label_map
+        del shared_label_map  # release the buffer export, else the shared memory can not be closed
+        shm_args = (shm.name, label_map.shape, label_map.dtype.str)
+
+    try:
+        task_progress = [0]*len(task_args)
+        results = [None]*len(task_args)
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=mp_context, initializer=_init_worker,
+            initargs=(*shm_args, pixel_per_mm, cancel_event, progress_queue, random_seed)
+        )
+        try:
+            pending = set()
+            for task_idx, args in enumerate(task_args):
+                pending.add(executor.submit(task_function, task_idx, *args))
+
+            while pending:
+                done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task_idx, result = future.result()
+                    if result is None:
+                        return None
+                    results[task_idx] = result
+                    task_progress[task_idx] = 100
+
+                #collect the progress messages of the workers
+                while True:
+                    try:
+                        task_idx, state = progress_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if results[task_idx] is None:
+                        task_progress[task_idx] = state
+
+                if is_cancelled is not None and is_cancelled():
+                    return None
+                if progress_callback is not None:
+                    progress_callback(sum(task_progress)/(100*len(task_args)))
+        finally:
+            # the workers stop by themselves once the cancel event is set, pending tasks are dropped
+            cancel_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            progress_queue.close()
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+    return results
+
+
+def hatch_tasks_parallel(label_map, center, tasks, step_size, hatch_mode, cyl_rad, pixel_per_mm, hatch_engine="Standard", progress_callback=None, is_cancelled=None, max_workers=None,
+                         random_seed=None):
+    """
+    Hatches the tasks of one cluster in a process pool.
+
+    Args:
+        label_map (numpy.ndarray): The label map of the cluster.
+        center (list): The hatch center in pixels.
+        tasks (list): The tasks from build_tasks.
+        step_size (float): The step size in pixels.
+        hatch_mode (str): "Flat", "CylEquidistX" or "CylEquidistRad".
+        cyl_rad (float): The cylinder radius in pixels.
+        pixel_per_mm (float): The image resolution.
+        hatch_engine (str): "Standard", "Vectorized", "RotateScan", "PixelExact", "Polygon" or "Numba" hatch engine.
+        progress_callback (callable): Receives the finished fraction (0 to 1) of all tasks.
+        is_cancelled (callable): Returns True if the hatching should stop.
+        max_workers (int): Number of worker processes. Defaults to the number of CPU cores.
+        random_seed (int): Seed for the random patterns, see HatchSettings. None keeps the random state of the workers.
+
+    Returns:
+        list: The Line Collections of all tasks in task order, or None if the hatching was cancelled.
+    """
+    if not tasks:
+        return []
+    task_args = [(center, color, label, hatch_params, step_size, hatch_mode, cyl_rad, hatch_engine, cross_angle)
+                 for label, color, hatch_params, cross_angle in tasks]
+    results = _run_pool(_hatch_task, task_args, pixel_per_mm, progress_callback, is_cancelled, max_workers, label_map=label_map, random_seed=random_seed)
+    if results is None:
+        return None
+
+    # every task returns a list of Line Collections (one per pass)
+    return [line_collection for line_collections in results for line_collection in line_collections]
+
+
+def hatch_clusters_parallel(cluster_jobs, step_size, hatch_mode, cyl_rad_mm, pixel_per_mm, hatch_engine="Standard", progress_callback=None, is_cancelled=None, max_workers=None,
+                            random_seed=None, island_hatching=False, centerline_hatching=False, segment_filter=None):
+    """
+    Hatches whole clusters in a process pool. Every cluster is hatched and, for cylindrical hatch modes, cylindrically transformed in its own worker.
+
+    Args:
+        cluster_jobs (list): (label_map, center, color_list, color_params) of every cluster.
+        step_size (float): The step size in pixels.
+        hatch_mode (str): "Flat", "CylEquidistX" or "CylEquidistRad".
+        cyl_rad_mm (float): The cylinder radius in mm.
+        pixel_per_mm (float): The image resolution.
+        hatch_engine (str): "Standard", "Vectorized", "RotateScan", "PixelExact", "Polygon" or "Numba" hatch engine.
+        progress_callback (callable): Receives the finished fraction (0 to 1) of all clusters.
+        is_cancelled (callable): Returns True if the hatching should stop.
+        max_workers (int): Number of worker processes. Defaults to the number of CPU cores.
+        random_seed (int): Seed for the random patterns, see HatchSettings. None keeps the random state of the workers.
+        island_hatching (bool): Order the polylines of every color island by island before the cylindrical transformation, see HatchEngine.order_islands.
+        centerline_hatching (bool): Trace thin strokes as centerlines before the cylindrical transformation, see HatchEngine.split_centerlines.
+        segment_filter (tuple): Segment filter that is applied before the cylindrical transformation, see HatchEngine.get_segment_filter.
+
+    Returns:
+        list: The hatched data (list of Line Collections) of every cluster in cluster order, or None if the hatching was cancelled.
+    """
+    if not cluster_jobs:
+        return []
+    # the label map of a cluster is only sent to one worker, so it is simply passed along with its task
+    task_args = [(label_map, center, color_list, color_params, step_size, hatch_mode, cyl_rad_mm * pixel_per_mm, cyl_rad_mm, hatch_engine, island_hatching,
+                  centerline_hatching, segment_filter)
+                 for label_map, center, color_list, color_params in cluster_jobs]
+    return _run_pool(_hatch_cluster_task, task_args, pixel_per_mm, progress_callback, is_cancelled, max_workers, random_seed=random_seed)
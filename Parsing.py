@@ -2,10 +2,27 @@ from PyQt6 import QtWidgets, QtCore
 from PyQt6.QtWidgets import QFileDialog
 import numpy as np
 import datetime
-from HelperClasses import ProcessBlock, HatchData, HatchCluster
+from HelperClasses import ProcessBlock, HatchData, HatchCluster, LineCollection, count_points, iter_point_values
 import PostProcessing
 import copy
 
+WRITE_CHUNK_LINES = 10000  # G-code lines that are joined and written at once
+
+
+def write_lines(file, lines):
+    '''Writes the lines like file.write("\\n".join(lines)), but in chunks, so the whole text is never built in memory'''
+    separator = ""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == WRITE_CHUNK_LINES:
+            file.write(separator + "\n".join(chunk))
+            separator = "\n"
+            chunk = []
+    if chunk:
+        file.write(separator + "\n".join(chunk))
+
+
 class Parser:
     def __init__(self, data_handler, gui):
         self.data_handler = data_handler
@@ -35,6 +52,7 @@ class Parser:
         self.process_listWidget = gui.process_listWidget
         self.air_assist_combobox = gui.air_assist_combobox
         self.power_mode_combobox = gui.power_mode_combobox
+        self.streamed_process_block_checkbox = gui.streamed_process_block_checkbox
 
         # Set default values for spinboxes and comboboxes
         self.post_processing_combobox.addItems(["None", "Maximize Lines", "Constant Drive", "Over Drive"])
@@ -93,49 +111,68 @@ class Parser:
         return gcode_commands
 
     def generate_gcode(self,process_block:ProcessBlock=None, cluster_index=None):
-        gcode_commands = []
+        return list(self.iter_gcode(process_block, cluster_index))
+
+    def iter_block_data(self, process_block:ProcessBlock, cluster_index):
+        '''
+        Returns the Line Collections of a cluster of the process block, ready for the G-code.
+        The raw hatch data of a streamed block gets speed, power and post processing one Line Collection at a time.
+        '''
+        hatch_cluster_data = process_block.hatch_data.hatch_clusters[cluster_index].data
+        if process_block.speed_and_pwr is None:
+            return hatch_cluster_data
+        data = self.iter_speed_and_pwr(hatch_cluster_data, process_block.speed_and_pwr)
+        return self.post_processor.iter_process_data(data, process_block.post_processing, process_block.offset)
+
+    def iter_gcode(self,process_block:ProcessBlock=None, cluster_index=None):
+        '''
+        Yields the G-code lines of a cluster of the process block. The lines are created while the data is walked,
+        so they can be written to the file right away.
+        '''
         if process_block is None:
             print("Error: No ProcessBlock provided for G-code generation")
-            return gcode_commands
-        
-        hatch_cluster_data = process_block.hatch_data.hatch_clusters[cluster_index].data #self.post_processor.process_data(process_block)
-        
-        gcode_commands.append("")
-        gcode_commands.append("===;start of new Processblock===")
+            return
+
+        streamed = process_block.speed_and_pwr is not None
+        hatch_cluster_data = self.iter_block_data(process_block, cluster_index)
+
+        yield ""
+        yield "===;start of new Processblock==="
 
         #process block header
-        gcode_commands.append(f"; Post Processing: {process_block.post_processing} | Laser Mode: {process_block.laser_mode} | Air Assist: {process_block.air_assist} | Power Mode: {process_block.power_mode} | Enclosure Fan: {process_block.enclosure_fan}%")
-        gcode_commands.append(f"; Offset: X={process_block.offset[0]} Y={process_block.offset[1]} Z={process_block.offset[2]}")
-        gcode_commands.append(f"; Number of color clusters: {len(hatch_cluster_data)}")
-        gcode_commands.append(f"; Number of points: {sum(len(polyline) for cluster in hatch_cluster_data for polyline in cluster)}")
-        gcode_commands.append("")
+        yield f"; Post Processing: {process_block.post_processing} | Laser Mode: {process_block.laser_mode} | Air Assist: {process_block.air_assist} | Power Mode: {process_block.power_mode} | Enclosure Fan: {process_block.enclosure_fan}%"
+        yield f"; Offset: X={process_block.offset[0]} Y={process_block.offset[1]} Z={process_block.offset[2]}"
+        if not streamed:
+            yield f"; Number of color clusters: {len(hatch_cluster_data)}"
+            yield f"; Number of points: {sum(count_points(line_collection) for line_collection in hatch_cluster_data)}"
+        yield ""
 
         #set laser mode
         if process_block.laser_mode == "variable":
-            gcode_commands.append("M4 P0 ; set Laser to variable Mode")
+            yield "M4 P0 ; set Laser to variable Mode"
         elif process_block.laser_mode == "constant":
-            gcode_commands.append("M3 P0 ; set laser to constant Mode")
+            yield "M3 P0 ; set laser to constant Mode"
         else:
             print("Error: Laser Mode not recognized")
         
         #set power mode
         if process_block.power_mode == "half":
-            gcode_commands.append("M2000 L23 P0 ; Artisan 40W laser. 0 enters half power Mode (20W max)")
+            yield "M2000 L23 P0 ; Artisan 40W laser. 0 enters half power Mode (20W max)"
         elif process_block.power_mode == "full":
-            gcode_commands.append("M2000 L23 P1 ; Artisan 40W laser. 1 exits half power Mode (40W max)")
+            yield "M2000 L23 P1 ; Artisan 40W laser. 1 exits half power Mode (40W max)"
         else:
             print("Error: Power Mode not recognized")
 
         #set enclosure fan and air assist
-        gcode_commands.append(f"M2000 W2 P{process_block.enclosure_fan} ; Artisan Enclosure fan to {process_block.enclosure_fan}%")
+        yield f"M2000 W2 P{process_block.enclosure_fan} ; Artisan Enclosure fan to {process_block.enclosure_fan}%"
         if process_block.air_assist == "on":
-            gcode_commands.append("M8 ; Turn on Air assis")
+            yield "M8 ; Turn on Air assis"
         else:
-            gcode_commands.append("M9 ; Turn off Air assis")
+            yield "M9 ; Turn off Air assis"
 
-        gcode_commands.append("")
-        gcode_commands.append(";start of Pattern")
-        gcode_commands.append("")
+        yield ""
+        yield ";start of Pattern"
+        yield ""
 
         x_prev=None
         y_prev=None
@@ -144,83 +181,86 @@ class Parser:
         feedG1_prev=0
         feedG0_prev=0
         prev_gcode_command=""
+        color_cluster_count=0
+        point_count=0
 
         for counter, line_collection in enumerate(hatch_cluster_data):
-            for polyline in line_collection:
-                for point in polyline:
+            color_cluster_count+=1
+            point_count+=count_points(line_collection)
+            for move_type, x, y, z, speed, pwr_P in iter_point_values(line_collection):
 
-                    move_type = point.move_type
-                    x = point.x
-                    y = point.y
-                    z = point.z
-                    feed = point.speed*60 #feed is in mm/min while speed is in mm/s
-                    pwr_P = point.pwr
-                    pwr_S = pwr_P/100*255 #pwr_S is in 8bit format (0-255)
+                feed = speed*60 #feed is in mm/min while speed is in mm/s
+                if move_type == 2:
+                    pwr_P = 0 #bridged gap (see HatchKernels.bridge_gaps): a G1 move with the laser off instead of a G0
+                pwr_S = pwr_P/100*255 #pwr_S is in 8bit format (0-255)
 
-                    
+                
 
-                    if move_type == 0:
-                        # Rapid move (G0)
-                        # if not prev_gcode_command=="G0":
-                        #     gcode_commands.append("M05")
-                        gcode_command="G0"
-                        if x != x_prev: gcode_command += f" X{x:.3f}"
-                        if y != y_prev: gcode_command += f" Y{y:.3f}"
-                        if z != z_prev: gcode_command += f" Z{z:.3f}"
-                        if feed != feedG0_prev or prev_gcode_command=="G1": gcode_command += f" F{feed}"
-                        #gcode_command += f" F{feed}"
-                        
-                        
-                        gcode_commands.append(gcode_command)
-
-                        #update previous values
-                        pwr_prev=0
-                        feedG0_prev=feed
-                        prev_gcode_command="G0"
-                    else:
-                        # Linear move with processing (G1)
-                        # if not prev_gcode_command=="G1":
-                        #     gcode_commands.append(f"M03 P{pwr_P} S{pwr_S}")
-
-                        gcode_command="G1"
-                        if x != x_prev: gcode_command += f" X{x:.3f}"
-                        if y != y_prev: gcode_command += f" Y{y:.3f}"
-                        if z != z_prev: gcode_command += f" Z{z:.3f}"
-                        if pwr_S != pwr_prev or prev_gcode_command=="G0": gcode_command += f" P{pwr_P} S{pwr_S}" #P input is a NECESSITY for Artisan's Marlin!
-                        if feed != feedG1_prev or prev_gcode_command=="G0": gcode_command += f" F{feed}"
-                        #gcode_command += f" F{feed}"
-
-                        gcode_commands.append(gcode_command)
-
-                        #update previous values
-                        feedG1_prev=feed
-                        pwr_prev=pwr_S
-                        prev_gcode_command="G1"
-                    # Update previous values that are identical for both move types
-                    x_prev=x
-                    y_prev=y
-                    z_prev=z
+                if move_type == 0:
+                    # Rapid move (G0)
+                    # if not prev_gcode_command=="G0":
+                    #     gcode_commands.append("M05")
+                    gcode_command="G0"
+                    if x != x_prev: gcode_command += f" X{x:.3f}"
+                    if y != y_prev: gcode_command += f" Y{y:.3f}"
+                    if z != z_prev: gcode_command += f" Z{z:.3f}"
+                    if feed != feedG0_prev or prev_gcode_command=="G1": gcode_command += f" F{feed}"
+                    #gcode_command += f" F{feed}"
+                    
                     
+                    yield gcode_command
 
-            gcode_commands.append("")  # Add empty line between clusters    
-        gcode_commands.append("; End of Pattern")
-        gcode_commands.append("")
-        return(gcode_commands)
+                    #update previous values
+                    pwr_prev=0
+                    feedG0_prev=feed
+                    prev_gcode_command="G0"
+                else:
+                    # Linear move with processing (G1)
+                    # if not prev_gcode_command=="G1":
+                    #     gcode_commands.append(f"M03 P{pwr_P} S{pwr_S}")
+
+                    gcode_command="G1"
+                    if x != x_prev: gcode_command += f" X{x:.3f}"
+                    if y != y_prev: gcode_command += f" Y{y:.3f}"
+                    if z != z_prev: gcode_command += f" Z{z:.3f}"
+                    if pwr_S != pwr_prev or prev_gcode_command=="G0": gcode_command += f" P{pwr_P} S{pwr_S}" #P input is a NECESSITY for Artisan's Marlin!
+                    if feed != feedG1_prev or prev_gcode_command=="G0": gcode_command += f" F{feed}"
+                    #gcode_command += f" F{feed}"
+
+                    yield gcode_command
+
+                    #update previous values
+                    feedG1_prev=feed
+                    pwr_prev=pwr_S
+                    prev_gcode_command="G1"
+                # Update previous values that are identical for both move types
+                x_prev=x
+                y_prev=y
+                z_prev=z
+                
+
+            yield ""  # Add empty line between clusters    
+        if streamed:
+            # the processed data of a streamed block is only known after the pattern
+            yield f"; Number of color clusters: {color_cluster_count}"
+            yield f"; Number of points: {point_count}"
+        yield "; End of Pattern"
+        yield ""
+
+    def iter_gcode_for_jcode(self, process_block, cluster_index):
+        yield from self.generate_gcode_header()
+        yield from self.iter_gcode(process_block, cluster_index)
+        yield from self.generate_gcode_footer()
 
     def format_gcode_for_jcode(self, process_block, cluster_index):
-        header = self.generate_gcode_header()
-        footer = self.generate_gcode_footer()
-        full_gcode = header 
-        full_gcode += self.generate_gcode(process_block, cluster_index)
-        full_gcode += footer
-        return "\n".join(full_gcode)
+        return "\n".join(self.iter_gcode_for_jcode(process_block, cluster_index))
 
     def export_gcode_for_jcode(self, path, process_block:ProcessBlock, cluster_index):
         # Open a save file dialog
         savepath = path
         if savepath:
             with open(savepath, 'w') as file:
-                file.write(self.format_gcode_for_jcode(process_block, cluster_index))
+                write_lines(file, self.iter_gcode_for_jcode(process_block, cluster_index))
     
     def save_jcode(self, block_list = None):
         # we will export jcode main file here
@@ -302,10 +342,14 @@ class Parser:
         if not savepath:
             return
 
+        with open(savepath, 'w') as file:
+            write_lines(file, self.iter_gcode_file(block_list))
+
+    def iter_gcode_file(self, block_list):
         #setup gcode
         header = self.generate_gcode_header()
         footer = self.generate_gcode_footer()
-        full_gcode = header 
+        yield from header
         #now loop over all process blocks and clusters and pack everything into a single gcode file
         for block_idx, process_block in enumerate(block_list):
         
@@ -316,14 +360,10 @@ class Parser:
                 for cluster_index, hatch_cluster in enumerate(hatch_clusters):
 
                     
-                    full_gcode += self.generate_gcode(process_block, cluster_index)
-                    full_gcode += footer
+                    yield from self.iter_gcode(process_block, cluster_index)
+                    yield from footer
         
-        full_gcode += footer
-        formated_gcode = "\n".join(full_gcode)
-
-        with open(savepath, 'w') as file:
-            file.write(formated_gcode)
+        yield from footer
 
     
     def automatic_jcode(self, db_color_palette, white_threshold=255, offset = [0,0,0]):
@@ -335,22 +375,36 @@ class Parser:
 
         self.get_handler_data()
 
-        hatch_data = self.set_speed_and_pwr(
-            hatch_data_in=self.hatch_data,
-            white_threshold=white_threshold, 
-            mode="automatic", 
-            db_color_palette=db_color_palette)
-        
-        process_block = self.post_processor.process_block(ProcessBlock(
-            hatch_data,
-            iterations=1,
-            post_processing=post_processing,
-            laser_mode=laser_mode,
-            air_assist=air_assist,
-            enclosure_fan=enclosure_fan,
-            power_mode=power_mode,
-            offset=offset)
-        )
+        if self.streamed_process_block_checkbox.isChecked():
+            # the block is streamed: speed, power and post processing are applied while the G-code is written
+            process_block = ProcessBlock(
+                self.hatch_data,
+                iterations=1,
+                post_processing=post_processing,
+                laser_mode=laser_mode,
+                air_assist=air_assist,
+                enclosure_fan=enclosure_fan,
+                power_mode=power_mode,
+                offset=offset,
+                speed_and_pwr=self.collect_speed_and_pwr_settings(white_threshold, mode="automatic", db_color_palette=db_color_palette)
+            )
+        else:
+            hatch_data = self.set_speed_and_pwr(
+                hatch_data_in=self.hatch_data,
+                white_threshold=white_threshold, 
+                mode="automatic", 
+                db_color_palette=db_color_palette)
+            
+            process_block = self.post_processor.process_block(ProcessBlock(
+                hatch_data,
+                iterations=1,
+                post_processing=post_processing,
+                laser_mode=laser_mode,
+                air_assist=air_assist,
+                enclosure_fan=enclosure_fan,
+                power_mode=power_mode,
+                offset=offset)
+            )
 
         self.save_jcode(block_list=[process_block])
 
@@ -368,6 +422,16 @@ class Parser:
 
         self.get_handler_data()
 
+        if self.streamed_process_block_checkbox.isChecked():
+            # keep the raw hatch data. speed, power and post processing are applied while the G-code is written
+            speed_and_pwr = self.collect_speed_and_pwr_settings(self.white_threshold_parsing_spinbox.value(), mode="manual")
+            process_block = ProcessBlock(self.hatch_data, iterations, post_processing, laser_mode, air_assist=air_assist, power_mode=power_mode, offset=offset,
+                                         speed_and_pwr=speed_and_pwr)
+            list_item = QtWidgets.QListWidgetItem(f"{iterations}x {self.hatch_data.type} (streamed)")
+            list_item.setData(QtCore.Qt.ItemDataRole.UserRole, process_block)
+            self.process_listWidget.addItem(list_item)
+            return
+
         hatch_data = self.set_speed_and_pwr(self.hatch_data, 
                                             white_threshold=self.white_threshold_parsing_spinbox.value(), 
                                             mode="manual")
@@ -412,9 +476,8 @@ class Parser:
     def generate_txt_code(self,process_block):
         txt_commands=[]
         for cluster in process_block.data:
-            for polyline in cluster:
-                for point in polyline:
-                    txt_commands.append(f"{point.x:.3f} {point.y:.3f} {point.z:.3f} {np.abs(point.move_type-1)}")
+            for move_type, x, y, z, speed, pwr in iter_point_values(cluster):
+                txt_commands.append(f"{x:.3f} {y:.3f} {z:.3f} {np.abs(move_type-1)}")
         return "\n".join(txt_commands)
     
     def export_data(self):
@@ -427,78 +490,108 @@ class Parser:
             self.save_txt()
         print("finished exporting")
 
-    def set_speed_and_pwr(self,hatch_data_in:HatchData, white_threshold, mode ="manual", db_color_palette=None):
-        #work on a deepcopy of the raw data to avoid pointing issues
-        hatch_data = copy.deepcopy(hatch_data_in)
-
-        #data = HatchData(hatch_data, hatch_data.type)
-        for hatch_cluster in hatch_data.hatch_clusters:
-            for counter, line_collection in enumerate(hatch_cluster.data):
+    def collect_speed_and_pwr_settings(self, white_threshold, mode="manual", db_color_palette=None):
+        '''Reads the speed and power settings once, so they can be applied later (e.g. to a streamed process block)'''
+        settings = {'white_threshold': white_threshold, 'db_color_palette': db_color_palette}
+        if mode == "manual":
+            # Get Power limits
+            settings['min_pwr'] = self.min_power_spinbox.value()
+            settings['max_pwr'] = self.max_power_spinbox.value()
+            settings['power_mode'] = self.power_format_combobox.currentText()
+            settings['pwr_struc_num'] = self.gui.structnum_pwr_spinbox.value()
+
+            # Get Speed limits
+            settings['min_speed'] = self.min_speed_spinbox.value()
+            settings['max_speed'] = self.max_speed_spinbox.value()
+            settings['speed_mode'] = self.speed_format_combobox.currentText()
+            settings['speed_struc_num'] = self.gui.structnum_speed_spinbox.value()
+        elif mode == "automatic":
+            settings['power_mode'] = "db_based"
+            settings['speed_mode'] = "db_based"
+        return settings
 
-                # Get first point for color of the entire cluster
+    def set_speed_and_pwr(self,hatch_data_in:HatchData, white_threshold, mode ="manual", db_color_palette=None):
+        settings = self.collect_speed_and_pwr_settings(white_threshold, mode, db_color_palette)
+
+        # the clusters are copied without their data. iter_speed_and_pwr copies the Line Collections, so the raw data stays untouched
+        hatch_clusters = []
+        for hatch_cluster in hatch_data_in.hatch_clusters:
+            hatch_cluster_new = copy.copy(hatch_cluster)
+            hatch_cluster_new.data = list(self.iter_speed_and_pwr(hatch_cluster.data, settings))
+            hatch_clusters.append(hatch_cluster_new)
+        return HatchData(hatch_clusters, hatch_data_in.type)
+
+    def iter_speed_and_pwr(self, data, settings):
+        '''
+        Yields a copy of every Line Collection of a cluster with speed and power set, see collect_speed_and_pwr_settings.
+        Colors above the white threshold give an empty list. Array-backed Line Collections share their arrays with the input.
+        '''
+        power_mode = settings.get('power_mode')
+        speed_mode = settings.get('speed_mode')
+        min_pwr, max_pwr, pwr_struc_num = settings.get('min_pwr'), settings.get('max_pwr'), settings.get('pwr_struc_num')
+        min_speed, max_speed, speed_struc_num = settings.get('min_speed'), settings.get('max_speed'), settings.get('speed_struc_num')
+        db_color_palette = settings['db_color_palette']
+
+        for counter, line_collection in enumerate(data):
+
+            # Get first point for color of the entire cluster
+            if isinstance(line_collection, LineCollection):
+                color = list(line_collection.color)
+            elif not line_collection:
+                # nothing to set for an empty Line Collection
+                yield []
+                continue
+            else:
                 first_point = line_collection[0][0]
                 color = [first_point.r, first_point.g, first_point.b]
 
-                # Check for white threshold. If the color is too bright, remove the data
-                if sum(color)/3>white_threshold:
-                    hatch_cluster.data[counter]=[] 
-                    continue
-                
-                if mode == "manual":
-                    # Get Power limits
-                    min_pwr = self.min_power_spinbox.value()
-                    max_pwr = self.max_power_spinbox.value()
-                    power_mode = self.power_format_combobox.currentText()
-                    pwr_struc_num = self.gui.structnum_pwr_spinbox.value()
-
-                    # Get Speed limits
-                    min_speed = self.min_speed_spinbox.value()
-                    max_speed = self.max_speed_spinbox.value()
-                    speed_mode = self.speed_format_combobox.currentText()
-                    speed_struc_num = self.gui.structnum_speed_spinbox.value()
-                elif mode == "automatic":
-                    power_mode = "db_based"
-                    speed_mode = "db_based"
-
-                #power settings
-                if power_mode=="constant (max. Val.)":
-                    pwr = max_pwr
-                elif power_mode=="color-scaled":
-                    pwr=int(max_pwr-(max_pwr-min_pwr)*sum([first_point.r,first_point.g,first_point.b])/765)
-                elif power_mode=="test_structure":
-                    if pwr_struc_num>1:
-                        pwr=int(min_pwr+(max_pwr-min_pwr)*np.floor(counter/speed_struc_num)/(pwr_struc_num-1))
-                    else:
-                        pwr=max_pwr
-                elif power_mode=="db_based":
-                    bestfit_color = db_color_palette.find_paramset_by_color(color)
-                    pwr = bestfit_color['laser_power']
+            # Check for white threshold. If the color is too bright, remove the data
+            if sum(color)/3>settings['white_threshold']:
+                yield []
+                continue
+
+            #power settings
+            if power_mode=="constant (max. Val.)":
+                pwr = max_pwr
+            elif power_mode=="color-scaled":
+                pwr=int(max_pwr-(max_pwr-min_pwr)*sum(color)/765)
+            elif power_mode=="test_structure":
+                if pwr_struc_num>1:
+                    pwr=int(min_pwr+(max_pwr-min_pwr)*np.floor(counter/speed_struc_num)/(pwr_struc_num-1))
                 else:
-                    print("error: PowerMode not recognized")
-
-                #speed/feedrate settings
-                if speed_mode=="constant (max. Val.)":
-                    speed = max_speed
-                elif speed_mode=="color-scaled":
-                    speed=int(min_speed+(max_speed-min_speed)*sum([first_point.r,first_point.g,first_point.b])/765)
-                elif speed_mode=="test_structure":
-                    if speed_struc_num>1:
-                        speed=int((min_speed+(max_speed-min_speed)*(counter%speed_struc_num/(speed_struc_num-1))))
-                    else:    
-                        speed=max_speed
-                elif speed_mode=="db_based":
-                    bestfit_color = db_color_palette.find_paramset_by_color(color)
-                    speed = bestfit_color['speed']
-                else:
-                    print("error: SpeedMode not recognized")
-
-                #set data in every point
-                for polyline in line_collection:
-                    for point in polyline:
-                        point.speed=speed
-                        point.pwr=pwr
-        
-        return hatch_data
+                    pwr=max_pwr
+            elif power_mode=="db_based":
+                bestfit_color = db_color_palette.find_paramset_by_color(color)
+                pwr = bestfit_color['laser_power']
+            else:
+                print("error: PowerMode not recognized")
+
+            #speed/feedrate settings
+            if speed_mode=="constant (max. Val.)":
+                speed = max_speed
+            elif speed_mode=="color-scaled":
+                speed=int(min_speed+(max_speed-min_speed)*sum(color)/765)
+            elif speed_mode=="test_structure":
+                if speed_struc_num>1:
+                    speed=int((min_speed+(max_speed-min_speed)*(counter%speed_struc_num/(speed_struc_num-1))))
+                else:    
+                    speed=max_speed
+            elif speed_mode=="db_based":
+                bestfit_color = db_color_palette.find_paramset_by_color(color)
+                speed = bestfit_color['speed']
+            else:
+                print("error: SpeedMode not recognized")
+
+            #set data in every point. a LineCollection holds them once for all points
+            if isinstance(line_collection, LineCollection):
+                yield line_collection.with_speed_and_pwr(speed, pwr)
+                continue
+            line_collection = copy.deepcopy(line_collection)
+            for polyline in line_collection:
+                for point in polyline:
+                    point.speed=speed
+                    point.pwr=pwr
+            yield line_collection
 
     def get_handler_data(self):
         self.hatch_data = self.data_handler.hatch_data
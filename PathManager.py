@@ -51,6 +51,18 @@ def get_library_path(library_name):
     return libraries_dir / library_name
 
 
+def get_cache_dir():
+    """
+    Get the directory of the on-disk hatch cache.
+    The bundled files of the executable are extracted to a temporary directory, so the cache is placed next to the executable instead.
+    """
+    if getattr(sys, 'frozen', False):
+        base_dir = Path(sys.executable).resolve().parent
+    else:
+        base_dir = get_base_dir()
+    return base_dir / "cache"
+
+
 # Convenient module-level getters
 BASE_DIR = get_base_dir()
 GUI_DIR = BASE_DIR / "GUI_files"
@@ -1,14 +1,15 @@
 from PyQt6 import QtWidgets, QtGui, QtCore
 from pyqtgraph.opengl import GLViewWidget,GLLinePlotItem
 import numpy as np
-from HelperClasses import HatchData
+from HelperClasses import HatchData, LineCollection
 from OpenGL.GL import glDisable, GL_LIGHTING, glClearColor,glEnable, glBlendFunc, GL_BLEND, GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA
 
 
 class HatchLinePlotter:
-    def __init__(self, data_handler, gui):
+    def __init__(self, data_handler, gui, parser):
         self.data_handler = data_handler
         self.gui = gui
+        self.parser = parser  # Parser for the processed data of the process blocks
         self.pixel_per_mm = None
         self.image_matrix = None
         self.hatch_data = HatchData(None, None)
@@ -54,49 +55,76 @@ class HatchLinePlotter:
     def add_data_to_plot_items(self, hatch_data:HatchData):
         #iterate over the hach cluster. apply the offset from ref_position
         for hatch_cluster in hatch_data.hatch_clusters:
-            offset = np.array(hatch_cluster.ref_position[0:3])  # Extract the offset values (x, y, z)
-            offset[2]+= hatch_cluster.cylinder_radius  # Set z offset to cylinder radius
-            rot_angle = np.radians(hatch_cluster.ref_position[3])  # For Plotting only, revert back the rotation
-            rot_matrix_y = np.array([[np.cos(rot_angle), 0, np.sin(rot_angle)],
-                                        [0, 1, 0],
-                                        [-np.sin(rot_angle), 0, np.cos(rot_angle)]])
+            self.add_cluster_to_plot_items(hatch_cluster, hatch_cluster.data)
+
+    def add_cluster_to_plot_items(self, hatch_cluster, cluster_data):
+        offset = np.array(hatch_cluster.ref_position[0:3])  # Extract the offset values (x, y, z)
+        offset[2]+= hatch_cluster.cylinder_radius  # Set z offset to cylinder radius
+        rot_angle = np.radians(hatch_cluster.ref_position[3])  # For Plotting only, revert back the rotation
+        rot_matrix_y = np.array([[np.cos(rot_angle), 0, np.sin(rot_angle)],
+                                    [0, 1, 0],
+                                    [-np.sin(rot_angle), 0, np.cos(rot_angle)]])
         # Iterate over each hatch line
-            for hatch_lines in hatch_cluster.data:
-
-                # Calculate the total number of points, including NaN break points
-                total_points = sum(len(polyline) + 1 for polyline in hatch_lines) - 1  # Add 1 NaN per polyline, except the last
-
-                # Preallocate numpy arrays for positions and colors
-                pos = np.zeros((total_points, 3), dtype=np.float32)  # Shape (N, 3)
-                colors = np.zeros((total_points, 4), dtype=np.float32)  # Shape (N, 4)
-
-                # Fill the numpy arrays
-                index = 0
-                for polyline in hatch_lines:
-                    for point in polyline:
-                        # Fill position array
-                        if (point.r+point.g+point.b)/3 > self.white_threshold_plotting_spinbox.value():
-                            pos[index] = [np.nan, np.nan, np.nan]
-                        else:
-                            pos[index] =  rot_matrix_y @ (np.array([point.x, point.y, point.z])+offset)-np.array([0,0,hatch_cluster.cylinder_radius])
-
-                        # Fill color array
-                        if self.color_mode_plotting_combobox.currentText() == "Black":
-                            colors[index] = [0, 0, 0, 1.0]
-                        else:
-                            colors[index] = [point.r / 255, point.g / 255, point.b / 255, 1.0]  # RGB values normalized to [0, 1]
-                        
-                        index += 1
-
-                    # Add a NaN break point to disconnect the line
-                    if index < total_points:  # Avoid adding NaN after the last polyline
-                        pos[index] = [np.nan, np.nan, np.nan]
-                        colors[index] = [0, 0, 0, 0]  # Invisible color
-                        index += 1
-
-                # Create a line item for the current hatch line and add it to the view
+        for hatch_lines in cluster_data:
+            if isinstance(hatch_lines, LineCollection):
+                pos, colors = self.get_line_collection_arrays(hatch_lines, offset, rot_matrix_y, hatch_cluster.cylinder_radius)
                 line_item = GLLinePlotItem(pos=pos, color=colors, width=self.plot_linedwidth_spinbox.value(), mode='line_strip')
                 self.plot_line_items.append(line_item)
+                continue
+
+            # Calculate the total number of points, including NaN break points
+            total_points = max(sum(len(polyline) + 1 for polyline in hatch_lines) - 1, 0)  # Add 1 NaN per polyline, except the last. colors above the white threshold are empty
+
+            # Preallocate numpy arrays for positions and colors
+            pos = np.zeros((total_points, 3), dtype=np.float32)  # Shape (N, 3)
+            colors = np.zeros((total_points, 4), dtype=np.float32)  # Shape (N, 4)
+
+            # Fill the numpy arrays
+            index = 0
+            for polyline in hatch_lines:
+                for point in polyline:
+                    # Fill position array
+                    if (point.r+point.g+point.b)/3 > self.white_threshold_plotting_spinbox.value():
+                        pos[index] = [np.nan, np.nan, np.nan]
+                    else:
+                        pos[index] =  rot_matrix_y @ (np.array([point.x, point.y, point.z])+offset)-np.array([0,0,hatch_cluster.cylinder_radius])
+
+                    # Fill color array
+                    if self.color_mode_plotting_combobox.currentText() == "Black":
+                        colors[index] = [0, 0, 0, 1.0]
+                    else:
+                        colors[index] = [point.r / 255, point.g / 255, point.b / 255, 1.0]  # RGB values normalized to [0, 1]
+                    
+                    index += 1
+
+                # Add a NaN break point to disconnect the line
+                if index < total_points:  # Avoid adding NaN after the last polyline
+                    pos[index] = [np.nan, np.nan, np.nan]
+                    colors[index] = [0, 0, 0, 0]  # Invisible color
+                    index += 1
+
+            # Create a line item for the current hatch line and add it to the view
+            line_item = GLLinePlotItem(pos=pos, color=colors, width=self.plot_linedwidth_spinbox.value(), mode='line_strip')
+            self.plot_line_items.append(line_item)
+
+    def get_line_collection_arrays(self, line_collection, offset, rot_matrix_y, cylinder_radius):
+        # same positions and colors as the point loop of add_cluster_to_plot_items, computed on the arrays of a LineCollection
+        num_polylines = len(line_collection)
+        total_points = line_collection.num_points + max(num_polylines-1, 0)  # Add 1 NaN per polyline, except the last
+        # index of every point in the output, shifted by the NaN break points of the polylines before it
+        polyline_idx = np.repeat(np.arange(num_polylines), np.diff(line_collection.offsets))
+        point_idx = np.arange(line_collection.num_points) + polyline_idx
+
+        pos = np.full((total_points, 3), np.nan, dtype=np.float32)
+        colors = np.zeros((total_points, 4), dtype=np.float32)  # NaN break points stay invisible
+        r, g, b = line_collection.color
+        if (r+g+b)/3 <= self.white_threshold_plotting_spinbox.value():
+            pos[point_idx] = (line_collection.coords+offset) @ rot_matrix_y.T - np.array([0, 0, cylinder_radius])
+        if self.color_mode_plotting_combobox.currentText() == "Black":
+            colors[point_idx] = [0, 0, 0, 1.0]
+        else:
+            colors[point_idx] = [r / 255, g / 255, b / 255, 1.0]
+        return pos, colors
 
     def plot_data(self):
         self.view.clear()
@@ -140,7 +168,9 @@ class HatchLinePlotter:
 
         for list_item in selected_items:
                 process_block = list_item.data(QtCore.Qt.ItemDataRole.UserRole)  # Retrieve the stored ProcessBlock object
-                self.add_data_to_plot_items(process_block.hatch_data)
+                # streamed blocks hold the raw hatch data. plot the data with speed, power, post processing and offset as it is written to the G-code
+                for cluster_index, hatch_cluster in enumerate(process_block.hatch_data.hatch_clusters):
+                    self.add_cluster_to_plot_items(hatch_cluster, self.parser.iter_block_data(process_block, cluster_index))
         self.plot_data()
 
     def add_coordinate_axes(self):
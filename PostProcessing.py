@@ -1,5 +1,5 @@
 import numpy as np
-from HelperClasses import ProcessBlock
+from HelperClasses import ProcessBlock, LineCollection
 
 class PostProcessor:
     def __init__(self):
@@ -7,29 +7,45 @@ class PostProcessor:
 
     def process_block(self,process_block:ProcessBlock):
         for hatch_cluster in process_block.hatch_data.hatch_clusters:
-            data = hatch_cluster.data
-            data_offset = self.offset_data(data, process_block.offset)
-
-            if process_block.post_processing == "None":
-                data_processed = data_offset
-            elif process_block.post_processing == "Maximize Lines":
-                data_processed = self.maximize_line_length(data_offset)
-            elif process_block.post_processing == "Constant Drive" or process_block.post_processing == "Over Drive":
-                data_processed = self.set_drive_mode(data_offset, process_block.post_processing)
-            
-            hatch_cluster.data = data_processed
+            hatch_cluster.data = list(self.iter_process_data(hatch_cluster.data, process_block.post_processing, process_block.offset))
 
         return process_block
 
+    def iter_process_data(self, data, post_processing, offset):
+        '''
+        Offsets and post-processes the Line Collections of a cluster one by one. The stages are generators,
+        so a streamed export only holds the Line Collection that is written at the moment.
+        '''
+        data_offset = self.iter_offset_data(data, offset)
+
+        if post_processing == "None":
+            return data_offset
+        elif post_processing == "Maximize Lines":
+            return self.iter_maximize_line_length(data_offset)
+        elif post_processing == "Constant Drive" or post_processing == "Over Drive":
+            return self.iter_drive_mode(data_offset, post_processing)
+        print("Postprocessing Mode not recognized!")
+        return data_offset
+
     def offset_data(self, data, offset):
         '''Offset the data by the given offset in x, y, and z direction.'''
         
         #return data if no offset is given
         if offset == [0, 0, 0]:
             return data
-        
-        data_offset = []
+        return list(self.iter_offset_data(data, offset))
+
+    def iter_offset_data(self, data, offset):
+        #return data if no offset is given
+        if offset == [0, 0, 0]:
+            yield from data
+            return
+
         for line_collection in data:
+            # array-backed Line Collections are shifted as a whole
+            if isinstance(line_collection, LineCollection):
+                yield line_collection.translated(offset)
+                continue
             hatch_lines_new = []
             for polyline in line_collection:
                 polyline_new = []
@@ -37,12 +53,13 @@ class PostProcessor:
                     point_new = point.clone_with(x=point.pos[0] + offset[0], y=point.pos[1] + offset[1], z=point.pos[2] + offset[2])
                     polyline_new.append(point_new)
                 hatch_lines_new.append(polyline_new)
-            data_offset.append(hatch_lines_new)
-        return data_offset
+            yield hatch_lines_new
 
     def maximize_line_length(self, data):
+        return list(self.iter_maximize_line_length(data))
+
+    def iter_maximize_line_length(self, data):
         # self.get_handler_data()
-        data_processed = []
         angle_sum=0
         for hatch_lines in data:
             hatch_lines_new=[]
@@ -60,13 +77,16 @@ class PostProcessor:
                     point_prev = point_now
                 polyline_new.append(polyline[-1])
                 hatch_lines_new.append(polyline_new)
-            data_processed.append(hatch_lines_new)
-
-        return data_processed
+            # only points are removed, so an array-backed Line Collection stays one
+            if isinstance(hatch_lines, LineCollection):
+                hatch_lines_new = LineCollection.from_polylines(hatch_lines_new, hatch_lines.color)
+            yield hatch_lines_new
     
     def set_drive_mode(self, data, mode):
+        return list(self.iter_drive_mode(data, mode))
+
+    def iter_drive_mode(self, data, mode):
         # self.get_handler_data()
-        data_processed = []
         const_drive_len=1
         over_drive_len=0.2 #just default to this. 
         crit_cos_angle=np.cos(np.radians(170))
@@ -74,16 +94,28 @@ class PostProcessor:
         for hatch_lines in data:
             if not hatch_lines:
                 continue
+            #the drive moves get their own speed, so the result is always a list of polylines
             hatch_lines_new=[]
             #speed an power in one hatchline array should always be the same
             speed=hatch_lines[0][0].speed
             const_drive_len=np.maximum(1, speed*0.04) #set constant drive length to 4% of speed/s in mm but at
             #over_drive_len= (-0.075*speed**2+7.05*speed+37.5)/1000 #from a fit to measured data (10mm/s:100um, 20mm/s:150um, 30mm/s:180um, 40mm/2:200um)
             over_drive_len = 0.24484+(0.10634-0.24484)/(1+(speed/27.3937)**5.82549) #logistics fit to measured data of horz lines (31.01.2025) (10mm/s:110um, 20mm/s:120um, 30mm/s:200um, 40mm/2:220um, 50mm/s:250um, 60mm/s:230um, 70mm/s:240um, 100mm/s:260um)
-            for polyline in hatch_lines:
-                #always start with a constant drive motion
-                A_new, A_pre, B_new, B_post = self.elongate_line(polyline[0].pos, polyline[1].pos, const_drive_len)
-                polyline_new = [polyline[0].clone_with(x=A_pre[0], y=A_pre[1], z=A_pre[2],move_type=0, speed = 100), polyline[0]] #these are two G0 commands as first command from Hatcher is ALWAYS G0. we can maximize speed on first G0 command for efficiency
+            for polyline_idx, polyline in enumerate(hatch_lines):
+                #a bridged polyline (move type 2, see HatchKernels.bridge_gaps) continues the previous one without stopping:
+                #no constant drive motion before it and none after the previous polyline
+                is_bridged = polyline[0].move_type == 2
+                if isinstance(hatch_lines, LineCollection):
+                    # read the move type of the next polyline from the arrays instead of building its points
+                    is_bridged_next = polyline_idx+1 < len(hatch_lines) and hatch_lines.move_types[hatch_lines.offsets[polyline_idx+1]] == 2
+                else:
+                    is_bridged_next = polyline_idx+1 < len(hatch_lines) and hatch_lines[polyline_idx+1][0].move_type == 2
+                if is_bridged:
+                    polyline_new = [polyline[0]]
+                else:
+                    #always start with a constant drive motion
+                    A_new, A_pre, B_new, B_post = self.elongate_line(polyline[0].pos, polyline[1].pos, const_drive_len)
+                    polyline_new = [polyline[0].clone_with(x=A_pre[0], y=A_pre[1], z=A_pre[2],move_type=0, speed = 100), polyline[0]] #these are two G0 commands as first command from Hatcher is ALWAYS G0. we can maximize speed on first G0 command for efficiency
                 point_prev = polyline[0]
                 for i in range(1,len(polyline)-1):
                     point_now = polyline[i]
@@ -111,7 +143,9 @@ class PostProcessor:
                         polyline_new.append(point_now.clone_with(move_type=0))
                     point_prev = point_now
                 #finally also finish with a constant drive motion
-                if mode == "Constant Drive":
+                if is_bridged_next:
+                    polyline_new.append(polyline[-1])
+                elif mode == "Constant Drive":
                     A_new, A_pre, B_new, B_post = self.elongate_line(polyline[-2].pos, polyline[-1].pos, const_drive_len)
                     polyline_new.append(polyline[-1])
                     polyline_new.append(polyline[-1].clone_with(x=B_post[0], y=B_post[1], z=B_post[2],move_type=0))
@@ -121,10 +155,7 @@ class PostProcessor:
                     polyline_new.append(polyline[-1].clone_with(x=B_new[0], y=B_new[1], z=B_new[2],move_type=1))
                     polyline_new.append(polyline[-1].clone_with(x=B_post[0], y=B_post[1], z=B_post[2],move_type=0))
                 hatch_lines_new.append(polyline_new)
-            data_processed.append(hatch_lines_new)
-        # self.hatch_data_processed = data_processed
-        # self.set_handler_data()
-        return data_processed
+            yield hatch_lines_new
 
 
     def calculate_3d_angle(self, A, B, C):
@@ -61,6 +61,24 @@ class Settings:
                         self.gui.hatch_precision_spinbox.setValue(value)
                     elif key == 'contour_source':
                         self.gui.contour_source_combobox.setCurrentIndex(value)
+                    elif key == 'hatch_engine':
+                        self.gui.hatch_engine_combobox.setCurrentIndex(value)
+                    elif key == 'parallel_hatching':
+                        self.gui.parallel_hatching_checkbox.setChecked(value)
+                    elif key == 'tiled_hatching':
+                        self.gui.tiled_hatching_checkbox.setChecked(value)
+                    elif key == 'island_hatching':
+                        self.gui.island_hatching_checkbox.setChecked(value)
+                    elif key == 'centerline_hatching':
+                        self.gui.centerline_hatching_checkbox.setChecked(value)
+                    elif key == 'min_segment_length':
+                        self.gui.min_segment_spinbox.setValue(value)
+                    elif key == 'bridge_gap':
+                        self.gui.bridge_gap_spinbox.setValue(value)
+                    elif key == 'bridge_mode':
+                        self.gui.bridge_mode_combobox.setCurrentIndex(value)
+                    elif key == 'streamed_process_block':
+                        self.gui.streamed_process_block_checkbox.setChecked(value)
                     elif key == 'laser_mode':
                         self.gui.laser_mode_combobox.setCurrentIndex(value)
                     elif key == 'white_threshold_parsing':
@@ -151,7 +169,16 @@ class Settings:
             settings['cyl_rad'] = gui.cyl_rad_spinbox.value()
             settings['hatch_precision'] = gui.hatch_precision_spinbox.value()
             settings['contour_source'] = gui.contour_source_combobox.currentIndex()
+            settings['hatch_engine'] = gui.hatch_engine_combobox.currentIndex()
+            settings['parallel_hatching'] = gui.parallel_hatching_checkbox.isChecked()
+            settings['tiled_hatching'] = gui.tiled_hatching_checkbox.isChecked()
+            settings['island_hatching'] = gui.island_hatching_checkbox.isChecked()
+            settings['centerline_hatching'] = gui.centerline_hatching_checkbox.isChecked()
+            settings['min_segment_length'] = gui.min_segment_spinbox.value()
+            settings['bridge_gap'] = gui.bridge_gap_spinbox.value()
+            settings['bridge_mode'] = gui.bridge_mode_combobox.currentIndex()
             settings['laser_mode'] = gui.laser_mode_combobox.currentIndex()
+            settings['streamed_process_block'] = gui.streamed_process_block_checkbox.isChecked()
             settings['white_threshold_parsing'] = gui.white_threshold_parsing_spinbox.value()
             settings['max_power'] = gui.max_power_spinbox.value()
             settings['min_power'] = gui.min_power_spinbox.value()
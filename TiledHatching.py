@@ -0,0 +1,417 @@
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+from HelperClasses import HatchData, HatchCluster, LineCollection
+import HatchKernels
+from HatchEngine import HatchEngine, HatchSettings
+
+'''
+This module contains the tiled hatching for very large images (e.g. banners of 20k x 20k pixels at high resolution).
+The image is only read in horizontal bands of band_rows rows, so it can be a memory-mapped array (np.load(path, mmap_mode="r")).
+The GUI passes the image of the data handler, which is held in memory. There only the label map and the polylines are memory-mapped,
+the memory of the image itself is not bounded by the band size.
+- The colors and the label map are collected band by band. The label map is written to a memory-mapped file in the output directory.
+- The meander patterns are swept band by band. The hatch lines run downwards (y decreases along every line), so every band continues
+  the lines of the band above. The sample coordinates and the open color run of every line are carried over the band border, so the
+  runs crossing a border are stitched exactly: every run has the same end points as with the Vectorized engine.
+- At 0 degrees every hatch line runs along one row. The runs of the rows of a band are detected once and shared by all lines on the
+  same row (see HatchKernels._axis_line_runs).
+- The polylines of every color are streamed to raw files in the output directory as soon as they are finished (LineCollectionWriter).
+  The returned HatchData holds LineCollections that are memory-mapped from these files.
+- Every hatching writes into its own run directory below the output directory, the files of a previous hatching may still be mapped
+  (e.g. by the hatch data of a process block). A run directory is deleted when the last array mapped from it is released (RunDirectory).
+  Run directories that are not in use by this process any more (e.g. of a previous session) are deleted before a new hatching.
+- Only the meander patterns are supported, they are always swept band by band and the hatch engine setting is not used. Circular,
+  Spiral, Radial and Contour need the whole label map (rings and rays cross every band, the contours need a distance transform of the
+  whole image), so a hatching with one of them is refused before the label map is built.
+The polylines of a color are written band by band, so they are ordered differently than in a hatching of the whole image.
+The segment filter (see HatchEngine.filter_segments) is applied to the polylines of every band, gaps between runs that are finished in
+different bands are not bridged. Island hatching and centerline hatching are not supported.
+Only the Flat hatch mode is supported. The module is Qt-free.
+'''
+
+DEFAULT_BAND_ROWS = 1024  # rows of the image that are read at once
+TILED_PATTERNS = ["FixedMeander", "RandomMeander", "CrossedMeander", "OptimizedMeander"]  # patterns that can be swept band by band
+RUN_DIR_PREFIX = "run_"  # prefix of the run directories in the output directory
+
+# {path: RunDirectory} of all run directories with arrays in use
+_live_run_dirs = weakref.WeakValueDictionary()
+
+
+class RunDirectory:
+    def __init__(self, output_dir):
+        """
+        Creates a new directory for the files of one tiled hatching. Every memory-mapped array of the run references the RunDirectory
+        (see attach), so the directory is deleted as soon as the last of them is released.
+
+        Args:
+            output_dir (str): The parent directory of all run directories.
+        """
+        self.path = os.path.abspath(tempfile.mkdtemp(prefix=RUN_DIR_PREFIX, dir=output_dir))
+        _live_run_dirs[self.path] = self
+        # errors are ignored: files that are still mapped (Windows) are deleted by remove_unused_run_dirs later
+        weakref.finalize(self, shutil.rmtree, self.path, True)
+
+    def attach(self, array):
+        # views of a memory-mapped array keep their base alive, so the reference on the base array is enough
+        if isinstance(array, np.memmap):
+            array.run_directory = self
+        return array
+
+
+def remove_unused_run_dirs(output_dir):
+    """
+    Deletes the run directories in output_dir that are not in use by this process.
+    """
+    for name in os.listdir(output_dir):
+        path = os.path.abspath(os.path.join(output_dir, name))
+        if name.startswith(RUN_DIR_PREFIX) and os.path.isdir(path) and path not in _live_run_dirs:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class LineCollectionWriter:
+    def __init__(self, path_prefix, color, run_directory=None):
+        """
+        Streams the polylines of one color into three raw files (coordinates, move types and polyline offsets).
+
+        Args:
+            path_prefix (str): Path of the files without the endings "_coords.bin", "_move_types.bin" and "_offsets.bin". The files must be new,
+                files that are memory-mapped elsewhere must not be truncated.
+            color (tuple): (r, g, b) of the Line Collection.
+            run_directory (RunDirectory): The run directory of the files. It is attached to the memory-mapped arrays of close.
+        """
+        self.path_prefix = path_prefix
+        self.run_directory = run_directory
+        self.color = tuple(int(c) for c in color)
+        self.point_count = 0
+        self.polyline_count = 0
+        self.coords_file = open(path_prefix + "_coords.bin", "xb")
+        self.move_types_file = open(path_prefix + "_move_types.bin", "xb")
+        self.offsets_file = open(path_prefix + "_offsets.bin", "xb")
+        self.offsets_file.write(np.zeros(1, dtype=np.int64).tobytes())
+
+    def append(self, line_collection):
+        # writes the polylines of an array-backed Line Collection behind the previous ones
+        if len(line_collection) == 0:
+            return
+        self.coords_file.write(np.ascontiguousarray(line_collection.coords, dtype=np.float64).tobytes())
+        self.move_types_file.write(np.ascontiguousarray(line_collection.move_types, dtype=np.uint8).tobytes())
+        self.offsets_file.write((np.asarray(line_collection.offsets[1:], dtype=np.int64)+self.point_count).tobytes())
+        self.point_count += line_collection.num_points
+        self.polyline_count += len(line_collection)
+
+    def close(self):
+        """
+        Returns:
+            LineCollection: All written polylines, memory-mapped from the files.
+        """
+        for f in (self.coords_file, self.move_types_file, self.offsets_file):
+            f.close()
+        if self.point_count == 0:
+            # empty files can not be memory-mapped
+            return LineCollection.concatenate([], self.color)
+        arrays = [
+            np.memmap(self.path_prefix + "_coords.bin", dtype=np.float64, mode="r", shape=(self.point_count, 3)),
+            np.memmap(self.path_prefix + "_move_types.bin", dtype=np.uint8, mode="r", shape=(self.point_count,)),
+            np.memmap(self.path_prefix + "_offsets.bin", dtype=np.int64, mode="r", shape=(self.polyline_count+1,))
+        ]
+        if self.run_directory is not None:
+            arrays = [self.run_directory.attach(array) for array in arrays]
+        return LineCollection(*arrays, self.color)
+
+
+def _band_ranges(height, band_rows):
+    # (first row, last row) of all bands from the top of the hatching (highest rows) to the bottom
+    return [(max(last_row-band_rows, 0), last_row) for last_row in range(height, 0, -band_rows)]
+
+
+def get_sorted_unique_colors_tiled(image_matrix, band_rows=DEFAULT_BAND_ROWS):
+    """
+    Returns the colors of the image in the order of HatchEngine.get_sorted_unique_colors, reading the image band by band.
+    """
+    keys = np.zeros(0, dtype=np.uint32)
+    for first_row, last_row in _band_ranges(image_matrix.shape[0], band_rows):
+        keys = np.union1d(keys, HatchKernels.pack_rgb(np.asarray(image_matrix[first_row:last_row]).reshape(-1, 3)))
+    colors = np.stack(((keys >> 16) & 255, (keys >> 8) & 255, keys & 255), axis=1).astype(np.int64)
+    order = np.argsort(-colors.sum(axis=1), kind='stable')
+    return [tuple(color) for color in colors[order].tolist()]
+
+
+def build_label_map_tiled(image_matrix, color_list, path, band_rows=DEFAULT_BAND_ROWS):
+    """
+    Builds the label map of the image band by band into a memory-mapped .npy file, see HatchKernels.build_label_map.
+
+    Returns:
+        numpy.memmap: The label map, opened for reading.
+    """
+    first_band = HatchKernels.build_label_map(np.asarray(image_matrix[:1]), color_list)
+    label_map = np.lib.format.open_memmap(path, mode="w+", dtype=first_band.dtype, shape=image_matrix.shape[:2])
+    for first_row, last_row in _band_ranges(image_matrix.shape[0], band_rows):
+        label_map[first_row:last_row] = HatchKernels.build_label_map(np.asarray(image_matrix[first_row:last_row]), color_list)
+    label_map.flush()
+    del label_map
+    return np.load(path, mmap_mode="r")
+
+
+def _meander_band_sweep(label_map, hatch_distance, theta, step_size, center, colors, writers, pixel_per_mm, band_rows=DEFAULT_BAND_ROWS,
+                        progress_callback=None, is_cancelled=None, segment_filter=None):
+    """
+    Hatches the colors with one meander sweep over the bands of the label map and streams the finished runs of every band to the writers.
+    Every run has the same end points as in HatchKernels.hatch_meander_multicolor.
+
+    Args:
+        theta (float): Slice angle in degrees (0 <= theta < 180), see HatchKernels.meander_angle.
+        colors (dict): {label: RGB color} of all colors to hatch.
+        writers (dict): {label: LineCollectionWriter} of all colors.
+        segment_filter (tuple): (min_segment_length, bridge_gap, bridge_mode) applied to the runs of every band, see HatchEngine.get_segment_filter.
+
+    Returns:
+        bool: True if finished, False if cancelled.
+    """
+    height, width = label_map.shape[0], label_map.shape[1]
+    starts_x, starts_y, bounds, cos_theta, sin_theta, incline = HatchKernels.meander_line_starts(label_map.shape, hatch_distance, theta)
+    min_x, max_x, min_y, max_y = bounds
+    dx = cos_theta*step_size
+    dy = sin_theta*step_size
+    sample_limit = HatchKernels._meander_line_lengths(starts_x, starts_y, bounds, cos_theta, sin_theta, incline, step_size).astype(np.int64)+3
+
+    # lookup table for the labels to hatch. shifted by two: -2 marks the samples behind the band, -1 the samples outside the image
+    selected = np.zeros(int(label_map.max(initial=0))+3, dtype=bool)
+    selected[np.array(list(colors.keys()), dtype=np.int64)+2] = True
+
+    # state of every line at the band border: the next sample (not evaluated yet), the previous sample and the open run
+    line_count = len(starts_x)
+    next_k = np.zeros(line_count, dtype=np.int64)
+    next_x, next_y = starts_x.copy(), starts_y.copy()
+    prev_x, prev_y = np.full(line_count, np.nan), np.full(line_count, np.nan)
+    open_label = np.full(line_count, -1, dtype=np.int64)
+    open_k = np.zeros(line_count, dtype=np.int64)
+    open_x, open_y = np.zeros(line_count), np.zeros(line_count)
+    finished = np.zeros(line_count, dtype=bool)
+
+    bands = _band_ranges(height, band_rows)
+    for band_idx, (first_row, last_row) in enumerate(bands):
+        band_labels = np.asarray(label_map[first_row:last_row])
+        # the top band also takes the samples above the image, the bottom band the samples below
+        is_bottom = band_idx == len(bands)-1
+        run_batches = []
+        if theta == 0:
+            # the lines run along the rows of the band, most of them are hatched from the cached runs of their row
+            band_lines = ~finished
+            if not is_bottom:
+                band_lines &= HatchKernels.legacy_round(next_y) >= first_row
+            axis_runs, remaining = HatchKernels._axis_line_runs(label_map, selected[1:], starts_x, starts_y, bounds, cos_theta, sin_theta,
+                                                                incline, step_size, center, "Flat", 0, band_lines)
+            finished |= band_lines & ~remaining
+            run_batches.append(axis_runs)
+        while True:
+            #check if hatching was cancelled
+            if is_cancelled is not None and is_cancelled():
+                return False
+            active = ~finished
+            if not is_bottom:
+                active &= HatchKernels.legacy_round(next_y) >= first_row
+            active_lines = np.flatnonzero(active)
+            if len(active_lines) == 0:
+                break
+
+            # samples per line until the band is left (+2 for floating point safety and the sample behind the band)
+            remaining = sample_limit[active_lines]-next_k[active_lines]
+            if dy > 0 and not is_bottom:
+                needed = np.floor((next_y[active_lines]-(first_row-0.5))/dy).astype(np.int64)+2
+                remaining = np.minimum(remaining, np.maximum(needed, 2))
+            sample_count = int(remaining.max())
+            batch_lines = max(1, int(HatchKernels.MAX_BATCH_SAMPLES // sample_count))
+            for first in range(0, len(active_lines), batch_lines):
+                run_batches.append(_sweep_band_batch(
+                    band_labels, first_row, width, height, is_bottom, active_lines[first:first+batch_lines], sample_count, dx, dy, min_x, max_x,
+                    min_y, incline, sample_limit, selected, next_k, next_x, next_y, prev_x, prev_y, open_label, open_k, open_x, open_y, finished))
+
+        # the runs of the band are finished, stream them to the writers
+        band_collections = HatchKernels._runs_to_line_collections(HatchKernels._concat_runs(run_batches), center, pixel_per_mm, colors)
+        for label, line_collection in band_collections.items():
+            if segment_filter is not None:
+                line_collection = HatchKernels.filter_segments(line_collection, *segment_filter)
+            writers[label].append(line_collection)
+        if progress_callback is not None:
+            progress_callback((band_idx+1)/len(bands))
+    return True
+
+
+def _sweep_band_batch(band_labels, first_row, width, height, is_bottom, lines, sample_count, dx, dy, min_x, max_x, min_y, incline,
+                      sample_limit, selected, next_k, next_x, next_y, prev_x, prev_y, open_label, open_k, open_x, open_y, finished):
+    """
+    Samples a batch of lines from their next sample until they leave the band or end, updates their state and returns the finished runs.
+    Column 0 of the sample arrays is the previous sample of every line with the label of its open run, so runs continue over the border.
+    """
+    # the samples are accumulated from the next sample like the np.cumsum of the whole line
+    x = np.full((len(lines), sample_count+1), -dx)
+    x[:, 0] = prev_x[lines]
+    x[:, 1] = next_x[lines]
+    np.cumsum(x[:, 1:], axis=1, out=x[:, 1:])
+    y = np.full((len(lines), sample_count+1), -dy)
+    y[:, 0] = prev_y[lines]
+    y[:, 1] = next_y[lines]
+    np.cumsum(y[:, 1:], axis=1, out=y[:, 1:])
+    k = next_k[lines][:, None]+np.arange(sample_count)[None, :]
+
+    #loop condition of the per-sample loop. the first failing sample ends the line, at the latest the last sample of the line
+    inside_box = y[:, 1:] >= min_y
+    if incline == -1:
+        inside_box &= x[:, 1:] >= min_x
+    else:
+        inside_box &= x[:, 1:] <= max_x
+    ends = ~inside_box | (k >= sample_limit[lines][:, None]-1)
+    end_idx = np.where(ends.any(axis=1), np.argmax(ends, axis=1), sample_count)
+    x_round = HatchKernels.legacy_round(x[:, 1:])
+    y_round = HatchKernels.legacy_round(y[:, 1:])
+    if is_bottom:
+        leave_idx = np.full(len(lines), sample_count)
+    else:
+        below = y_round < first_row
+        leave_idx = np.where(below.any(axis=1), np.argmax(below, axis=1), sample_count)
+    # the samples before stop_idx are evaluated. the sample at stop_idx ends the line or is the next sample of the following band
+    stop_idx = np.minimum(np.minimum(end_idx, leave_idx), sample_count-1)
+    ended = end_idx == stop_idx
+
+    columns = np.arange(sample_count)[None, :]
+    evaluated = columns < stop_idx[:, None]
+    inside = evaluated & (x_round >= 0) & (x_round < width) & (y_round >= 0) & (y_round < height)
+    labels = np.full((len(lines), sample_count+1), -2, dtype=np.int64)
+    labels[:, 0] = open_label[lines]
+    sample_labels = labels[:, 1:]
+    sample_labels[evaluated] = -1
+    sample_labels[inside] = band_labels[y_round[inside]-first_row, x_round[inside]]
+    sample_labels[np.flatnonzero(ended), stop_idx[ended]] = -1
+
+    # runs of equal labels. every row ends with -1 or -2, so runs never continue into the next row of the flattened array
+    flat_labels = labels.ravel()
+    boundaries = np.flatnonzero(np.diff(flat_labels, prepend=-3) != 0)
+    run_labels = flat_labels[boundaries]
+    is_selected = selected[run_labels+2]
+    run_starts = boundaries[is_selected]
+    run_ends = np.append(boundaries, flat_labels.size)[1:][is_selected]
+    run_labels = run_labels[is_selected]
+    row, start_col = np.divmod(run_starts, sample_count+1)
+    end_col = run_ends-row*(sample_count+1)
+    # runs in column 0 started in a band above
+    continued = start_col == 0
+    start_k = np.where(continued, open_k[lines[row]], next_k[lines[row]]+start_col-1)
+    start_x = np.where(continued, open_x[lines[row]], x[row, start_col])
+    start_y = np.where(continued, open_y[lines[row]], y[row, start_col])
+    closed = flat_labels[run_ends] != -2
+
+    # runs that reach the band border stay open
+    still_open = ~closed
+    open_lines = lines[row[still_open]]
+    open_label[lines] = -1
+    open_label[open_lines] = run_labels[still_open]
+    open_k[open_lines] = start_k[still_open]
+    open_x[open_lines] = start_x[still_open]
+    open_y[open_lines] = start_y[still_open]
+
+    # advance the lines to their stop sample
+    batch_rows = np.arange(len(lines))
+    finished[lines[ended]] = True
+    next_k[lines] += stop_idx
+    next_x[lines] = x[batch_rows, stop_idx+1]
+    next_y[lines] = y[batch_rows, stop_idx+1]
+    prev_x[lines] = x[batch_rows, stop_idx]
+    prev_y[lines] = y[batch_rows, stop_idx]
+
+    row, end_col = row[closed], end_col[closed]
+    end_x = (x[row, end_col]+x[row, end_col-1])/2
+    end_y = (y[row, end_col]+y[row, end_col-1])/2
+    return run_labels[closed], lines[row], start_k[closed], start_x[closed], start_y[closed], end_x, end_y
+
+
+def hatch_image_tiled(image_matrix, pixel_per_mm, output_dir, center=None, settings=None, band_rows=DEFAULT_BAND_ROWS, progress_callback=None,
+                      cancel_token=None):
+    """
+    Hatches a large image band by band and streams the polylines to output_dir, see the module description.
+
+    Args:
+        image_matrix (numpy.ndarray): The RGB image with shape (height, width, 3), e.g. a memory-mapped array. Row 0 is the bottom of the hatching.
+        pixel_per_mm (float): The image resolution.
+        output_dir (Path or str): The parent directory of the run directories with the label map and the polyline files.
+        center (list): The hatch center [x, y] in pixels. Defaults to the image center.
+        settings (HatchSettings): The hatch settings. Defaults to HatchSettings(). parallel_hatching and hatch_engine are not used.
+        band_rows (int): The number of image rows that are processed at once.
+        progress_callback (callable): Receives the progress in percent.
+        cancel_token (CancelToken): Token to cancel the hatching.
+
+    Returns:
+        HatchData: The hatched image with memory-mapped Line Collections, or None if the hatching was cancelled or the hatch mode or a
+        pattern is not supported.
+    """
+    if settings is None:
+        settings = HatchSettings()
+    if settings.hatch_mode != "Flat":
+        print("Tiled hatching only supports the Flat hatch mode")
+        return None
+    if settings.centerline_hatching:
+        print("Tiled hatching does not support centerline hatching, thin strokes are hatched like the rest of the image")
+    if settings.island_hatching:
+        print("Tiled hatching does not support island hatching, the polylines are written band by band")
+    if center is None:
+        center = [(image_matrix.shape[1]-1)/2, (image_matrix.shape[0]-1)/2]
+    output_dir = str(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    remove_unused_run_dirs(output_dir)
+    run_directory = RunDirectory(output_dir)
+    is_cancelled = cancel_token.is_cancelled if cancel_token is not None else None
+    engine = HatchEngine(pixel_per_mm, progress_callback=progress_callback, is_cancelled=is_cancelled)
+    engine.random_seed = settings.random_seed
+    engine.report_progress(0, force=True)
+
+    color_list = get_sorted_unique_colors_tiled(image_matrix, band_rows)
+    # the patterns are checked before the label map is built. a database palette may choose another pattern for every color
+    color_params = engine.get_cluster_color_params(color_list, settings)
+    unsupported = sorted({params[0] for params in color_params if params is not None and params[0] not in TILED_PATTERNS})
+    if unsupported:
+        print(f"Tiled hatching only supports the meander patterns, not {', '.join(unsupported)}")
+        return None
+    label_map = run_directory.attach(build_label_map_tiled(image_matrix, color_list, os.path.join(run_directory.path, "label_map.npy"), band_rows))
+    if engine.is_cancelled():
+        return None
+    color_params = engine.optimize_meander_angles(color_params, label_map)
+    step_size = settings.stepsize_mm * pixel_per_mm  # Step size in pixels
+    segment_filter = engine.get_segment_filter(settings)
+
+    # one writer per Line Collection of the cluster, in color order (two for CrossedMeander colors)
+    writers = []
+    for label, (color, params) in enumerate(zip(color_list, color_params)):
+        if params is None:
+            continue
+        cross_angles = [0, 90] if params[0] == "CrossedMeander" else [None]
+        for cross_angle in cross_angles:
+            writers.append((label, cross_angle, LineCollectionWriter(os.path.join(run_directory.path, f"color_{label}_{len(writers)}"), color,
+                                                                     run_directory)))
+
+    # sweeps of (hatch_params, cross_angle, labels). colors with the same deterministic meander share one sweep
+    if engine.has_shared_meander_params(color_params):
+        shared_params = next(params for params in color_params if params is not None)
+        labels = [label for label, params in enumerate(color_params) if params is not None]
+        sweeps = [(shared_params, cross_angle, labels) for cross_angle in ([0, 90] if shared_params[0] == "CrossedMeander" else [None])]
+    else:
+        sweeps = [(color_params[label], cross_angle, [label]) for label, cross_angle, writer in writers]
+
+    for sweep_idx, (hatch_params, cross_angle, labels) in enumerate(sweeps):
+        hatch_pattern, hatch_angle, hatch_distance = hatch_params
+        sweep_writers = {label: writer for writer_label, writer_cross_angle, writer in writers for label in labels
+                         if writer_label == label and writer_cross_angle == cross_angle}
+        progress_state = [sweep_idx, len(sweeps), 100]
+        engine.seed_color(color_list[labels[0]], hatch_params, cross_angle)
+        theta = HatchKernels.meander_angle(hatch_pattern, hatch_angle, cross_angle, engine.rng)
+        colors = {label: color_list[label] for label in labels}
+        if not _meander_band_sweep(label_map, hatch_distance*pixel_per_mm, theta, step_size, center, colors, sweep_writers, pixel_per_mm,
+                                   band_rows, engine.get_progress_callback(progress_state), engine.is_cancelled, segment_filter):
+            return None
+        engine.report_progress(np.ceil((sweep_idx+1)/len(sweeps)*100), force=True)
+
+    hatch_cluster = HatchCluster([writer.close() for label, cross_angle, writer in writers], image_matrix, ref_position=[0, 0, 0, 0],
+                                 cluster_center_for_hatch=center, cylinder_radius=0, color_list=color_list)
+    pattern_name = "Database Patterns" if settings.db_color_palette is not None else settings.hatch_pattern
+    return HatchData([hatch_cluster], f"Image: {pattern_name} with {settings.hatch_dist_mode} Lines (tiled)")
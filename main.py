@@ -1,5 +1,6 @@
 import sys
 import json
+import multiprocessing
 from pathlib import Path
 from PyQt6 import QtWidgets, uic
 from PyQt6.QtCore import QLocale
@@ -44,6 +45,8 @@ except Exception as e:
 MAIN_GUI_PATH = get_gui_file_path("BildHatcher.ui")
 
 if __name__ == "__main__":
+    # needed for the worker processes of the parallel hatching in the frozen executable
+    multiprocessing.freeze_support()
 
     #load the GUI
     app = QtWidgets.QApplication(sys.argv)
@@ -80,9 +83,9 @@ if __name__ == "__main__":
     overlay_manager = TextandGeometries.TextGeometryOverlayManager(data_handler, overlay_store, gui, event_handler)
 
     image_hatcher = NCDataGeneration.Hatcher(data_handler, gui)
-    hatch_line_plotter = Plotting.HatchLinePlotter(data_handler, gui)
-    test_structure = TestStructures.Teststructures(data_handler, gui)
     parser = Parsing.Parser(data_handler,gui)
+    hatch_line_plotter = Plotting.HatchLinePlotter(data_handler, gui, parser)
+    test_structure = TestStructures.Teststructures(data_handler, gui)
     settings = Settings.Settings(gui)
     autmated_processor = AutomatedProcessing.AutomatedProcessor(data_handler, image_hatcher, parser, gui)
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,61 @@
+import numpy as np
+import cv2
+from HelperClasses import LineCollection
+
+'''
+Test images and comparisons of hatch results for the tests of the hatch engines and kernels.
+'''
+
+
+def make_block_image(height=60, width=80, color_count=4, seed=0):
+    """
+    Returns an RGB image of 6x6 pixel blocks in color_count random colors. Many small regions, holes and touching colors.
+    """
+    rng = np.random.default_rng(seed)
+    colors = rng.integers(0, 230, (color_count, 3))
+    blocks = rng.integers(0, color_count, (height//6+1, width//6+1))
+    labels = np.kron(blocks, np.ones((6, 6), dtype=np.int64))[:height, :width]
+    return colors[labels].astype(np.uint8)
+
+
+def make_shape_image(height=80, width=120):
+    """
+    Returns a white RGB image with a black disk, a gray rectangle and a thin black line.
+    """
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.circle(image, (35, 40), 25, (0, 0, 0), -1)
+    cv2.rectangle(image, (70, 10), (110, 70), (120, 120, 120), -1)
+    cv2.line(image, (5, 75), (115, 75), (0, 0, 0), 1)
+    return image
+
+
+def image_colors(image):
+    # the colors of an image, darkest first
+    colors = np.unique(image.reshape(-1, 3), axis=0)
+    return colors[np.argsort(colors.sum(axis=1), kind='stable')].astype(np.int64)
+
+
+def line_collections(hatch_data):
+    # all Line Collections of a HatchData in cluster order
+    return [line_collection if isinstance(line_collection, LineCollection) else LineCollection.from_polylines(line_collection)
+            for hatch_cluster in hatch_data.hatch_clusters for line_collection in hatch_cluster.data]
+
+
+def assert_same_line_collections(expected, actual, atol=1e-9):
+    assert len(expected) == len(actual)
+    for expected_collection, actual_collection in zip(expected, actual):
+        assert tuple(expected_collection.color) == tuple(actual_collection.color)
+        np.testing.assert_array_equal(expected_collection.offsets, actual_collection.offsets)
+        np.testing.assert_array_equal(expected_collection.move_types, actual_collection.move_types)
+        np.testing.assert_allclose(expected_collection.coords, actual_collection.coords, rtol=0, atol=atol)
+
+
+def assert_same_hatching(expected, actual, atol=1e-9):
+    assert len(expected.hatch_clusters) == len(actual.hatch_clusters)
+    assert_same_line_collections(line_collections(expected), line_collections(actual), atol)
+
+
+def sorted_polylines(line_collection):
+    # the polylines of a Line Collection independent of their order
+    return sorted((tuple(line_collection.move_types[start:end].tolist()), tuple(np.round(line_collection.coords[start:end], 9).ravel().tolist()))
+                  for start, end in zip(line_collection.offsets[:-1].tolist(), line_collection.offsets[1:].tolist()))
@@ -0,0 +1,148 @@
+import io
+import os
+import random
+import numpy as np
+import pytest
+from HatchEngine import hatch_image, HatchSettings, HatchCache, HatchEngine
+from HatchDiskCache import HatchDiskCache, pack_hatch_data, unpack_hatch_data
+from hatch_helpers import make_block_image, image_colors, line_collections, assert_same_hatching
+
+'''
+Incremental re-hatching with the HatchCache and the persistent HatchDiskCache. Only the colors whose mask or settings changed are hatched
+again, the result equals an uncached hatching with the same seed. Disk cache entries give back the same hatching, the least recently used
+entries are deleted first.
+'''
+
+PIXEL_PER_MM = 10
+
+
+def hatch(image, hatch_pattern="RandomMeander", hatch_engine="Vectorized", random_seed=None, cache=None, disk_cache=None, hatch_mode="Flat"):
+    settings = HatchSettings(hatch_pattern=hatch_pattern, hatch_angle=30, hatch_dist_mode="Fixed", hatch_dist_min=300, white_threshold=250,
+                             hatch_mode=hatch_mode, cyl_rad_mm=20, hatch_engine=hatch_engine, random_seed=random_seed)
+    return hatch_image(image, PIXEL_PER_MM, None, settings, cache=cache, disk_cache=disk_cache)
+
+
+def record_hatched_colors(monkeypatch):
+    # colors passed to hatch_color during a hatching
+    hatched_colors = []
+    hatch_color = HatchEngine.hatch_color
+    def recording_hatch_color(self, label_map, center, color, *args, **kwargs):
+        hatched_colors.append(tuple(int(c) for c in color))
+        return hatch_color(self, label_map, center, color, *args, **kwargs)
+    monkeypatch.setattr(HatchEngine, "hatch_color", recording_hatch_color)
+    return hatched_colors
+
+
+@pytest.mark.parametrize("hatch_pattern, hatch_engine", [("RandomMeander", "Vectorized"), ("CrossedMeander", "Standard"), ("Circular", "Vectorized")])
+def test_edit_rehatches_only_changed_color(monkeypatch, hatch_pattern, hatch_engine):
+    image = make_block_image()
+    cache = HatchCache()
+    hatched_colors = record_hatched_colors(monkeypatch)
+    hatch(image, hatch_pattern, hatch_engine, cache=cache)
+    assert len(hatched_colors) == len(image_colors(image))
+
+    # recolor every pixel of one color. the other masks stay the same
+    edited_image = image.copy()
+    old_color = image_colors(image)[1]
+    edited_image[np.all(image == old_color, axis=2)] = (7, 200, 9)
+    hatched_colors.clear()
+    actual = hatch(edited_image, hatch_pattern, hatch_engine, cache=cache)
+    assert hatched_colors == [(7, 200, 9)]
+
+    monkeypatch.undo()
+    assert_same_hatching(hatch(edited_image, hatch_pattern, hatch_engine, random_seed=cache.seed), actual)
+
+
+def test_hatching_again_rerolls_random_patterns(monkeypatch):
+    image = make_block_image()
+    cache = HatchCache()
+    hatched_colors = record_hatched_colors(monkeypatch)
+    first = hatch(image, cache=cache)
+    hatched_colors.clear()
+    second = hatch(image, cache=cache)
+    # the same inputs draw a new seed, the random meanders are hatched again with new angles
+    assert len(hatched_colors) == len(image_colors(image))
+    with pytest.raises(AssertionError):
+        assert_same_hatching(first, second)
+
+    # deterministic patterns do not depend on the seed and stay cached
+    hatch(image, "FixedMeander", cache=cache)
+    hatched_colors.clear()
+    hatch(image, "FixedMeander", cache=cache)
+    assert hatched_colors == []
+
+
+def test_seeded_hatching_keeps_global_random_state():
+    random.seed(5)
+    expected = random.random()
+    random.seed(5)
+    first = hatch(make_block_image(), "Circular", random_seed=1)
+    assert random.random() == expected
+    assert_same_hatching(first, hatch(make_block_image(), "Circular", random_seed=1))
+
+
+def test_cache_keeps_only_entries_of_last_hatching():
+    image = make_block_image()
+    cache = HatchCache()
+    hatch(image, cache=cache)
+    first_keys = set(cache.entries)
+    assert len(first_keys) == len(image_colors(image))
+
+    # a new angle changes every key, the entries of the first hatching are dropped
+    settings = HatchSettings(hatch_pattern="RandomMeander", hatch_angle=60, hatch_dist_mode="Fixed", hatch_dist_min=300, white_threshold=250)
+    hatch_image(image, PIXEL_PER_MM, None, settings, cache=cache)
+    assert len(cache.entries) == len(first_keys) and not first_keys & set(cache.entries)
+
+
+@pytest.mark.parametrize("hatch_mode", ["Flat", "CylEquidistX"])
+def test_pack_unpack_round_trip(hatch_mode):
+    # the wide cylindrical image is split into several clusters with 3d centers
+    image = np.concatenate([make_block_image()]*8, axis=1)
+    expected = hatch(image, random_seed=1, hatch_mode=hatch_mode)
+    buffer = io.BytesIO()
+    np.savez(buffer, **pack_hatch_data(expected))
+    buffer.seek(0)
+    with np.load(buffer, allow_pickle=False) as arrays:
+        actual = unpack_hatch_data(arrays)
+
+    assert actual.type == expected.type
+    assert_same_hatching(expected, actual, atol=0)
+    for expected_collection, actual_collection in zip(line_collections(expected), line_collections(actual)):
+        assert (expected_collection.speed, expected_collection.pwr) == (actual_collection.speed, actual_collection.pwr)
+    for expected_cluster, actual_cluster in zip(expected.hatch_clusters, actual.hatch_clusters):
+        np.testing.assert_array_equal(expected_cluster.input_matrix, actual_cluster.input_matrix)
+        assert list(expected_cluster.ref_position) == list(actual_cluster.ref_position)
+        assert list(expected_cluster.cluster_center_for_hatch) == list(actual_cluster.cluster_center_for_hatch)
+        assert expected_cluster.cylinder_radius == actual_cluster.cylinder_radius
+        assert expected_cluster.additional_code == actual_cluster.additional_code
+
+
+def test_disk_cache_hit_skips_hatching(monkeypatch, tmp_path):
+    image = make_block_image()
+    disk_cache = HatchDiskCache(tmp_path)
+    expected = hatch(image, random_seed=1, disk_cache=disk_cache)
+    assert len(os.listdir(tmp_path)) == 1
+
+    def no_hatching(*args):
+        raise AssertionError("hatched again")
+    monkeypatch.setattr(HatchEngine, "hatch", no_hatching)
+    assert_same_hatching(expected, hatch(image, random_seed=1, disk_cache=disk_cache), atol=0)
+    with pytest.raises(AssertionError):
+        hatch(image, random_seed=2, disk_cache=disk_cache)
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    image = make_block_image()
+    hatch_data = hatch(image, random_seed=1)
+    disk_cache = HatchDiskCache(tmp_path)
+    for key, age in [("a", 300), ("b", 200), ("c", 100)]:
+        disk_cache.store(key, hatch_data)
+        path = os.path.join(tmp_path, key + ".npz")
+        os.utime(path, (os.path.getmtime(path)-age,)*2)
+    entry_bytes = os.path.getsize(os.path.join(tmp_path, "a.npz"))
+
+    # reading "a" makes it the most recently used entry. the cache holds three entries, storing a fourth deletes "b"
+    assert disk_cache.load("a") is not None
+    disk_cache.max_bytes = 3*entry_bytes
+    disk_cache.store("d", hatch_data)
+    assert sorted(os.listdir(tmp_path)) == ["a.npz", "c.npz", "d.npz"]
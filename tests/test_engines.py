@@ -0,0 +1,229 @@
+import cv2
+import numpy as np
+import pytest
+import HatchKernels
+import JitKernels
+from HatchEngine import hatch_image, HatchSettings, CancelToken, HatchEngine
+from hatch_helpers import make_block_image, make_shape_image, line_collections, sorted_polylines, assert_same_hatching
+
+'''
+Equivalence of the hatch engines. The Vectorized meanders, circles, spirals and rays, the single sweep over all colors, the axis-aligned fast
+path, the Numba engine and the parallel hatching must give the same polylines as the per-sample loops of the Standard engine.
+PixelExact and Polygon cut the hatch lines at the exact pixel edges, RotateScan samples one pixel apart.
+'''
+
+PIXEL_PER_MM = 10
+HATCH_MODES = ["Flat", "CylEquidistX", "CylEquidistRad"]
+
+
+def hatch(image, hatch_engine, hatch_pattern="FixedMeander", hatch_angle=30, hatch_mode="Flat", hatch_dist_min=300, parallel_hatching=False,
+          progress_callback=None, cancel_token=None, island_hatching=False, random_seed=1):
+    settings = HatchSettings(hatch_pattern=hatch_pattern, hatch_angle=hatch_angle, hatch_dist_mode="Fixed", hatch_dist_min=hatch_dist_min,
+                             hatch_mode=hatch_mode, cyl_rad_mm=20, white_threshold=250, hatch_engine=hatch_engine,
+                             parallel_hatching=parallel_hatching, island_hatching=island_hatching, random_seed=random_seed)
+    return hatch_image(image, PIXEL_PER_MM, None, settings, progress_callback, cancel_token)
+
+
+def drawn_length(line_collection):
+    # length of all G1 moves
+    lengths = np.linalg.norm(np.diff(line_collection.coords, axis=0), axis=1)
+    return lengths[line_collection.move_types[1:] != 0].sum()
+
+
+def polyline_ends(line_collection):
+    # first and last point of every polyline
+    return line_collection.coords[np.concatenate((line_collection.offsets[:-1], line_collection.offsets[1:]-1))]
+
+
+@pytest.mark.parametrize("hatch_mode", HATCH_MODES)
+@pytest.mark.parametrize("hatch_pattern, hatch_angle", [
+    ("FixedMeander", 0), ("FixedMeander", 30), ("FixedMeander", 90), ("FixedMeander", 135),
+    ("RandomMeander", 0), ("CrossedMeander", 20),
+])
+def test_vectorized_meander_equals_standard(hatch_pattern, hatch_angle, hatch_mode):
+    image = make_block_image()
+    expected = hatch(image, "Standard", hatch_pattern, hatch_angle, hatch_mode)
+    assert sum(len(line_collection) for line_collection in line_collections(expected)) > 0
+    assert_same_hatching(expected, hatch(image, "Vectorized", hatch_pattern, hatch_angle, hatch_mode))
+
+
+@pytest.mark.parametrize("hatch_mode", HATCH_MODES)
+@pytest.mark.parametrize("hatch_pattern", ["Circular", "Spiral", "Radial"])
+def test_vectorized_curves_equal_standard(hatch_pattern, hatch_mode):
+    image = make_shape_image()
+    expected = hatch(image, "Standard", hatch_pattern, hatch_mode=hatch_mode, hatch_dist_min=500)
+    assert_same_hatching(expected, hatch(image, "Vectorized", hatch_pattern, hatch_mode=hatch_mode, hatch_dist_min=500))
+
+
+def record_axis_calls(monkeypatch):
+    # replaces the axis fast path by the sampling path: no line is taken from the cached row runs
+    calls = []
+    def sample_all_lines(label_map, selected, starts_x, *args):
+        calls.append(len(starts_x))
+        keep = args[-1]
+        return HatchKernels._concat_runs([]), np.ones(len(starts_x), dtype=bool) if keep is None else keep.copy()
+    monkeypatch.setattr(HatchKernels, "_axis_line_runs", sample_all_lines)
+    return calls
+
+
+@pytest.mark.parametrize("hatch_mode", ["Flat", "CylEquidistX"])
+@pytest.mark.parametrize("hatch_angle", [0, 90])
+@pytest.mark.parametrize("hatch_dist_min", [30, 250])
+def test_vectorized_meander_equals_standard_on_axes(monkeypatch, hatch_angle, hatch_dist_min, hatch_mode):
+    # hatch distances below one pixel and at the image border. the Standard engine samples every line itself
+    image = make_block_image()
+    calls = record_axis_calls(monkeypatch)
+    expected = hatch(image, "Standard", hatch_angle=hatch_angle, hatch_mode=hatch_mode, hatch_dist_min=hatch_dist_min)
+    assert calls == []
+    monkeypatch.undo()
+    assert_same_hatching(expected, hatch(image, "Vectorized", hatch_angle=hatch_angle, hatch_mode=hatch_mode, hatch_dist_min=hatch_dist_min))
+
+
+@pytest.mark.parametrize("hatch_engine", ["Vectorized"]+(["Numba"] if JitKernels.NUMBA_AVAILABLE else []))
+@pytest.mark.parametrize("hatch_mode", ["Flat", "CylEquidistX"])
+@pytest.mark.parametrize("hatch_angle", [0, 90])
+@pytest.mark.parametrize("hatch_dist_min", [30, 300])
+def test_axis_fast_path_equals_sampling(monkeypatch, hatch_angle, hatch_dist_min, hatch_mode, hatch_engine):
+    image = make_block_image()
+    expected = hatch(image, hatch_engine, hatch_angle=hatch_angle, hatch_mode=hatch_mode, hatch_dist_min=hatch_dist_min)
+    calls = record_axis_calls(monkeypatch)
+    assert_same_hatching(expected, hatch(image, hatch_engine, hatch_angle=hatch_angle, hatch_mode=hatch_mode, hatch_dist_min=hatch_dist_min))
+    assert calls
+
+
+@pytest.mark.skipif(not JitKernels.NUMBA_AVAILABLE, reason="Numba is not installed")
+@pytest.mark.parametrize("hatch_pattern, hatch_angle", [
+    ("FixedMeander", 0), ("FixedMeander", 30), ("RandomMeander", 0), ("CrossedMeander", 20), ("Circular", 0), ("Spiral", 0), ("Radial", 0),
+])
+def test_numba_equals_vectorized(hatch_pattern, hatch_angle):
+    image = make_block_image()
+    expected = hatch(image, "Vectorized", hatch_pattern, hatch_angle)
+    assert_same_hatching(expected, hatch(image, "Numba", hatch_pattern, hatch_angle))
+
+
+@pytest.mark.parametrize("hatch_mode", ["Flat", "CylEquidistX"])
+@pytest.mark.parametrize("hatch_engine", ["Standard", "Vectorized"])
+def test_parallel_equals_serial(hatch_engine, hatch_mode):
+    # cylindrical images wider than the allowed angle are split into several clusters, which are hatched in parallel as a whole
+    image = np.concatenate([make_block_image()]*8, axis=1)
+    expected = hatch(image, hatch_engine, "CrossedMeander", hatch_mode=hatch_mode)
+    assert hatch_mode == "Flat" or len(expected.hatch_clusters) > 1
+    assert_same_hatching(expected, hatch(image, hatch_engine, "CrossedMeander", hatch_mode=hatch_mode, parallel_hatching=True))
+
+
+@pytest.mark.parametrize("hatch_angle", [0, 90])
+def test_pixel_exact_ends_on_pixel_edges(hatch_angle):
+    image = make_shape_image()
+    center = [(image.shape[1]-1)/2, (image.shape[0]-1)/2]
+    axis = 0 if hatch_angle == 0 else 1
+    for line_collection in line_collections(hatch(image, "PixelExact", hatch_angle=hatch_angle)):
+        # pixel centers are at integer positions, so the pixel edges are at half-integer positions
+        edges = polyline_ends(line_collection)[:, axis]*PIXEL_PER_MM+center[axis]+0.5
+        np.testing.assert_allclose(edges, np.round(edges), atol=1e-9)
+
+
+@pytest.mark.parametrize("image", [make_block_image(), make_shape_image()], ids=["blocks", "shapes"])
+@pytest.mark.parametrize("hatch_angle", [0, 30, 45, 90, 135])
+def test_polygon_equals_pixel_exact(image, hatch_angle):
+    expected = hatch(image, "PixelExact", hatch_angle=hatch_angle)
+    assert_same_hatching(expected, hatch(image, "Polygon", hatch_angle=hatch_angle))
+
+
+@pytest.mark.parametrize("hatch_angle", [0, 45, 135])
+def test_polygon_equals_pixel_exact_cylindrical(hatch_angle):
+    # the straight lines are resampled on the cylinder, where round-off may change the number of nodes. the polylines end at the same points
+    image = make_block_image()
+    expected = line_collections(hatch(image, "PixelExact", hatch_angle=hatch_angle, hatch_mode="CylEquidistX"))
+    actual = line_collections(hatch(image, "Polygon", hatch_angle=hatch_angle, hatch_mode="CylEquidistX"))
+    assert len(expected) == len(actual)
+    for expected_collection, actual_collection in zip(expected, actual):
+        np.testing.assert_allclose(polyline_ends(expected_collection), polyline_ends(actual_collection), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("hatch_angle", [0, 90])
+def test_rotate_scan_equals_pixel_exact_on_axes(hatch_angle):
+    image = make_shape_image()
+    expected = hatch(image, "PixelExact", hatch_angle=hatch_angle)
+    assert_same_hatching(expected, hatch(image, "RotateScan", hatch_angle=hatch_angle))
+
+
+@pytest.mark.parametrize("hatch_angle", [30, 45, 135])
+def test_rotate_scan_length_close_to_pixel_exact(hatch_angle):
+    # one sample per pixel: every run end is at most half a pixel off, the hatched length differs by a few percent at most
+    image = make_shape_image()
+    expected = line_collections(hatch(image, "PixelExact", hatch_angle=hatch_angle))
+    actual = line_collections(hatch(image, "RotateScan", hatch_angle=hatch_angle))
+    assert len(expected) == len(actual)
+    for expected_collection, actual_collection in zip(expected, actual):
+        assert drawn_length(actual_collection) == pytest.approx(drawn_length(expected_collection), rel=0.02)
+
+
+@pytest.mark.parametrize("hatch_pattern", ["FixedMeander", "Circular"])
+def test_rotate_scan_falls_back_to_vectorized(hatch_pattern):
+    # cylindrical meanders and the curved patterns are hatched by the Vectorized kernels
+    image = make_block_image()
+    expected = hatch(image, "Vectorized", hatch_pattern, hatch_mode="CylEquidistX")
+    assert_same_hatching(expected, hatch(image, "RotateScan", hatch_pattern, hatch_mode="CylEquidistX"))
+
+
+@pytest.mark.parametrize("hatch_engine, hatch_pattern", [
+    ("Vectorized", "FixedMeander"), ("Vectorized", "CrossedMeander"), ("PixelExact", "FixedMeander"), ("Vectorized", "Circular"),
+    ("Vectorized", "Radial"),
+])
+def test_island_order_keeps_polylines(hatch_engine, hatch_pattern):
+    image = make_block_image()
+    expected = line_collections(hatch(image, hatch_engine, hatch_pattern))
+    actual = line_collections(hatch(image, hatch_engine, hatch_pattern, island_hatching=True))
+    assert len(expected) == len(actual)
+    # the colors of the block image have many islands, so the order changes
+    assert not any(np.array_equal(expected_collection.coords, actual_collection.coords)
+                   for expected_collection, actual_collection in zip(expected, actual))
+    for expected_collection, actual_collection in zip(expected, actual):
+        assert tuple(expected_collection.color) == tuple(actual_collection.color)
+        assert sorted_polylines(actual_collection) == sorted_polylines(expected_collection)
+
+
+def test_optimized_meander_follows_long_axis():
+    # a horizontal bar, a vertical bar and a diagonal stroke falling to the right (row 0 is the bottom, y points up)
+    label_map = np.zeros((120, 160), dtype=np.uint8)
+    label_map[10:16, 10:150] = 1
+    label_map[20:115, 5:11] = 2
+    cv2.line(label_map, (30, 110), (120, 25), 3, 6)
+    color_params = [None]+[("OptimizedMeander", 0, 0.3)]*3
+    optimized = HatchEngine(PIXEL_PER_MM).optimize_meander_angles(color_params, label_map)
+    assert optimized == [None, ("FixedMeander", 0.0, 0.3), ("FixedMeander", 90.0, 0.3), ("FixedMeander", 135.0, 0.3)]
+
+
+def test_optimized_meander_equals_fixed_meander():
+    image = np.full((60, 80, 3), 255, dtype=np.uint8)
+    image[20:50, 30:36] = 0
+    expected = hatch(image, "Vectorized", "FixedMeander", hatch_angle=90)
+    assert_same_hatching(expected, hatch(image, "Vectorized", "OptimizedMeander"))
+
+
+def test_engines_skip_white_and_keep_color_order():
+    image = make_shape_image()
+    for hatch_engine in ["Standard", "Vectorized", "RotateScan", "PixelExact", "Polygon", "Numba"]:
+        colors = [tuple(line_collection.color) for line_collection in line_collections(hatch(image, hatch_engine))]
+        assert colors == [(120, 120, 120), (0, 0, 0)]
+
+
+def test_hatch_image_progress_and_cancel():
+    image = make_block_image()
+    progress = []
+    assert hatch(image, "Vectorized", progress_callback=progress.append) is not None
+    assert progress[0] == 0 and progress[-1] == 100 and progress == sorted(progress)
+
+    cancel_token = CancelToken()
+    cancel_token.cancel()
+    assert hatch(image, "Vectorized", cancel_token=cancel_token) is None
+
+
+def test_progress_callback_maps_color_fraction():
+    # half of the second of four colors is 37.5 percent of the hatching
+    progress = []
+    engine = HatchEngine(PIXEL_PER_MM, progress_callback=progress.append)
+    report_progress = engine.get_progress_callback([1, 4, 100])
+    report_progress(0.5)
+    report_progress(1)
+    assert progress == [38, 50]
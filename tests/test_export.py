@@ -0,0 +1,136 @@
+import types
+import numpy as np
+import pytest
+from HatchEngine import hatch_image, HatchSettings
+from HelperClasses import ProcessBlock, LineCollection
+from Parsing import Parser
+from Plotting import HatchLinePlotter
+import PostProcessing
+from hatch_helpers import make_shape_image
+
+'''
+G-code export of process blocks. A streamed block (raw hatch data, speed/power and post processing applied while the G-code is written) gives
+the same G-code as a block that was processed in advance. Only the point and color counts move from the block header to the end of the pattern.
+The drive modes of the post processing pass bridged gaps without stopping.
+'''
+
+PIXEL_PER_MM = 10
+SPEED_AND_PWR = {
+    'white_threshold': 250, 'db_color_palette': None,
+    'min_pwr': 10, 'max_pwr': 80, 'power_mode': "color-scaled", 'pwr_struc_num': 1,
+    'min_speed': 5, 'max_speed': 50, 'speed_mode': "color-scaled", 'speed_struc_num': 1,
+}
+COUNT_LINES = ("; Number of color clusters:", "; Number of points:")
+
+
+def make_parser():
+    # Parser without GUI, the speed and power settings are fixed
+    parser = Parser.__new__(Parser)
+    parser.post_processor = PostProcessing.PostProcessor()
+    parser.feedrate_default = 6000
+    parser.collect_speed_and_pwr_settings = lambda *args, **kwargs: SPEED_AND_PWR
+    return parser
+
+
+def hatch(hatch_pattern="FixedMeander"):
+    settings = HatchSettings(hatch_pattern=hatch_pattern, hatch_angle=30, hatch_dist_mode="Fixed", hatch_dist_min=500, white_threshold=255,
+                             hatch_engine="Vectorized", random_seed=1)
+    return hatch_image(make_shape_image(), PIXEL_PER_MM, None, settings)
+
+
+def split_counts(gcode):
+    # the G-code without the count lines, and the count lines
+    return [line for line in gcode if not line.startswith(COUNT_LINES)], [line for line in gcode if line.startswith(COUNT_LINES)]
+
+
+@pytest.mark.parametrize("hatch_pattern", ["FixedMeander", "Circular"])
+@pytest.mark.parametrize("post_processing", ["None", "Maximize Lines", "Constant Drive", "Over Drive"])
+def test_streamed_gcode_equals_materialized(hatch_pattern, post_processing):
+    parser = make_parser()
+    hatch_data = hatch(hatch_pattern)
+    offset = [1.5, -2, 0.25]
+    block_args = dict(iterations=1, post_processing=post_processing, laser_mode="variable", air_assist="on", power_mode="full", offset=offset)
+
+    processed_data = parser.set_speed_and_pwr(hatch_data, SPEED_AND_PWR['white_threshold'])
+    materialized = parser.generate_gcode(parser.post_processor.process_block(ProcessBlock(processed_data, **block_args)), 0)
+    streamed = parser.generate_gcode(ProcessBlock(hatch_data, speed_and_pwr=SPEED_AND_PWR, **block_args), 0)
+
+    materialized_gcode, materialized_counts = split_counts(materialized)
+    streamed_gcode, streamed_counts = split_counts(streamed)
+    assert streamed_gcode == materialized_gcode and any(line.startswith("G1") for line in streamed_gcode)
+    assert streamed_counts == materialized_counts and len(streamed_counts) == 2
+    # the counts are in the block header of a processed block and after the pattern of a streamed block
+    assert materialized.index(materialized_counts[0]) < materialized.index(";start of Pattern")
+    assert streamed.index(streamed_counts[0]) > streamed.index(";start of Pattern")
+    # the raw hatch data of the streamed block is not changed
+    assert all(line_collection.speed is None for line_collection in hatch_data.hatch_clusters[0].data)
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_automatic_jcode_streams_only_when_enabled(streamed):
+    parser = make_parser()
+    parser.hatch_data = hatch()
+    parser.get_handler_data = lambda: None
+    parser.streamed_process_block_checkbox = types.SimpleNamespace(isChecked=lambda: streamed)
+    saved_blocks = []
+    parser.save_jcode = lambda block_list: saved_blocks.extend(block_list)
+    db_color_palette = types.SimpleNamespace(post_processing="None", laser_mode="variable", enclosure_fan=0, air_assist="on", power_mode="full")
+    parser.automatic_jcode(db_color_palette, offset=[0, 0, 0])
+
+    # without the streaming option the block is processed in advance and the counts stay in the block header
+    process_block = saved_blocks[0]
+    assert (process_block.speed_and_pwr is not None) == streamed
+    gcode = parser.generate_gcode(process_block, 0)
+    counts = split_counts(gcode)[1]
+    assert (gcode.index(counts[0]) > gcode.index(";start of Pattern")) == streamed
+
+
+def plotted_positions(parser, process_block):
+    # positions of the plot items of a process block, plotter without GUI
+    plotter = HatchLinePlotter.__new__(HatchLinePlotter)
+    plotter.parser = parser
+    plotter.plot_line_items = []
+    plotter.white_threshold_plotting_spinbox = types.SimpleNamespace(value=lambda: 255)
+    plotter.color_mode_plotting_combobox = types.SimpleNamespace(currentText=lambda: "Color")
+    plotter.plot_linedwidth_spinbox = types.SimpleNamespace(value=lambda: 1)
+    list_item = types.SimpleNamespace(data=lambda role: process_block)
+    plotter.gui = types.SimpleNamespace(process_listWidget=types.SimpleNamespace(selectedItems=lambda: [list_item]))
+    plotter.view = types.SimpleNamespace(clear=lambda: None)
+    plotter.plot_data = lambda: None
+    plotter.plot_hatch_blocks()
+    return [line_item.pos for line_item in plotter.plot_line_items]
+
+
+@pytest.mark.parametrize("post_processing", ["None", "Constant Drive"])
+def test_streamed_block_plot_equals_materialized(post_processing):
+    # the preview of a streamed block shows the processed data with its offset, not the raw hatch data
+    parser = make_parser()
+    hatch_data = hatch()
+    block_args = dict(iterations=1, post_processing=post_processing, laser_mode="variable", air_assist="on", power_mode="full", offset=[1.5, -2, 0])
+    processed_data = parser.set_speed_and_pwr(hatch_data, SPEED_AND_PWR['white_threshold'])
+    expected = plotted_positions(parser, parser.post_processor.process_block(ProcessBlock(processed_data, **block_args)))
+    actual = plotted_positions(parser, ProcessBlock(hatch_data, speed_and_pwr=SPEED_AND_PWR, **block_args))
+    raw = plotted_positions(parser, ProcessBlock(hatch_data, speed_and_pwr=SPEED_AND_PWR, **dict(block_args, post_processing="None", offset=[0, 0, 0])))
+    assert len(actual) == len(expected) and len(expected) > 0
+    for expected_pos, actual_pos in zip(expected, actual):
+        np.testing.assert_array_equal(actual_pos, expected_pos)
+    assert not all(np.array_equal(raw_pos, actual_pos, equal_nan=True) for raw_pos, actual_pos in zip(raw, actual))
+
+
+@pytest.mark.parametrize("mode", ["Constant Drive", "Over Drive"])
+def test_drive_mode_skips_bridged_polylines(mode):
+    # a hatch line with a gap bridged with zero power (move type 2), then a new hatch line
+    x = [0, 5, 5.5, 9, 9, 4]
+    y = [0, 0, 0, 0, 1, 1]
+    line_collection = LineCollection.from_arrays(x, y, 0, [0, 1, 2, 1, 0, 1], [0, 2, 4, 6], (0, 0, 0)).with_speed_and_pwr(20, 50)
+    polylines = PostProcessing.PostProcessor().set_drive_mode([line_collection], mode)[0]
+    # the polylines of Point lists give the same moves
+    point_polylines = PostProcessing.PostProcessor().set_drive_mode([list(line_collection)], mode)[0]
+    assert [[(point.x, point.y, point.move_type) for point in polyline] for polyline in point_polylines] == \
+        [[(point.x, point.y, point.move_type) for point in polyline] for polyline in polylines]
+    starts = [(point.x, point.y, point.move_type) for point in (polyline[0] for polyline in polylines)]
+    # run-up of 1 mm before the first and the third polyline, the bridged polyline starts at the gap
+    assert starts == [(-1, 0, 0), (5.5, 0, 2), (10, 1, 0)]
+    # no overrun after the first polyline, the head passes the gap
+    assert polylines[0][-1].x == 5 and polylines[0][-1].move_type == 1
+    assert polylines[1][-1].move_type == 0 and polylines[1][-1].x > 9
@@ -0,0 +1,416 @@
+import random
+import cv2
+import numpy as np
+import pytest
+import HatchKernels
+from HelperClasses import Point, LineCollection, count_points, iter_point_values
+from hatch_helpers import make_block_image, image_colors, assert_same_line_collections
+
+'''
+Unit tests of the array kernels in HatchKernels and of the array-backed LineCollection on small label maps.
+'''
+
+PIXEL_PER_MM = 10
+COLORS = {1: (0, 0, 0), 2: (90, 90, 90), 3: (180, 180, 180)}
+
+
+def make_label_map():
+    # background 0 with three small colors far from each other and from the center
+    label_map = np.zeros((80, 120), dtype=np.uint8)
+    label_map[3:9, 4:15] = 1
+    label_map[60:75, 100:104] = 2
+    label_map[70:72, 10:50] = 3
+    label_map[30:33, 56:60] = 1
+    return label_map
+
+
+def center_of(label_map):
+    return [(label_map.shape[1]-1)/2, (label_map.shape[0]-1)/2]
+
+
+# label map (user-002)
+
+def test_label_map_indexes_color_list():
+    image = make_block_image(color_count=6)
+    color_list = [tuple(color) for color in image_colors(image)[::-1]]
+    label_map = HatchKernels.build_label_map(image, color_list)
+    assert label_map.dtype == np.uint8
+    assert label_map.shape == image.shape[:2]
+    np.testing.assert_array_equal(np.array(color_list)[label_map], image)
+
+
+def test_label_map_dtype_for_many_colors():
+    # 300 gray and colored pixels need more than 8 bit labels
+    image = np.stack([np.arange(300) % 256, np.arange(300)//256, np.zeros(300)], axis=1).reshape(15, 20, 3).astype(np.uint8)
+    color_list = [tuple(color) for color in image_colors(image)]
+    label_map = HatchKernels.build_label_map(image, color_list)
+    assert label_map.dtype == np.uint16
+    np.testing.assert_array_equal(np.array(color_list)[label_map], image)
+
+
+def test_pack_rgb():
+    assert HatchKernels.pack_rgb(np.array([1, 2, 3], dtype=np.uint8)) == (1 << 16)+(2 << 8)+3
+    assert HatchKernels.pack_rgb(np.array([[255, 255, 255]], dtype=np.uint8))[0] == 0xFFFFFF
+
+
+# line collections (user-014)
+
+def test_line_collection_from_polylines_round_trip():
+    polylines = [[Point(0, 0, 0, 0, 10, 20, 30), Point(1, 0, 0, 1, 10, 20, 30)],
+                 [Point(2, 1, 0, 0, 10, 20, 30), Point(3, 1, 0, 2, 10, 20, 30), Point(4, 2, 0, 1, 10, 20, 30)]]
+    line_collection = LineCollection.from_polylines(polylines)
+    assert line_collection.color == (10, 20, 30)
+    assert len(line_collection) == 2 and line_collection.num_points == count_points(polylines) == 5
+    np.testing.assert_array_equal(line_collection.offsets, [0, 2, 5])
+    assert [[(point.x, point.y, point.move_type) for point in polyline] for polyline in line_collection] == \
+           [[(point.x, point.y, point.move_type) for point in polyline] for polyline in polylines]
+    assert list(iter_point_values(line_collection)) == list(iter_point_values(polylines))
+
+
+def test_line_collection_concatenate():
+    first = LineCollection.from_polylines([[Point(0, 0, 0, 0, 1, 2, 3), Point(1, 0, 0, 1, 1, 2, 3)]])
+    second = LineCollection.from_polylines([[Point(5, 5, 0, 0, 1, 2, 3), Point(6, 5, 0, 1, 1, 2, 3), Point(7, 5, 0, 1, 1, 2, 3)]])
+    joined = LineCollection.concatenate([first, second], (1, 2, 3))
+    np.testing.assert_array_equal(joined.offsets, [0, 2, 5])
+    np.testing.assert_array_equal(joined.coords[:, 0], [0, 1, 5, 6, 7])
+    assert len(LineCollection.concatenate([], (1, 2, 3))) == 0
+
+
+# cylindrical wrap (user-015)
+
+def wrap_cylindrical_points(line_collection, radius):
+    # per-point wrap as in the former loop of HatchEngine.make_hatch_cylindrical
+    polylines = []
+    for polyline in line_collection:
+        if len(polyline) == 2:
+            point1, point2 = polyline
+            node_count = int(np.ceil(max(np.abs(point1.x-point2.x)*10, 2)))
+            nodes = zip(np.linspace(point1.x, point2.x, node_count), np.linspace(point1.y, point2.y, node_count),
+                        [point1.move_type]+[point2.move_type]*(node_count-1))
+        else:
+            nodes = [(point.x, point.y, point.move_type) for point in polyline] if len(polyline) > 2 else []
+        polylines.append([Point(radius*np.sin(x/radius), y, radius*np.cos(x/radius)-radius, move_type, *line_collection.color)
+                          for x, y, move_type in nodes])
+    return LineCollection.from_polylines(polylines, line_collection.color)
+
+
+def test_wrap_cylindrical_equals_point_loop():
+    rng = np.random.default_rng(0)
+    polylines = []
+    for point_count in [2, 2, 3, 7, 2, 1, 2]:
+        xs, ys = rng.uniform(-30, 30, point_count), rng.uniform(-10, 10, point_count)
+        polylines.append([Point(x, y, 0, 0 if idx == 0 else 1+idx % 2, 50, 60, 70) for idx, (x, y) in enumerate(zip(xs, ys))])
+    # a line shorter than two 100µm steps
+    polylines.append([Point(1.0, 2.0, 0, 0, 50, 60, 70), Point(1.05, 2.5, 0, 1, 50, 60, 70)])
+    line_collection = LineCollection.from_polylines(polylines)
+
+    expected = wrap_cylindrical_points(line_collection, 20)
+    actual = HatchKernels.wrap_cylindrical(line_collection, 20)
+    assert actual.color == expected.color
+    np.testing.assert_array_equal(actual.offsets, expected.offsets)
+    np.testing.assert_array_equal(actual.move_types, expected.move_types)
+    np.testing.assert_allclose(actual.coords, expected.coords, rtol=0, atol=1e-12)
+
+
+# culling by the color statistics (user-016)
+
+@pytest.mark.parametrize("hatch_mode", ["Flat", "CylEquidistX", "CylEquidistRad"])
+@pytest.mark.parametrize("hatch_angle", [0, 30, 90, 135])
+def test_meander_culling_keeps_lines(hatch_angle, hatch_mode):
+    label_map = make_label_map()
+    center = center_of(label_map)
+    args = ("FixedMeander", 1.5, hatch_angle, 0.5, label_map, center, COLORS, hatch_mode, 100, PIXEL_PER_MM)
+    expected = HatchKernels.hatch_meander_multicolor(*args)
+    actual = HatchKernels.hatch_meander_multicolor(*args, color_stats=HatchKernels.ColorStats(label_map, center))
+    assert_same_line_collections([expected[label] for label in COLORS], [actual[label] for label in COLORS])
+
+
+@pytest.mark.parametrize("hatch_angle", [0, 30, 90, 135])
+def test_exact_engines_culling_keeps_lines(hatch_angle):
+    label_map = make_label_map()
+    center = center_of(label_map)
+    color_stats = HatchKernels.ColorStats(label_map, center)
+    for kernel in [HatchKernels.hatch_meander_pixel_exact_multicolor, HatchKernels.hatch_meander_polygon_multicolor]:
+        args = ("FixedMeander", 1.5, hatch_angle, label_map, center, COLORS, "Flat", 100, PIXEL_PER_MM)
+        expected = kernel(*args)
+        actual = kernel(*args, color_stats=color_stats)
+        assert_same_line_collections([expected[label] for label in COLORS], [actual[label] for label in COLORS])
+    args = ("FixedMeander", 1.5, hatch_angle, label_map, center, COLORS, PIXEL_PER_MM)
+    expected = HatchKernels.hatch_meander_rotate_scan_multicolor(*args)
+    actual = HatchKernels.hatch_meander_rotate_scan_multicolor(*args, color_stats=color_stats)
+    assert_same_line_collections([expected[label] for label in COLORS], [actual[label] for label in COLORS])
+
+
+@pytest.mark.parametrize("hatch_mode", ["Flat", "CylEquidistX", "CylEquidistRad"])
+@pytest.mark.parametrize("label", list(COLORS))
+def test_ring_and_ray_culling_keeps_lines(label, hatch_mode):
+    label_map = make_label_map()
+    center = center_of(label_map)
+    color_stats = HatchKernels.ColorStats(label_map, center)
+    args = (1.5, 0.5, label_map, center, COLORS[label], label, hatch_mode, 100, PIXEL_PER_MM)
+    expected = HatchKernels.hatch_circular_vectorized(*args, rng=random.Random(3))
+    actual = HatchKernels.hatch_circular_vectorized(*args, color_stats=color_stats, rng=random.Random(3))
+    assert_same_line_collections([expected], [actual])
+    for kernel in [HatchKernels.hatch_spiral_vectorized, HatchKernels.hatch_radial_vectorized]:
+        assert_same_line_collections([kernel(*args)], [kernel(*args, color_stats=color_stats)])
+
+
+def test_color_stats_of_missing_label():
+    label_map = make_label_map()
+    color_stats = HatchKernels.ColorStats(label_map, center_of(label_map))
+    assert color_stats.bounds([7]) is None
+    assert color_stats.bounds([1]) == (2.0, 61.0, 1.0, 34.0)
+    assert color_stats.radius_range([7], "Flat", 100) == (np.inf, -np.inf)
+
+
+# island order (user-021)
+
+def test_island_order_groups_islands():
+    # two islands of label 1, the meander lines alternate between them
+    label_map = np.zeros((20, 40), dtype=np.uint8)
+    label_map[2:18, 2:12] = 1
+    label_map[2:18, 28:38] = 1
+    center = center_of(label_map)
+    polylines = []
+    for row in [3, 6, 9, 12]:
+        for x_start, x_end in [(3, 11), (29, 37)]:
+            y = (row-center[1])/PIXEL_PER_MM
+            polylines.append([Point((x_start-center[0])/PIXEL_PER_MM, y, 0, 0, 0, 0, 0), Point((x_end-center[0])/PIXEL_PER_MM, y, 0, 1, 0, 0, 0)])
+    line_collection = LineCollection.from_polylines(polylines)
+
+    ordered = HatchKernels.island_order(line_collection, HatchKernels.label_islands(label_map, 1), center, PIXEL_PER_MM)
+    # the left island first (it holds the first polyline), then the right one, each in meander order
+    expected = HatchKernels.take_polylines(line_collection, np.array([0, 2, 4, 6, 1, 3, 5, 7]))
+    assert_same_line_collections([expected], [ordered])
+
+
+@pytest.mark.parametrize("row", [36, 40, 45])
+def test_rotate_scan_without_crossing_lines(row):
+    # a single pixel between two hatch lines
+    label_map = np.zeros((80, 120), dtype=np.uint8)
+    label_map[row, 60] = 1
+    center = center_of(label_map)
+    color_stats = HatchKernels.ColorStats(label_map, center)
+    progress = []
+    line_collections = HatchKernels.hatch_meander_rotate_scan_multicolor("FixedMeander", 20, 30, label_map, center, {1: (0, 0, 0)}, PIXEL_PER_MM,
+                                                                         progress_callback=progress.append, color_stats=color_stats)
+    assert len(line_collections[1]) == 0
+
+
+# contour pattern (user-023)
+
+def contour_rings(line_collection, center=(0, 0), pixel_per_mm=1):
+    # the rings in pixel positions
+    coords = line_collection.coords[:, :2]*pixel_per_mm+np.array(center)
+    return [coords[line_collection.offsets[idx]:line_collection.offsets[idx+1]] for idx in range(len(line_collection))]
+
+
+def test_contour_rings_of_square():
+    label_map = np.zeros((40, 50), dtype=np.uint8)
+    label_map[5:26, 10:31] = 1
+    rings = contour_rings(HatchKernels.hatch_contour(3, label_map, [0, 0], (0, 0, 0), 1, 1))
+    # the first ring runs through the centers of the border pixels, every further ring is one hatch distance inside
+    assert len(rings) == 4
+    for ring_idx, ring in enumerate(rings):
+        np.testing.assert_array_equal(ring[0], ring[-1])
+        np.testing.assert_array_equal(ring.min(axis=0), [10+3*ring_idx, 5+3*ring_idx])
+        np.testing.assert_array_equal(ring.max(axis=0), [30-3*ring_idx, 25-3*ring_idx])
+
+
+def test_contour_rings_around_hole():
+    label_map = np.zeros((40, 50), dtype=np.uint8)
+    label_map[5:26, 10:31] = 1
+    label_map[12:19, 17:24] = 2
+    line_collection = HatchKernels.hatch_contour(3, label_map, [25, 20], (0, 0, 0), 1, PIXEL_PER_MM)
+    rings = contour_rings(line_collection, [25, 20], PIXEL_PER_MM)
+    assert len(rings) == 4
+    assert line_collection.move_types[line_collection.offsets[:-1]].tolist() == [0]*4
+    # the hole gets its own ring in the first level, all rings run on pixels of the color
+    assert any(np.array_equal(ring.min(axis=0), [16, 11]) and np.array_equal(ring.max(axis=0), [24, 19]) for ring in rings[:2])
+    for ring in rings:
+        np.testing.assert_array_equal(ring[0], ring[-1])
+        pixels = np.round(ring).astype(np.int64)
+        assert np.all(label_map[pixels[:, 1], pixels[:, 0]] == 1)
+
+
+def test_contour_with_color_stats():
+    label_map = make_label_map()
+    center = center_of(label_map)
+    color_stats = HatchKernels.ColorStats(label_map, center)
+    for label, color in COLORS.items():
+        expected = HatchKernels.hatch_contour(1.5, label_map, center, color, label, PIXEL_PER_MM)
+        actual = HatchKernels.hatch_contour(1.5, label_map, center, color, label, PIXEL_PER_MM, color_stats=color_stats)
+        assert len(expected) > 0
+        assert_same_line_collections([expected], [actual])
+    assert len(HatchKernels.hatch_contour(1.5, label_map, center, (0, 0, 0), 7, PIXEL_PER_MM, color_stats=color_stats)) == 0
+
+
+# centerline hatching (user-024)
+
+def line_mask(start, end, thickness=1, shape=(50, 50)):
+    mask = np.zeros(shape, dtype=np.uint8)
+    cv2.line(mask, start, end, 1, thickness)
+    return mask > 0
+
+
+def test_skeleton_of_one_pixel_line():
+    mask = np.zeros((10, 20), dtype=bool)
+    mask[4, 2:15] = True
+    skeleton = HatchKernels.skeletonize(mask)
+    np.testing.assert_array_equal(skeleton, mask)
+    polylines = HatchKernels.trace_skeleton(skeleton)
+    assert len(polylines) == 1
+    # the pixels are traced in order from one end to the other
+    polyline = polylines[0] if polylines[0][0, 0] == 2 else polylines[0][::-1]
+    np.testing.assert_array_equal(polyline, np.stack([np.arange(2, 15), np.full(13, 4)], axis=1))
+
+
+@pytest.mark.parametrize("start, end", [((5, 5), (40, 40)), ((5, 5), (40, 20)), ((5, 30), (40, 5))])
+def test_trace_diagonal_line(start, end):
+    # the steps of a diagonal line are no junctions
+    mask = line_mask(start, end)
+    polylines = HatchKernels.trace_skeleton(HatchKernels.skeletonize(mask))
+    assert len(polylines) == 1
+    assert len(polylines[0]) == mask.sum()
+    assert sorted(map(tuple, polylines[0][[0, -1]].tolist())) == sorted([start, end])
+
+
+@pytest.mark.parametrize("thickness", [3, 4])
+def test_skeleton_of_thick_line(thickness):
+    mask = line_mask((5, 5), (40, 20), thickness)
+    skeleton = HatchKernels.skeletonize(mask)
+    assert np.all(mask[skeleton])
+    assert skeleton.sum() < mask.sum()/2
+    assert len(HatchKernels.trace_skeleton(skeleton)) == 1
+
+
+def test_trace_junction_loop_and_pixel():
+    cross = np.zeros((11, 11), dtype=bool)
+    cross[5, 1:10] = True
+    cross[1:10, 5] = True
+    polylines = HatchKernels.trace_skeleton(cross)
+    # four arms from the junction pixel
+    assert len(polylines) == 4
+    assert sum(len(polyline) for polyline in polylines) == cross.sum()+3
+    assert all([5, 5] in polyline.tolist() for polyline in polylines)
+
+    loop = np.zeros((10, 10), dtype=bool)
+    loop[2, 2:8] = loop[7, 2:8] = loop[2:8, 2] = loop[2:8, 7] = True
+    polylines = HatchKernels.trace_skeleton(loop)
+    assert len(polylines) == 1
+    assert len(polylines[0]) == loop.sum()+1
+    np.testing.assert_array_equal(polylines[0][0], polylines[0][-1])
+
+    pixel = np.zeros((5, 5), dtype=bool)
+    pixel[2, 3] = True
+    polylines = HatchKernels.trace_skeleton(pixel)
+    assert len(polylines) == 1
+    np.testing.assert_array_equal(polylines[0], [[3, 2]])
+
+
+def test_centerlines_of_line_and_pixel():
+    thin = np.zeros((10, 20), dtype=bool)
+    thin[4, 2:15] = True
+    thin[8, 18] = True
+    line_collection = HatchKernels.hatch_centerlines(thin, 10, 20, [10, 20], (0, 0, 0), PIXEL_PER_MM)
+    # the straight line is simplified to its end points, the single pixel becomes a line of one pixel length
+    np.testing.assert_array_equal(line_collection.offsets, [0, 2, 4])
+    np.testing.assert_array_equal(line_collection.move_types, [0, 1, 0, 1])
+    polylines = sorted(line_collection.coords[:, :2].reshape(2, 2, 2).tolist())
+    np.testing.assert_allclose(polylines, [[[0.2, 0.4], [1.4, 0.4]], [[1.75, 0.8], [1.85, 0.8]]])
+
+
+def test_thin_regions_of_stroke_and_disk():
+    label_map = np.zeros((60, 80), dtype=np.uint8)
+    cv2.circle(label_map, (20, 30), 15, 1, -1)
+    label_map[29:32, 35:75] = 1
+    for color_stats in [None, HatchKernels.ColorStats(label_map, [40, 30])]:
+        thin, x0, y0 = HatchKernels.thin_regions(label_map, 1, 4, color_stats)
+        ys, xs = np.nonzero(thin)
+        # only the stroke is thin, the disk is hatched as usual
+        assert xs.min()+x0 >= 35 and xs.max()+x0 == 74
+        assert ys.min()+y0 == 29 and ys.max()+y0 == 31
+    # the rounded corners of a square are too small to be traced
+    square = np.zeros((40, 40), dtype=np.uint8)
+    square[5:30, 8:35] = 1
+    assert HatchKernels.thin_regions(square, 1, 4) is None
+    assert HatchKernels.thin_regions(square, 2, 4) is None
+
+
+# segment filter and gap bridging (user-025)
+
+def make_line_collection(polylines, move_types=None):
+    points = np.concatenate([np.asarray(polyline, dtype=np.float64) for polyline in polylines])
+    offsets = np.concatenate([[0], np.cumsum([len(polyline) for polyline in polylines])])
+    if move_types is None:
+        move_types = np.ones(len(points), dtype=np.uint8)
+        move_types[offsets[:-1]] = 0
+    return LineCollection.from_arrays(points[:, 0], points[:, 1], 0, move_types, offsets, (0, 0, 0))
+
+
+def broken_hatch_lines(line_count=3):
+    # hatch lines along x, each split into a long run, a run after a short gap and a speck after a long gap
+    polylines = []
+    for y in range(line_count):
+        polylines += [[(0, y), (5, y)], [(5.05, y), (9, y)], [(9.5, y), (9.52, y)]]
+    return make_line_collection(polylines)
+
+
+def test_bridge_gaps_laser_on():
+    line_collection = HatchKernels.bridge_gaps(broken_hatch_lines(), 0.1, "Laser On")
+    # the short gap is drawn, the inner points on the straight line are removed
+    np.testing.assert_array_equal(line_collection.offsets, [0, 2, 4, 6, 8, 10, 12])
+    np.testing.assert_array_equal(line_collection.move_types, [0, 1]*6)
+    np.testing.assert_allclose(line_collection.coords[:4, :2], [[0, 0], [9, 0], [9.5, 0], [9.52, 0]])
+
+
+def test_bridge_gaps_power_off():
+    original = broken_hatch_lines()
+    line_collection = HatchKernels.bridge_gaps(original, 0.1, "Power Off")
+    # the polylines stay separate, the machine moves over the gap with zero power
+    np.testing.assert_array_equal(line_collection.offsets, original.offsets)
+    np.testing.assert_array_equal(line_collection.coords, original.coords)
+    np.testing.assert_array_equal(line_collection.move_types, [0, 1, 2, 1, 0, 1]*3)
+
+
+def test_bridge_gaps_keeps_travel_and_corners():
+    # the travel between meander lines runs against the lines, a gap around a corner is not in line with the segments
+    meander = make_line_collection([[(0, 0), (5, 0)], [(5, 0.05), (0, 0.05)], [(0, 0.1), (5, 0.1)]])
+    corner = make_line_collection([[(0, 0), (5, 0)], [(5, 0.05), (5, 5)]])
+    for bridge_mode in ["Laser On", "Power Off"]:
+        for line_collection in [meander, corner]:
+            assert HatchKernels.bridge_gaps(line_collection, 1, bridge_mode) is line_collection
+    assert HatchKernels.bridge_gaps(broken_hatch_lines(), 0, "Laser On").move_types.tolist() == [0, 1]*9
+
+
+def test_drop_short_polylines():
+    line_collection = HatchKernels.drop_short_polylines(broken_hatch_lines(), 0.1)
+    np.testing.assert_array_equal(line_collection.offsets, [0, 2, 4, 6, 8, 10, 12])
+    np.testing.assert_allclose(np.unique(line_collection.coords[:, 0]), [0, 5, 5.05, 9])
+
+
+def test_drop_short_polylines_restarts_after_bridge():
+    # B is bridged from A and C from B. without B, C can not continue with zero power and starts with a G0 again
+    polylines = [[(0, 0), (5, 0)], [(5.05, 0), (5.07, 0)], [(5.12, 0), (9, 0)]]
+    line_collection = HatchKernels.bridge_gaps(make_line_collection(polylines), 0.1, "Power Off")
+    np.testing.assert_array_equal(line_collection.move_types, [0, 1, 2, 1, 2, 1])
+    line_collection = HatchKernels.drop_short_polylines(line_collection, 0.1)
+    np.testing.assert_array_equal(line_collection.offsets, [0, 2, 4])
+    np.testing.assert_array_equal(line_collection.move_types, [0, 1, 0, 1])
+    np.testing.assert_allclose(line_collection.coords[:, 0], [0, 5, 5.12, 9])
+
+    # a bridged polyline after a kept one keeps its zero power move
+    polylines = [[(0, 0), (0.02, 0)], [(1, 0), (5, 0)], [(5.05, 0), (9, 0)]]
+    line_collection = HatchKernels.bridge_gaps(make_line_collection(polylines), 0.1, "Power Off")
+    line_collection = HatchKernels.drop_short_polylines(line_collection, 0.1)
+    np.testing.assert_array_equal(line_collection.move_types, [0, 1, 2, 1])
+
+
+@pytest.mark.parametrize("bridge_mode, offsets, move_types", [
+    ("Laser On", [0, 2, 4, 6], [0, 1]*3),
+    ("Power Off", [0, 2, 4, 6, 8, 10, 12], [0, 1, 2, 1]*3),
+])
+def test_filter_segments(bridge_mode, offsets, move_types):
+    line_collection = HatchKernels.filter_segments(broken_hatch_lines(), 0.05, 0.1, bridge_mode)
+    np.testing.assert_array_equal(line_collection.offsets, offsets)
+    np.testing.assert_array_equal(line_collection.move_types, move_types)
@@ -0,0 +1,104 @@
+import pytest
+import HatchKernels
+from HatchEngine import hatch_image, HatchSettings
+from TiledHatching import hatch_image_tiled
+from hatch_helpers import make_block_image, make_shape_image, line_collections, sorted_polylines
+
+'''
+Tiled hatching of images in bands. The polylines are written in band order, but for every color they must be the same as with the
+Vectorized engine on the whole image, also for bands of only a few rows. Every hatching writes to its own run directory. Only the meander
+patterns can be hatched in bands.
+'''
+
+PIXEL_PER_MM = 10
+
+
+def settings_for(hatch_pattern, hatch_angle, hatch_dist_min=300):
+    return HatchSettings(hatch_pattern=hatch_pattern, hatch_angle=hatch_angle, hatch_dist_mode="Fixed", hatch_dist_min=hatch_dist_min,
+                         white_threshold=250, hatch_engine="Vectorized", random_seed=1)
+
+
+@pytest.mark.parametrize("band_rows", [1, 7, 16])
+@pytest.mark.parametrize("image", [make_block_image(), make_shape_image()], ids=["blocks", "shapes"])
+@pytest.mark.parametrize("hatch_pattern, hatch_angle", [
+    ("FixedMeander", 0), ("FixedMeander", 30), ("FixedMeander", 90), ("FixedMeander", 135), ("RandomMeander", 0), ("CrossedMeander", 20),
+    ("OptimizedMeander", 0),
+])
+def test_tiled_equals_vectorized(tmp_path, image, hatch_pattern, hatch_angle, band_rows):
+    settings = settings_for(hatch_pattern, hatch_angle)
+    expected = line_collections(hatch_image(image, PIXEL_PER_MM, None, settings))
+    actual = line_collections(hatch_image_tiled(image, PIXEL_PER_MM, tmp_path, None, settings, band_rows=band_rows))
+    assert [tuple(line_collection.color) for line_collection in actual] == [tuple(line_collection.color) for line_collection in expected]
+    for expected_collection, actual_collection in zip(expected, actual):
+        assert sorted_polylines(actual_collection) == sorted_polylines(expected_collection)
+
+
+@pytest.mark.parametrize("band_rows", [1, 7])
+@pytest.mark.parametrize("hatch_pattern, hatch_angle, bridge_gap", [
+    ("FixedMeander", 30, 0), ("FixedMeander", 0, 700), ("CrossedMeander", 20, 0),
+])
+@pytest.mark.parametrize("bridge_mode", ["Laser On", "Power Off"])
+def test_tiled_segment_filter_equals_vectorized(tmp_path, hatch_pattern, hatch_angle, bridge_gap, bridge_mode, band_rows):
+    # gaps are only bridged within a band, the lines at 0 degrees lie in one band
+    image = make_block_image()
+    settings = settings_for(hatch_pattern, hatch_angle)
+    settings.min_segment_length = 470  # between the run lengths of whole samples, their round-off differs between the bands
+    settings.bridge_gap = bridge_gap
+    settings.bridge_mode = bridge_mode
+    expected = line_collections(hatch_image(image, PIXEL_PER_MM, None, settings))
+    actual = line_collections(hatch_image_tiled(image, PIXEL_PER_MM, tmp_path, None, settings, band_rows=band_rows))
+    unfiltered = line_collections(hatch_image(image, PIXEL_PER_MM, None, settings_for(hatch_pattern, hatch_angle)))
+    assert sum(len(line_collection) for line_collection in expected) < sum(len(line_collection) for line_collection in unfiltered)
+    assert len(expected) == len(actual)
+    for expected_collection, actual_collection in zip(expected, actual):
+        assert sorted_polylines(actual_collection) == sorted_polylines(expected_collection)
+
+
+@pytest.mark.parametrize("band_rows", [1, 7])
+@pytest.mark.parametrize("hatch_dist_min", [30, 300])
+def test_tiled_axis_fast_path_equals_sampling(tmp_path, monkeypatch, hatch_dist_min, band_rows):
+    # at 0 degrees the lines of every band are taken from the cached row runs, the result is the same as when sampling them
+    image = make_shape_image()
+    settings = settings_for("FixedMeander", 0, hatch_dist_min)
+    expected = line_collections(hatch_image(image, PIXEL_PER_MM, None, settings))
+    calls = []
+    def sample_all_lines(label_map, selected, starts_x, *args):
+        calls.append(len(starts_x))
+        return HatchKernels._concat_runs([]), args[-1].copy()
+    with monkeypatch.context() as patch:
+        patch.setattr(HatchKernels, "_axis_line_runs", sample_all_lines)
+        sampled = line_collections(hatch_image_tiled(image, PIXEL_PER_MM, tmp_path, None, settings, band_rows=band_rows))
+    assert len(calls) == -(-image.shape[0] // band_rows)
+    actual = line_collections(hatch_image_tiled(image, PIXEL_PER_MM, tmp_path, None, settings, band_rows=band_rows))
+    for expected_collection, sampled_collection, actual_collection in zip(expected, sampled, actual):
+        assert sorted_polylines(sampled_collection) == sorted_polylines(expected_collection)
+        assert sorted_polylines(actual_collection) == sorted_polylines(expected_collection)
+
+
+def test_tiled_refuses_cylindrical_modes(tmp_path):
+    settings = settings_for("FixedMeander", 30)
+    settings.hatch_mode = "CylEquidistX"
+    assert hatch_image_tiled(make_block_image(), PIXEL_PER_MM, tmp_path, None, settings) is None
+
+
+@pytest.mark.parametrize("hatch_pattern", ["Circular", "Spiral", "Radial", "Contour"])
+def test_tiled_refuses_whole_image_patterns(tmp_path, hatch_pattern):
+    # rings, rays and contours need the whole label map, the hatching is refused before the label map is built
+    assert hatch_image_tiled(make_block_image(), PIXEL_PER_MM, tmp_path, None, settings_for(hatch_pattern, 0)) is None
+    assert list(tmp_path.glob("*/label_map.npy")) == []
+
+
+def test_tiled_runs_keep_earlier_results(tmp_path):
+    # a second hatching in the same directory must not overwrite the memory-mapped files of the first one
+    image = make_block_image()
+    first = line_collections(hatch_image_tiled(image, PIXEL_PER_MM, tmp_path, None, settings_for("FixedMeander", 30)))
+    first_polylines = [sorted_polylines(line_collection) for line_collection in first]
+    second = line_collections(hatch_image_tiled(image[::-1], PIXEL_PER_MM, tmp_path, None, settings_for("FixedMeander", 0)))
+    assert [sorted_polylines(line_collection) for line_collection in first] == first_polylines
+    assert [sorted_polylines(line_collection) for line_collection in second] != first_polylines
+    assert len(list(tmp_path.iterdir())) == 2
+
+    # the run directory of a hatching is removed once its Line Collections are released
+    del first, second
+    third = hatch_image_tiled(image, PIXEL_PER_MM, tmp_path, None, settings_for("FixedMeander", 30))
+    assert third is not None and len(list(tmp_path.iterdir())) == 1